@@ -2,10 +2,16 @@
 
 # Імпорти основних залежностей
 import os                                 # Робота зі змінними середовища
+import time                               # Поточний час для TTL кешу користувачів
+from dataclasses import dataclass         # Легкий об'єкт автентифікованого користувача
 from datetime import datetime, timedelta  # Час для налаштування тривалості дії токенів
 from jose import jwt            # Бібліотека для створення та перевірки JWT токенів
 from passlib.hash import bcrypt  # Для безпечного хешування паролів
 from dotenv import load_dotenv            # Завантаження змінних середовища з .env файлу
+from sqlalchemy import event, inspect     # ORM-події для інвалідації кешу
+from app import models                    # Модель User для відстеження змін
+from app.cache import TTLCache            # LRU-кеш із TTL
+from app.services.workers import BoundedProcessPool  # Окремий пул процесів для bcrypt
 
 # Завантаження змінних середовища з файлу .env
 load_dotenv()
@@ -15,6 +21,17 @@ SECRET_KEY = os.getenv("SECRET_KEY", "change_me")  # Секретний ключ
 ALGORITHM = "HS256"                                # Алгоритм шифрування токенів
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24              # Час життя токену (1 день)
 
+# Хешування паролів
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))  # Cost factor bcrypt (для нових хешів)
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 2)))  # Процесів у пулі
+PASSWORD_HASH_QUEUE_LIMIT = int(os.getenv("PASSWORD_HASH_QUEUE_LIMIT", "64"))  # Максимум задач у черзі
+PASSWORD_HASH_RETRY_AFTER = int(os.getenv("PASSWORD_HASH_RETRY_AFTER", "1"))   # Retry-After при 503 (секунди)
+PASSWORD_HASH_WARMUP = os.getenv("PASSWORD_HASH_WARMUP", "True").lower() == "true"  # Запускати процеси пулу на старті
+
+# Кеш автентифікованих користувачів: токен → CurrentUser
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "10000"))  # Максимум токенів у кеші
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", "300"))    # Час життя запису (секунди)
+
 # Хешування пароля
 def hash_password(password: str) -> str:
     """
@@ -22,7 +39,7 @@ def hash_password(password: str) -> str:
         Використовується при реєстрації або зміні пароля.
         """
     # обмежуємо довжину пароля до 72 символів
-    return bcrypt.hash(password[:72])
+    return bcrypt.using(rounds=BCRYPT_ROUNDS).hash(password[:72])
 
 
 def verify_password(plain_password, hashed_password):
@@ -33,6 +50,32 @@ def verify_password(plain_password, hashed_password):
     return bcrypt.verify(plain_password[:72], hashed_password)
 
 
+# Пул процесів для bcrypt: хешування не займає потоки, що обслуговують інші запити
+hash_pool = BoundedProcessPool(
+    "password-hash",
+    max_workers=PASSWORD_HASH_WORKERS,
+    max_pending=PASSWORD_HASH_QUEUE_LIMIT,
+    retry_after=PASSWORD_HASH_RETRY_AFTER,
+    preload=(__name__,),
+)
+
+
+async def hash_password_async(password: str) -> str:
+    """
+    hash_password у пулі процесів.
+    Піднімає PoolSaturated, якщо пул перевантажений.
+    """
+    return await hash_pool.run(hash_password, password)
+
+
+async def verify_password_async(plain_password, hashed_password) -> bool:
+    """
+    verify_password у пулі процесів.
+    Піднімає PoolSaturated, якщо пул перевантажений.
+    """
+    return await hash_pool.run(verify_password, plain_password, hashed_password)
+
+
 # Створення JWT токену
 def create_access_token(data: dict, expires_delta: timedelta | None = None):
     """
@@ -49,3 +92,64 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
     to_encode.update({"exp": expire})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
+
+
+def decode_access_token(token: str) -> dict:
+    """
+    Декодує та перевіряє JWT токен.
+    Піднімає JWTError, якщо підпис недійсний або токен протермінований.
+    """
+    return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+
+
+# Кеш автентифікованих користувачів
+
+@dataclass(frozen=True)
+class CurrentUser:
+    """
+    Легке представлення автентифікованого користувача.
+    Містить лише те, що потрібно роутам, тому його можна кешувати між запитами.
+    """
+    id: int
+    email: str
+
+
+user_cache = TTLCache(maxsize=AUTH_CACHE_SIZE, ttl=AUTH_CACHE_TTL)
+
+
+def cache_user(token: str, user: CurrentUser, payload: dict):
+    """
+    Кешує користувача для токена, але не довше, ніж живе сам токен.
+    """
+    ttl = AUTH_CACHE_TTL
+    if "exp" in payload:
+        ttl = min(ttl, payload["exp"] - time.time())
+    user_cache.set(token, user, ttl=ttl)
+
+
+def invalidate_user(user_id: int | None = None, email: str | None = None) -> int:
+    """
+    Видаляє з кешу всі токени користувача (за id або email).
+    Кеш локальний для процесу: інші воркери позбудуться запису після AUTH_CACHE_TTL.
+    """
+    return user_cache.discard_where(
+        lambda user: user.id == user_id or (email is not None and user.email == email)
+    )
+
+
+@event.listens_for(models.User, "after_update")
+def _invalidate_on_credentials_change(mapper, connection, target):
+    """
+    Зміна email або пароля робить закешовані токени користувача недійсними.
+    """
+    state = inspect(target)
+    if state.attrs.email.history.has_changes() or state.attrs.hashed_password.history.has_changes():
+        old_emails = state.attrs.email.history.deleted or ()
+        invalidate_user(user_id=target.id)
+        for old_email in old_emails:
+            invalidate_user(email=old_email)
+
+
+@event.listens_for(models.User, "after_delete")
+def _invalidate_on_delete(mapper, connection, target):
+    invalidate_user(user_id=target.id)
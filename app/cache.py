@@ -0,0 +1,80 @@
+# cache.py — простий потокобезпечний LRU-кеш із TTL
+
+import threading                     # Кеш використовується з потоків threadpool
+import time                          # Монотонний час для TTL
+from collections import OrderedDict  # Порядок ключів = порядок використання (LRU)
+
+
+class TTLCache:
+    """
+    Обмежений LRU-кеш із часом життя записів.
+    - maxsize: максимальна кількість записів (найстаріші витісняються)
+    - ttl: час життя запису в секундах (можна зменшити для окремого запису)
+    Рахує влучання/промахи, щоб можна було перевірити ефективність кешу.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (value, expires_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """
+        Повертає значення або None, якщо запису немає чи він протермінований.
+        """
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[1] <= now:
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def set(self, key, value, ttl: float | None = None):
+        """
+        Додає запис. ttl не може перевищувати загальний ttl кешу.
+        """
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def discard_where(self, predicate):
+        """
+        Видаляє всі записи, для значень яких predicate(value) повертає True.
+        Повертає кількість видалених записів.
+        """
+        with self._lock:
+            keys = [key for key, (value, _) in self._data.items() if predicate(value)]
+            for key in keys:
+                del self._data[key]
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        """
+        Лічильники для моніторингу: розмір, влучання, промахи, hit ratio.
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            }
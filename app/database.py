@@ -1,7 +1,9 @@
 # database.py — підключення до бази даних через SQLAlchemy
 
-from sqlalchemy import create_engine                   # Створення "двигуна" для підключення до БД
+from sqlalchemy import create_engine, text             # Створення "двигуна" для підключення до БД
 from sqlalchemy.orm import sessionmaker, declarative_base  # Сесії та декларативна база моделей
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine  # Асинхронний режим
+from fastapi.concurrency import run_in_threadpool      # Синхронна сесія поза event loop
 import os                                              # Робота з системними змінними
 from dotenv import load_dotenv                         # Завантаження змінних середовища з .env
 
@@ -11,25 +13,128 @@ load_dotenv() # Підтягуємо конфігурацію (DATABASE_URL, SEC
 # Отримуємо URL для підключення до PostgreSQL із .env
 DATABASE_URL = os.getenv("DATABASE_URL")
 
-# Друк у консоль для відладки (можна вимкнути після тестів)
-print("DATABASE_URL:", DATABASE_URL)
+# Лог усіх SQL-запитів (лише для відладки: під навантаженням коштує помітного CPU)
+DB_ECHO = os.getenv("DB_ECHO", "False").lower() == "true"
 
-# Налаштування SQLAlchemy
+# Режим роботи з БД: False — синхронний (psycopg2), True — асинхронний (asyncpg / aiosqlite)
+DB_ASYNC = os.getenv("DB_ASYNC", "False").lower() == "true"
+# URL для асинхронного драйвера; за замовчуванням виводиться з DATABASE_URL
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL")
+
+# Налаштування пулу з'єднань (ігноруються для SQLite)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))            # Постійні з'єднання у пулі
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))      # Додаткові з'єднання під піковим навантаженням
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))      # Скільки чекати на вільне з'єднання (секунди)
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "True").lower() == "true"  # Перевірка з'єднання перед видачею
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))    # statement_timeout у Postgres (0 — без ліміту)
+
+
+def to_async_url(url: str) -> str:
+    """
+    Перетворює синхронний URL на URL асинхронного драйвера:
+    postgresql:// → postgresql+asyncpg://, sqlite:// → sqlite+aiosqlite://
+    """
+    scheme, sep, rest = url.partition("://")
+    dialect = scheme.split("+")[0]
+    if dialect in ("postgresql", "postgres"):
+        return f"postgresql+asyncpg{sep}{rest}"
+    if dialect == "sqlite":
+        return f"sqlite+aiosqlite{sep}{rest}"
+    return url
+
+
+def engine_options(url: str, is_async: bool = False) -> dict:
+    """
+    Параметри create_engine / create_async_engine для заданого URL:
+    розмір пулу, pre-ping і statement_timeout (лише для Postgres).
+    """
+    options = {"echo": DB_ECHO}
+    if url.startswith("sqlite"):
+        return options
+
+    options.update(
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_pre_ping=DB_POOL_PRE_PING,
+    )
+    if DB_STATEMENT_TIMEOUT_MS > 0:
+        if is_async:
+            options["connect_args"] = {"server_settings": {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}}
+        else:
+            options["connect_args"] = {"options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"}
+    return options
 
-# "engine" — основний об’єкт, що відповідає за підключення до БД
-engine = create_engine(DATABASE_URL, echo=True)
 
+# Налаштування SQLAlchemy
+#
+# Двигуни створюються в init_engines() — з lifespan застосунку (у кожному воркері окремо)
+# або на старті скрипта, а закриваються в dispose_engines(). Імпорт модуля нічого не створює
+# і не підключається до БД, тож імпорт застосунку (preload у gunicorn, тести) лишається дешевим.
+
+# "engine" — основний об’єкт, що відповідає за підключення до БД (після init_engines())
+engine = None
+# Асинхронний двигун (лише в режимі DB_ASYNC)
+async_engine = None
 
-# "SessionLocal" — фабрика для створення сесій БД
+# "SessionLocal" — фабрика для створення сесій БД (прив'язується до engine в init_engines())
 # autocommit=False → зміни не зберігаються автоматично
 # autoflush=False → SQL-запити виконуються лише вручну
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+SessionLocal = sessionmaker(autocommit=False, autoflush=False)
+
+# Асинхронна фабрика сесій
+# expire_on_commit=False → об'єкти лишаються доступними після commit без повторного запиту
+AsyncSessionLocal = async_sessionmaker(autoflush=False, expire_on_commit=False)
+
+
+def init_engines():
+    """
+    Створює двигуни (повторний виклик нічого не робить) і прив'язує до них фабрики сесій.
+    """
+    global engine, async_engine
+    if engine is None:
+        engine = create_engine(DATABASE_URL, **engine_options(DATABASE_URL))
+        SessionLocal.configure(bind=engine)
+    if DB_ASYNC and async_engine is None:
+        async_url = ASYNC_DATABASE_URL or to_async_url(DATABASE_URL)
+        async_engine = create_async_engine(async_url, **engine_options(async_url, is_async=True))
+        AsyncSessionLocal.configure(bind=async_engine)
+    return engine
+
+
+async def dispose_engines():
+    """
+    Закриває пули з'єднань (при зупинці застосунку).
+    """
+    global engine, async_engine
+    if async_engine is not None:
+        await async_engine.dispose()
+        async_engine = None
+    if engine is not None:
+        engine.dispose()
+        engine = None
+
+
+async def ping():
+    """
+    Перевірка з'єднання з БД (SELECT 1) для /health/ready.
+    """
+    if async_engine is not None:
+        async with async_engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+        return
+
+    def select_one():
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+
+    await run_in_threadpool(select_one)
 
 # "Base" — декларативна база, від якої успадковуються всі моделі (User, Note, File)
 Base = declarative_base()
 
 # Dependency для FastAPI
-def get_db():
+def get_sync_db():
     """
         Отримати сесію для роботи з БД.
         Використовується у Depends(), щоб автоматично відкривати/закривати з’єднання.
@@ -41,3 +146,42 @@ def get_db():
         db.close()
 
 
+async def get_async_db():
+    """
+    Асинхронний варіант get_sync_db: повертає AsyncSession.
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+# Залежність, яку використовують роути: обирається конфігурацією DB_ASYNC
+get_db = get_async_db if DB_ASYNC else get_sync_db
+
+
+async def run_db(db, fn, *args, **kwargs):
+    """
+    Виконує fn(session, *args, **kwargs) — звичайну синхронну функцію роботи з БД —
+    не блокуючи event loop:
+    - AsyncSession: через run_sync (asyncpg / aiosqlite, без потоків)
+    - Session: у threadpool
+    Так одні й ті самі запити працюють в обох режимах.
+    """
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(fn, *args, **kwargs)
+    return await run_in_threadpool(fn, db, *args, **kwargs)
+
+
+async def run_in_session(fn, *args, **kwargs):
+    """
+    Як run_db, але у власній короткій сесії, що закривається одразу після fn —
+    для довгих відповідей (потік подій), які не мають тримати з'єднання з БД.
+    """
+    if DB_ASYNC:
+        async with AsyncSessionLocal() as db:
+            return await db.run_sync(fn, *args, **kwargs)
+
+    def call():
+        with SessionLocal() as db:
+            return fn(db, *args, **kwargs)
+
+    return await run_in_threadpool(call)
@@ -1,22 +1,87 @@
 # main.py — головний вхідний файл застосунку
 
 # Імпорти основних залежностей
-from fastapi import FastAPI                 # Фреймворк для створення API
-from app.database import Base, engine         # База даних: декларативна база та підключення (SQLAlchemy)
-from app.routes import users, notes                  # Імпорт роутів (endpoints) для користувачів
+import logging                              # Фільтр журналу доступу
+import os                                   # Змінні середовища (DEBUG)
+from contextlib import asynccontextmanager  # Lifespan: старт і зупинка застосунку
+from fastapi import FastAPI, Response       # Фреймворк для створення API
+from fastapi.concurrency import run_in_threadpool    # create_all поза event loop
+from app import database                             # Двигуни БД створюються в lifespan
+from app.routes import users, notes, health          # Імпорт роутів (endpoints) для користувачів
+from app import auth                                 # Кеш користувачів та пул хешування паролів
+from app.services import storage, uploads, outbox, thumbnails, metrics, compression, ratelimit, feed  # Сховище файлів, ліміт розміру завантажень, outbox, мініатюри, метрики, стиснення, ліміти частоти, потік подій
+from fastapi.staticfiles import StaticFiles          # Роздача файлів локального сховища
 
 
-# Створення таблиць у базі даних
-# Якщо таблиць ще немає — вони будуть створені
-Base.metadata.create_all(bind=engine)
+# Схемою БД керують міграції (alembic upgrade head).
+# DB_AUTO_CREATE=True — створити таблиці через create_all на старті (лише для локальної розробки)
+DB_AUTO_CREATE = os.getenv("DB_AUTO_CREATE", "False").lower() == "true"
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Старт воркера: двигуни БД, (опційно) таблиці, воркер outbox.
+    Імпорт модуля нічого з цього не робить, тож gunicorn може завантажити застосунок
+    один раз у master-процесі (preload_app), а з'єднання створюються вже у воркерах.
+    """
+    database.init_engines()
+    if DB_AUTO_CREATE:
+        await run_in_threadpool(database.Base.metadata.create_all, bind=database.engine)
+    storage.get_service()  # Лише об'єкт сервісу; HTTP-клієнт створиться при першому виклику
+    # Процеси bcrypt стартують до готовності, а не на першому логіні
+    if auth.PASSWORD_HASH_WARMUP:
+        await auth.hash_pool.warmup()
+    # Воркер outbox у процесі API (якщо не запущено окремо: python -m app.worker)
+    if outbox.OUTBOX_WORKER == "inprocess":
+        outbox.worker.start()
+    # Сповіщення потоків подій (/notes/events); для Postgres — слухач LISTEN/NOTIFY
+    feed.start(database.engine)
+    health.set_ready(True)
+    try:
+        yield
+    finally:
+        # Спершу перестаємо бути "ready", потім зупиняємо воркери, пули процесів,
+        # з'єднання сховища і пули з'єднань БД
+        health.set_ready(False)
+        await feed.stop()
+        await outbox.worker.stop()
+        auth.hash_pool.shutdown()
+        thumbnails.image_pool.shutdown()
+        await storage.aclose()
+        await ratelimit.aclose()
+        await database.dispose_engines()
 
 
 # Ініціалізація FastAPI-додатку
-app = FastAPI(title="Cloud Notes API - Dev")  # Назва відображатиметься в Swagger UI
+app = FastAPI(title="Cloud Notes API", lifespan=lifespan)  # Назва відображатиметься в Swagger UI
 
 # Підключення роутів
 app.include_router(users.router)              # Реєстрація всіх endpoint з users
 app.include_router(notes.router)
+app.include_router(health.router)             # /health/live і /health/ready
+
+# Відхиляємо завеликі завантаження ще до розбору multipart
+app.add_middleware(uploads.UploadSizeLimitMiddleware, paths=("/notes/upload",))
+
+# Стиснення JSON-відповідей (brotli/gzip) від COMPRESS_MIN_SIZE байт
+app.add_middleware(compression.CompressionMiddleware)
+
+# Ліміти частоти запитів (token bucket за IP / користувачем / маршрутом) — до будь-якої роботи з БД
+app.add_middleware(ratelimit.RateLimitMiddleware)
+
+# Затримки, SQL-запити і час у БД для кожного запиту (останнім — тобто зовнішнім, щоб бачити і 413)
+# Потоки подій не міряємо: їхня "затримка" — це час життя з'єднання
+app.add_middleware(metrics.MetricsMiddleware, skip_paths=("/metrics", "/health/live", "/health/ready", "/notes/events"))
+
+# Токен потоку подій (?access_token=) не має потрапляти в журнал доступу uvicorn/gunicorn
+logging.getLogger("uvicorn.access").addFilter(feed.AccessLogFilter(("/notes/events",)))
+
+# Локальне сховище (STORAGE_BACKEND=local) роздаємо як статичні файли
+if storage.STORAGE_BACKEND == "local":
+    os.makedirs(storage.LOCAL_STORAGE_DIR, exist_ok=True)
+    app.mount("/files", StaticFiles(directory=storage.LOCAL_STORAGE_DIR), name="files")
+
 
 # Тестовий маршрут
 # Перевірка працездатності API
@@ -24,3 +89,44 @@ app.include_router(notes.router)
 async def root():
     return {"message": "Cloud Notes API — OK"}
 
+
+# Метрики для Prometheus
+if metrics.METRICS_ENABLED:
+    @app.get("/metrics", include_in_schema=False)
+    async def prometheus_metrics():
+        await outbox.export_metrics()  # Глибина, dead-події і lag черги outbox
+        body, content_type = metrics.render()
+        return Response(content=body, media_type=content_type)
+
+
+# Лічильники кешу користувачів і outbox (лише в режимі відладки)
+if os.getenv("DEBUG", "False").lower() == "true":
+    @app.get("/debug/auth-cache")
+    async def auth_cache_stats():
+        return auth.user_cache.stats()
+
+    # Глибина черги outbox і lag
+    @app.get("/debug/outbox")
+    def outbox_stats():
+        with database.SessionLocal() as db:
+            return outbox.stats(db)
+
+    # Стан circuit breaker сховища
+    @app.get("/debug/storage")
+    async def storage_stats():
+        return storage.get_service().stats()
+
+    # Підписники потоку подій /notes/events
+    @app.get("/debug/feed")
+    async def feed_stats():
+        return feed.broadcaster.stats()
+
+    # Бекенд лімітів частоти і відмови за політиками
+    @app.get("/debug/ratelimit")
+    async def ratelimit_stats():
+        return ratelimit.get_limiter().stats()
+
+    # Завантаженість пулу рендерингу мініатюр
+    @app.get("/debug/thumbnails")
+    async def thumbnails_stats():
+        return thumbnails.image_pool.stats()
@@ -1,9 +1,19 @@
 # models.py — опис таблиць бази даних через SQLAlchemy ORM
 
-from sqlalchemy import Column, Integer, String, ForeignKey, Text  # Типи полів та зовнішні ключі
+from sqlalchemy import Column, Integer, BigInteger, String, ForeignKey, Text, Index, UniqueConstraint  # Типи полів, ключі, індекси
+from sqlalchemy import DDL, event, JSON, DateTime                 # DDL для PostgreSQL, JSON (outbox, варіанти зображень), час
 from sqlalchemy.orm import relationship                           # Зв’язки між таблицями
+from datetime import datetime, timezone                           # Час змін (UTC)
 from app.database import Base                                     # Базовий клас для моделей
 
+
+def utcnow() -> datetime:
+    """
+    Поточний час UTC без tzinfo (однаково зберігається у PostgreSQL і SQLite).
+    """
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
 # Таблиця користувачів
 class User(Base):
     __tablename__ = "users"# Назва таблиці у БД
@@ -12,6 +22,8 @@ class User(Base):
     id = Column(Integer, primary_key=True, index=True)  # Первинний ключ
     email = Column(String, unique=True, index=True, nullable=False)  # Унікальний email
     hashed_password = Column(String, nullable=False)  # Хешований пароль (не зберігаємо відкритий!)
+    notes_version = Column(BigInteger, nullable=False, default=0, server_default="0")  # Версія колекції нотаток (росте з кожною зміною)
+    notes_pruned_version = Column(BigInteger, nullable=False, default=0, server_default="0")  # Tombstones до цієї версії вже видалено
 
     # Зв’язки
     notes = relationship("Note", back_populates="owner")  # Один користувач → багато нотаток
@@ -27,12 +39,42 @@ class Note(Base):
     title = Column(String, nullable=False)               # Заголовок нотатки
     content = Column(Text, nullable=True)                # Текстовий вміст (може бути пустим)
     file_url = Column(String, nullable=True)             # Зображення(посилання на supabase)
+    version = Column(BigInteger, nullable=False, default=0, server_default="0")  # notes_version користувача на момент останньої зміни
+    updated_at = Column(DateTime, nullable=True, default=utcnow, onupdate=utcnow)  # Час останньої зміни (UTC)
 
-    # Зовнішній ключ
+    # Зовнішні ключі
     user_id = Column(Integer, ForeignKey("users.id"))    # Прив’язка до користувача (users.id)
+    file_id = Column(Integer, ForeignKey("files.id"), nullable=True, index=True)  # Прикріплений файл (files.id)
 
     # Зв’язки
     owner = relationship("User", back_populates="notes") # Зворотній зв’язок до User
+    file = relationship("File", back_populates="notes", lazy="joined")  # Файл, спільний для нотаток з однаковим вмістом (завжди потрібен для variants)
+
+    # Індекси: keyset-пагінація (user_id, id) і зміни після версії (user_id, version)
+    __table_args__ = (
+        Index("ix_notes_user_id_id", "user_id", "id"),
+        Index("ix_notes_user_id_version", "user_id", "version"),
+    )
+
+    @property
+    def variants(self):
+        """
+        URL зменшених копій прикріпленого зображення ({назва: URL}) або None.
+        """
+        return self.file.variants if self.file is not None else None
+
+
+# Повнотекстовий пошук (лише PostgreSQL): згенерована колонка tsvector + GIN-індекс.
+# Заголовок має вагу A, текст — B. Колонка не описана в моделі, щоб схема
+# лишалася сумісною з SQLite; запити до неї — у app/services/search.py.
+NOTES_SEARCH_DDL = (
+    "ALTER TABLE notes ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('simple', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(content, '')), 'B')) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_notes_search_vector ON notes USING GIN (search_vector)",
+)
+for _statement in NOTES_SEARCH_DDL:
+    event.listen(Note.__table__, "after_create", DDL(_statement).execute_if(dialect="postgresql"))
 
 
 # Таблиця файлів
@@ -43,9 +85,55 @@ class File(Base):
     id = Column(Integer, primary_key=True, index=True)   # Первинний ключ
     filename = Column(String, nullable=False)            # Ім’я файлу
     url = Column(String, nullable=False)                 # Шлях/посилання до файлу
+    path = Column(String, nullable=True)                 # Шлях всередині бакета
+    sha256 = Column(String(64), nullable=True)           # Хеш вмісту — ключ дедуплікації
+    size = Column(BigInteger, nullable=True)             # Розмір у байтах
+    content_type = Column(String, nullable=True)         # MIME-тип
+    ref_count = Column(Integer, nullable=False, default=1)  # Скільки нотаток посилається на файл
+    variants = Column(JSON(none_as_null=True), nullable=True)  # {назва: URL} мініатюр; NULL — ще не згенеровано, {} — не зображення
 
     # Зовнішній ключ
     user_id = Column(Integer, ForeignKey("users.id"))    # Прив’язка до користувача (users.id)
 
     # Зв’язки
     owner = relationship("User", back_populates="files") # Зворотній зв’язок до User
+    notes = relationship("Note", back_populates="file")  # Нотатки, що використовують файл
+
+    # Один і той самий вміст зберігається для користувача лише раз
+    __table_args__ = (UniqueConstraint("user_id", "sha256", name="uq_files_user_id_sha256"),)
+
+
+# Таблиця видалених нотаток: потрібна, щоб /notes/changes повідомляв клієнтам про видалення
+class NoteTombstone(Base):
+    __tablename__ = "note_tombstones"  # Назва таблиці у БД
+
+    # Поля таблиці
+    id = Column(Integer, primary_key=True)                       # Первинний ключ
+    note_id = Column(Integer, nullable=False)                    # ID видаленої нотатки
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)  # Власник
+    version = Column(BigInteger, nullable=False)                 # notes_version користувача на момент видалення
+    deleted_at = Column(DateTime, nullable=False, default=utcnow)  # Час видалення (UTC)
+
+    __table_args__ = (
+        Index("ix_note_tombstones_user_id_version", "user_id", "version"),
+        Index("ix_note_tombstones_deleted_at", "deleted_at"),  # Очищення старих tombstones
+    )
+
+
+# Таблиця outbox: побічні дії (видалення файлів зі сховища тощо),
+# записані в тій самій транзакції, що й зміни в БД, і виконані фоновим воркером
+class OutboxEvent(Base):
+    __tablename__ = "outbox"  # Назва таблиці у БД
+
+    # Поля таблиці
+    id = Column(Integer, primary_key=True)                       # Первинний ключ (порядок обробки)
+    kind = Column(String, nullable=False)                        # Тип події, наприклад "storage.remove"
+    payload = Column(JSON, nullable=False)                       # Дані для обробника
+    status = Column(String, nullable=False, default="pending")   # pending → (видаляється) або dead
+    attempts = Column(Integer, nullable=False, default=0)        # Кількість спроб обробки
+    available_at = Column(DateTime, nullable=False)              # Не раніше цього часу (UTC) — backoff і lease
+    created_at = Column(DateTime, nullable=False)                # Час створення (UTC) — для метрики lag
+    last_error = Column(Text, nullable=True)                     # Остання помилка обробки
+
+    # Воркер вибирає: WHERE status = 'pending' AND available_at <= now ORDER BY id
+    __table_args__ = (Index("ix_outbox_status_available_at", "status", "available_at"),)
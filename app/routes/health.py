@@ -0,0 +1,52 @@
+# routes/health.py — перевірки стану для оркестратора (Docker, Kubernetes, балансувальник)
+#
+# /health/live  — процес живий і обслуговує event loop (без звернень до залежностей)
+# /health/ready — воркер завершив старт і БД відповідає; під час зупинки повертає 503,
+#                 щоб балансувальник перестав слати запити. Стан сховища (circuit breaker)
+#                 лише звітується в тілі: сховище спільне для всіх воркерів, breaker розмикається
+#                 в усіх одночасно, і 503 вивів би з ротації весь флот, хоча нотатки без файлів працюють.
+#                 probe_stuck — пробна спроба half-open висить довше за STORAGE_CIRCUIT_RESET
+
+import asyncio                                 # Таймаут перевірки БД
+import os                                      # Налаштування зі змінних середовища
+from fastapi import APIRouter                  # Роутер FastAPI
+from fastapi.responses import JSONResponse     # Відповідь 503 з деталями перевірок
+from app import database                       # Перевірка з'єднання з БД
+from app.services import storage               # Стан circuit breaker сховища
+
+HEALTH_DB_TIMEOUT = float(os.getenv("HEALTH_DB_TIMEOUT", "2"))  # Скільки чекати на SELECT 1 (секунди)
+
+router = APIRouter(prefix="/health", tags=["health"])
+
+_ready = False
+
+
+def set_ready(value: bool):
+    """
+    Викликається з lifespan: True після старту, False на початку зупинки.
+    """
+    global _ready
+    _ready = value
+
+
+@router.get("/live")
+async def live():
+    return {"status": "ok"}
+
+
+@router.get("/ready")
+async def ready():
+    checks = {"startup": "ok" if _ready else "not ready"}
+    try:
+        await asyncio.wait_for(database.ping(), timeout=HEALTH_DB_TIMEOUT)
+        checks["database"] = "ok"
+    except Exception as e:
+        checks["database"] = f"error: {type(e).__name__}"
+    breaker = storage.get_service().breaker
+    report = {"circuit": breaker.state, "probe_stuck": breaker.probe_stuck}  # Не впливає на готовність
+
+    healthy = all(value == "ok" for value in checks.values())
+    return JSONResponse(
+        status_code=200 if healthy else 503,
+        content={"status": "ok" if healthy else "fail", "checks": checks, "storage": report},
+    )
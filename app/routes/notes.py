@@ -1,29 +1,58 @@
-import uuid
-from urllib.parse import urlparse, unquote
+import logging
+import mimetypes
+import os
+import re
+import secrets
+import time
+from collections import Counter
 
-from fastapi import APIRouter, Depends, HTTPException, Header, File, UploadFile # Для створення роутів, залежностей та обробки помилок
+from fastapi import APIRouter, Depends, HTTPException, Header, File, UploadFile, Query, Response # Для створення роутів, залежностей та обробки помилок
 from fastapi.params import Form
-from sqlalchemy import and_
+from fastapi.responses import RedirectResponse, StreamingResponse
+from sqlalchemy import and_, select, insert, update, delete
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session  # Для роботи з базою даних через сесію SQLAlchemy
 from typing import List, Optional  # Для вказівки типу списку у відповіді
-from app.database import get_db  # Функція для отримання сесії бази даних
-from app import models  # Моделі таблиць (User, Note)
-from app.routes.schemas import NoteOut  # Pydantic-схеми для валідації вхідних та вихідних даних
-from jose import jwt, JWTError  # Для роботи з JWT-токенами
-from app.services import storage
+from fastapi.concurrency import run_in_threadpool  # Блокуючі виклики (storage) поза event loop
+from app import database  # Фабрики сесій для стрімінгу
+from app.database import get_db, run_db  # Сесія БД та виконання запитів без блокування event loop
+from app import models, auth  # Моделі таблиць (User, Note) та автентифікація
+from app.routes.schemas import NoteOut, NoteFromHash, NoteSearchPage, NoteBatch, NoteBatchResult, NoteChanges  # Pydantic-схеми для валідації вхідних та вихідних даних
+from jose import JWTError  # Помилка перевірки JWT-токена
+from app.services import storage, uploads, search, outbox, changes, thumbnails, serialization, feed
+from app.services.workers import PoolSaturated  # Пул рендерингу мініатюр перевантажений
+
+logger = logging.getLogger(__name__)
 
 # Створення роутера FastAPI для нотаток
 router = APIRouter(prefix="/notes", tags=["notes"])
 
+# Налаштування списку нотаток
+NOTE_FIELDS = ("id", "title", "content", "user_id", "file_url", "variants", "version", "updated_at")  # Поля, доступні через ?fields=
+DEFAULT_PAGE_SIZE = 100    # Розмір сторінки за замовчуванням
+MAX_PAGE_SIZE = 1000       # Максимальний limit для однієї сторінки
+STREAM_BATCH_SIZE = 500    # Скільки рядків тягнути з серверного курсора за раз
+
+NOTES_BUCKET = "notes-files"  # Бакет для файлів нотаток
+
+SEARCH_PAGE_SIZE = 20      # Розмір сторінки пошуку за замовчуванням
+MAX_SEARCH_OFFSET = 1000   # Глибше гортати результати пошуку немає сенсу
+MAX_BATCH_SIZE = 500       # Максимум операцій в одному пакетному запиті
+CHANGES_PAGE_SIZE = 500    # Максимум змінених нотаток в одній відповіді /notes/changes
+
+# Потік подій /notes/events
+FEED_HEARTBEAT = float(os.getenv("FEED_HEARTBEAT", "20"))          # Коментар-пінг, щоб проксі не закривали з'єднання (секунди)
+FEED_RETRY_MS = int(os.getenv("FEED_RETRY_MS", "3000"))            # Пауза перед перепідключенням EventSource
+FEED_MAX_CATCHUP_PAGES = int(os.getenv("FEED_MAX_CATCHUP_PAGES", "10"))  # Далі — подія resync замість дочитування змін
+
 
 # Залежність: отримання поточного користувача
-def get_current_user(authorization: str = Header(...), db: Session = Depends(get_db)):
+async def get_current_user(authorization: str = Header(...), db: Session = Depends(get_db)) -> auth.CurrentUser:
     """
     Отримує користувача за JWT-токеном з заголовка Authorization.
-    Повертає об'єкт User або піднімає HTTPException, якщо токен недійсний.
+    Повертає CurrentUser (id, email) або піднімає HTTPException, якщо токен недійсний.
+    Повторні запити з тим самим токеном обслуговуються з кешу без декодування та запиту до БД.
     """
-    from app.auth import SECRET_KEY, ALGORITHM  # Секретний ключ і алгоритм для декодування JWT
-
     # Перевіряємо, чи починається заголовок з "Bearer "
     if not authorization.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Invalid token")
@@ -31,139 +60,849 @@ def get_current_user(authorization: str = Header(...), db: Session = Depends(get
     # Відрізаємо "Bearer" для отримання чистого токена
     token = authorization[7:]
 
+    cached = auth.user_cache.get(token)
+    if cached is not None:
+        return cached
+
     try:
         # Декодуємо JWT-токен
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email = payload.get("sub")  # Отримуємо email з payload
+        payload = auth.decode_access_token(token)
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Invalid token")
 
-        if email is None:
-            raise HTTPException(status_code=401, detail="Invalid token")
+    email = payload.get("sub")  # Отримуємо email з payload
+    if email is None:
+        raise HTTPException(status_code=401, detail="Invalid token")
 
-        # Шукаємо користувача у базі даних
-        user = db.query(models.User).filter_by(email=email).first()
+    # Шукаємо користувача у базі даних (лише потрібні колонки)
+    row = await run_db(db, _find_user_row, email)
+    if row is None:
+        raise HTTPException(status_code=401, detail="User not found")
 
-        if user is None:
-            raise HTTPException(status_code=401, detail="User not found")
+    user = auth.CurrentUser(id=row.id, email=row.email)
+    auth.cache_user(token, user, payload)
+    return user
 
-        return user  # Повертаємо об'єкт користувача
-    except JWTError:
-        raise HTTPException(status_code=401, detail="Invalid token")
+
+def _find_user_row(db: Session, email: str):
+    return db.execute(
+        select(models.User.id, models.User.email).where(models.User.email == email)
+    ).first()
 
 
 # CRUD нотаток
 
-# Отримання всіх нотаток користувача
+# Отримання нотаток користувача (keyset-пагінація, проєкція полів, стрімінг)
 @router.get("/", response_model=List[NoteOut])
-def get_notes(
+async def get_notes(
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[int] = Query(None, ge=0),
+    fields: Optional[str] = Query(None),
+    shape: str = Query("rows", pattern="^(rows|columns)$"),
+    stream: Optional[str] = Query(None, pattern="^(ndjson|json)$"),
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+    user: auth.CurrentUser = Depends(get_current_user)
+):
+    """
+    Повертає нотатки поточного користувача, відсортовані за id.
+    - limit: розмір сторінки (за замовчуванням DEFAULT_PAGE_SIZE)
+    - cursor: id останньої нотатки з попередньої сторінки;
+      наступний курсор повертається у заголовку X-Next-Cursor
+    - fields: список полів через кому, наприклад "id,title" (без content)
+    - shape: "rows" — масив об'єктів; "columns" — об'єкт {поле: [значення...]},
+      ключі не повторюються для кожної нотатки (для великих сторінок)
+    - stream: "ndjson" або "json" — віддає рядки потоком із серверного курсора,
+      без ліміту сторінки, якщо limit не задано
+    Сторінки мають ETag на основі версії колекції: при збігу If-None-Match
+    повертається 304 без запиту нотаток.
+    """
+    columns = _note_columns(fields)
+    stmt = select(*columns).select_from(models.Note).where(models.Note.user_id == user.id)
+    if any(column.name == "variants" for column in columns):
+        stmt = stmt.outerjoin(models.File, models.Note.file_id == models.File.id)
+    if cursor is not None:
+        stmt = stmt.where(models.Note.id > cursor)
+    stmt = stmt.order_by(models.Note.id)
+
+    if stream:
+        if limit is not None:
+            stmt = stmt.limit(limit)
+        media_type = "application/x-ndjson" if stream == "ndjson" else "application/json"
+        rows_iter = _stream_notes_async(stmt, stream) if database.DB_ASYNC else _stream_notes(stmt, stream)
+        return StreamingResponse(rows_iter, media_type=media_type)
+
+    page_size = limit or DEFAULT_PAGE_SIZE
+    # Версію читаємо до нотаток, тож ETag ніколи не "новіший" за дані
+    version = await run_db(db, changes.current_version, user.id)
+    etag = changes.collection_etag(user.id, version, f"{page_size}|{cursor}|{fields}|{shape}")
+    headers = {"ETag": etag, "Cache-Control": changes.CACHE_CONTROL}
+    if changes.etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    # Беремо на один рядок більше, щоб знати, чи є наступна сторінка
+    keys, rows = await run_db(db, _fetch_rows, stmt.limit(page_size + 1))
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        headers["X-Next-Cursor"] = str(rows[-1][keys.index("id")])
+
+    # Рядки з БД кодуються в JSON напряму, без валідації через NoteOut (формат той самий)
+    return serialization.RowsResponse(keys, rows, shape, headers=headers)
+
+
+def _note_columns(fields: Optional[str]):
+    """
+    Перетворює параметр ?fields= на список колонок таблиці notes.
+    id додається завжди, бо він потрібен для курсора.
+    """
+    if not fields:
+        return [_note_column(name) for name in NOTE_FIELDS]
+
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in names if name not in NOTE_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    if "id" not in names:
+        names.insert(0, "id")
+    return [_note_column(name) for name in dict.fromkeys(names)]
+
+
+def _note_column(name: str):
+    # variants зберігаються у files — спільні для нотаток з однаковим файлом
+    if name == "variants":
+        return models.File.variants.label("variants")
+    return getattr(models.Note, name)
+
+
+def _fetch_rows(db: Session, stmt) -> tuple[list[str], list[tuple]]:
+    """
+    Назви колонок і рядки як кортежі (без dict на кожен рядок).
+    """
+    result = db.execute(stmt)
+    return list(result.keys()), [tuple(row) for row in result]
+
+
+def _encode_rows(keys: list[str], rows, mode: str, first: bool) -> bytes:
+    """
+    Пачка рядків потокової відповіді одним блоком: NDJSON-рядки або елементи JSON-масиву.
+    Стиснення скидає буфер на кожному блоці, тож блок на рядок стискався б погано.
+    """
+    lines = [serialization.encode_row(keys, row) for row in rows]
+    if mode == "ndjson":
+        return b"\n".join(lines) + b"\n"
+    chunk = b",".join(lines)
+    return chunk if first else b"," + chunk
+
+
+def _stream_notes(stmt, mode: str):
+    """
+    Генератор для StreamingResponse: читає рядки з серверного курсора
+    пачками по STREAM_BATCH_SIZE і віддає кожну пачку одним блоком,
+    тож пам'ять не залежить від кількості нотаток.
+    Використовує власну сесію, бо відповідь віддається вже після виходу з хендлера.
+    """
+    db = database.SessionLocal()
+    try:
+        result = db.execute(stmt.execution_options(yield_per=STREAM_BATCH_SIZE))
+        keys = list(result.keys())
+        if mode == "json":
+            yield b"["
+        first = True
+        for rows in result.partitions():
+            yield _encode_rows(keys, rows, mode, first)
+            first = False
+        if mode == "json":
+            yield b"]"
+    finally:
+        db.close()
+
+
+async def _stream_notes_async(stmt, mode: str):
+    """
+    Те саме, що _stream_notes, але для асинхронного режиму (AsyncSession.stream).
+    """
+    async with database.AsyncSessionLocal() as db:
+        result = await db.stream(stmt.execution_options(yield_per=STREAM_BATCH_SIZE))
+        keys = list(result.keys())
+        if mode == "json":
+            yield b"["
+        first = True
+        async for rows in result.partitions():
+            yield _encode_rows(keys, rows, mode, first)
+            first = False
+        if mode == "json":
+            yield b"]"
+
+# Повнотекстовий пошук по нотатках
+@router.get("/search", response_model=NoteSearchPage)
+async def search_notes(
+    q: str = Query(..., min_length=1, max_length=256),
+    limit: int = Query(SEARCH_PAGE_SIZE, ge=1, le=100),
+    offset: int = Query(0, ge=0, le=MAX_SEARCH_OFFSET),
+    db: Session = Depends(get_db),
+    user: auth.CurrentUser = Depends(get_current_user)
+):
+    """
+    Шукає нотатки поточного користувача за словами із заголовка та тексту.
+    Результати ранжовані (збіг у заголовку важить більше) і містять фрагменти зі збігами.
+    """
+    results = await run_db(db, search.search_notes, user.id, q, limit + 1, offset)
+    next_offset = None
+    if len(results) > limit:
+        results = results[:limit]
+        next_offset = offset + limit
+    return {"results": results, "next_offset": next_offset}
+
+# Зміни нотаток після заданої версії колекції
+@router.get("/changes", response_model=NoteChanges)
+async def get_changes(
+    since: int = Query(0, ge=0),
     db: Session = Depends(get_db),
-    user: models.User = Depends(get_current_user)
+    user: auth.CurrentUser = Depends(get_current_user)
+):
+    """
+    Повертає нотатки, змінені після версії since, та ID видалених нотаток.
+    Клієнт зберігає version з відповіді і передає її як since наступного разу.
+    Якщо has_more = true — треба одразу запитати наступну порцію.
+    Якщо видалення після since вже очищено (старші за TOMBSTONE_RETENTION_DAYS) — 410:
+    клієнт має перечитати список нотаток і продовжити з version нової відповіді.
+    """
+    try:
+        return await run_db(db, _collect_changes, user.id, since)
+    except changes.ChangesExpired as e:
+        raise HTTPException(status_code=410, detail=str(e))
+
+
+def _collect_changes(db: Session, user_id: int, since: int) -> dict:
+    """
+    Зміни у діапазоні версій (since, upto]. Якщо змінених нотаток більше за CHANGES_PAGE_SIZE,
+    upto обрізається по межі версії, щоб пакетні зміни з однією версією не розривались.
+    """
+    upto = changes.version_since(db, user_id, since)
+    if since >= upto:
+        return {"version": upto, "notes": [], "deleted": [], "has_more": False}
+
+    def changed_notes(limit=None):
+        stmt = (
+            select(models.Note)
+            .where(models.Note.user_id == user_id, models.Note.version > since, models.Note.version <= upto)
+            .order_by(models.Note.version, models.Note.id)
+        )
+        return db.scalars(stmt.limit(limit) if limit else stmt).all()
+
+    notes = changed_notes(CHANGES_PAGE_SIZE + 1)
+    has_more = len(notes) > CHANGES_PAGE_SIZE
+    if has_more:
+        upto = notes[CHANGES_PAGE_SIZE - 1].version
+        notes = changed_notes()
+
+    deleted = db.scalars(
+        select(models.NoteTombstone.note_id)
+        .where(models.NoteTombstone.user_id == user_id,
+               models.NoteTombstone.version > since, models.NoteTombstone.version <= upto)
+        .order_by(models.NoteTombstone.version)
+    ).all()
+    return {"version": upto, "notes": notes, "deleted": list(deleted), "has_more": has_more}
+
+# Потік змін нотаток (Server-Sent Events) замість періодичного опитування
+@router.get("/events")
+async def note_events(
+    since: Optional[int] = Query(None, ge=0),
+    access_token: Optional[str] = Query(None),
+    authorization: Optional[str] = Header(None),
+    last_event_id: Optional[str] = Header(None),
 ):
     """
-    Повертає список усіх нотаток поточного користувача.
+    text/event-stream з подіями:
+    - ready: {"version": N} — потік наздогнав поточну версію
+    - changes: те саме, що GET /notes/changes (notes, deleted, version, has_more)
+    - resync: {"version": N} — клієнт відстав надто сильно (або його since старший за
+      збережені tombstones), треба перечитати список нотаток
+    id кожної події — версія колекції. При перепідключенні EventSource сам передає
+    Last-Event-ID, і потік продовжується з цієї версії (або з ?since=).
+    Токен — у заголовку Authorization або ?access_token= (EventSource не вміє заголовків);
+    query string цього шляху не пишеться в журнал доступу (feed.AccessLogFilter).
+    Потік не тримає сесію БД: кожна порція змін читається в окремій короткій сесії.
+    Потік завершується, коли спливає токен, — клієнт перепідключається з новим.
+    """
+    token = access_token
+    if authorization:
+        if not authorization.startswith("Bearer "):
+            raise HTTPException(status_code=401, detail="Invalid token")
+        token = authorization[7:]
+    if not token:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    user, expires_at = await _stream_user(token)
+
+    if last_event_id and last_event_id.isdigit():
+        since = int(last_event_id)
+    if since is None:
+        since = await database.run_in_session(changes.current_version, user.id)
+    try:
+        subscription = feed.broadcaster.subscribe(user.id, since)
+    except feed.FeedFull as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e), headers={"Retry-After": "5"})
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(
+        _feed_events(subscription, since, expires_at), media_type="text/event-stream", headers=headers,
+    )
+
+
+async def _stream_user(token: str):
+    """
+    Як get_current_user, але без залежності get_db (її сесія жила б до кінця потоку).
+    Повертає (CurrentUser, час закінчення токена).
+    """
+    try:
+        payload = auth.decode_access_token(token)
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    user = auth.user_cache.get(token)
+    if user is None:
+        email = payload.get("sub")
+        if email is None:
+            raise HTTPException(status_code=401, detail="Invalid token")
+        row = await database.run_in_session(_find_user_row, email)
+        if row is None:
+            raise HTTPException(status_code=401, detail="User not found")
+        user = auth.CurrentUser(id=row.id, email=row.email)
+        auth.cache_user(token, user, payload)
+    return user, payload.get("exp")
+
+
+def _sse(name: str, version: int, data: str) -> str:
+    return f"id: {version}\nevent: {name}\ndata: {data}\n\n"
+
+
+def _changes_event(db: Session, user_id: int, since: int) -> tuple[int, bool, Optional[str]]:
+    """
+    Порція змін після since як JSON (серіалізується тут, поки сесія відкрита).
+    Повертає (версія, has_more, JSON або None, якщо змін немає).
+    """
+    result = _collect_changes(db, user_id, since)
+    if not result["notes"] and not result["deleted"]:
+        return result["version"], False, None
+    return result["version"], result["has_more"], NoteChanges.model_validate(result, from_attributes=True).model_dump_json()
+
+
+async def _feed_events(subscription, since: int, expires_at: Optional[float]):
+    """
+    Генератор подій одного потоку: дочитує зміни після since, далі лише чекає
+    на оголошення нової версії (без сесії БД і без черги), раз на FEED_HEARTBEAT шле пінг.
     """
-    return db.query(models.Note).filter_by(user_id=user.id).all()
+    user_id = subscription.user_id
+    try:
+        yield f"retry: {FEED_RETRY_MS}\n\n"
+        first = True
+        while not feed.broadcaster.closed:
+            pages = 0
+            while True:
+                try:
+                    version, has_more, data = await database.run_in_session(_changes_event, user_id, since)
+                    expired = False
+                except changes.ChangesExpired:
+                    expired = True
+                if expired or version < since or pages >= FEED_MAX_CATCHUP_PAGES:
+                    # Видалення після since вже очищено, версія з майбутнього (інша БД,
+                    # відновлення з бекапу) або надто велике відставання
+                    version = await database.run_in_session(changes.current_version, user_id)
+                    yield _sse("resync", version, f'{{"version": {version}}}')
+                    since = version
+                    break
+                since = version
+                if data is not None:
+                    yield _sse("changes", version, data)
+                    pages += 1
+                if not has_more:
+                    break
+            subscription.latest = max(subscription.latest, since)
+            if first:
+                yield _sse("ready", since, f'{{"version": {since}}}')
+                first = False
+
+            while not feed.broadcaster.closed:
+                timeout = FEED_HEARTBEAT
+                if expires_at is not None:
+                    timeout = min(timeout, expires_at - time.time())
+                    if timeout <= 0:
+                        return
+                if await subscription.wait(timeout):
+                    break
+                yield ": ping\n\n"
+    finally:
+        feed.broadcaster.unsubscribe(subscription)
+
 
 # Отримання конкретної нотатки по ID
 @router.get("/{note_id}", response_model=NoteOut)
-def get_note(
+async def get_note(
     note_id: int,
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
     db: Session = Depends(get_db),
-    user: models.User = Depends(get_current_user)
+    user: auth.CurrentUser = Depends(get_current_user)
 ):
     """
     Повертає конкретну нотатку користувача за її ID.
     Якщо нотатку не знайдено — повертає 404.
+    Якщо If-None-Match збігається з поточним ETag — 304 без читання тіла нотатки.
     """
-    note = db.query(models.Note).filter(
-        and_(
-            models.Note.id == note_id,
-            models.Note.user_id == user.id
-        )
-    ).first()
+    if if_none_match:
+        version = await run_db(db, _get_note_version, note_id, user.id)
+        if version is not None:
+            etag = changes.note_etag(note_id, version)
+            if changes.etag_matches(if_none_match, etag):
+                return Response(status_code=304, headers={"ETag": etag, "Cache-Control": changes.CACHE_CONTROL})
+
+    note = await run_db(db, _get_user_note, note_id, user.id)
     if not note:
         raise HTTPException(status_code=404, detail="Note not found")
+    response.headers["ETag"] = changes.note_etag(note.id, note.version)
+    response.headers["Cache-Control"] = changes.CACHE_CONTROL
     return note
 
+
+def _get_note_version(db: Session, note_id: int, user_id: int) -> Optional[int]:
+    return db.scalar(
+        select(models.Note.version).where(models.Note.id == note_id, models.Note.user_id == user_id)
+    )
+
+# Зменшені копії прикріпленого зображення
+@router.get("/{note_id}/variants/{name}", status_code=307)
+async def get_note_variant(
+    note_id: int,
+    name: str,
+    db: Session = Depends(get_db),
+    user: auth.CurrentUser = Depends(get_current_user)
+):
+    """
+    Перенаправляє (307) на зменшену копію зображення нотатки: thumb, small або medium.
+    Зазвичай копії вже згенеровані воркером після завантаження; якщо ні
+    (старі нотатки або воркер ще не встиг) — генеруються зараз, один раз.
+    404 — немає нотатки, файлу, файл не є зображенням або його оригіналу немає у сховищі.
+    """
+    if name not in thumbnails.VARIANTS:
+        raise HTTPException(status_code=404, detail="Unknown variant")
+    found = await run_db(db, _get_note_file, note_id, user.id)
+    if found is None:
+        raise HTTPException(status_code=404, detail="Note not found")
+    file_id, variants = found
+    if file_id is None:
+        raise HTTPException(status_code=404, detail="Note has no file")
+
+    if variants is None:
+        try:
+            variants = await run_in_threadpool(thumbnails.generate_variants, NOTES_BUCKET, file_id)
+        except PoolSaturated as e:
+            raise HTTPException(
+                status_code=503,
+                detail="Image processing is busy, retry later",
+                headers={"Retry-After": str(e.retry_after)},
+            )
+        except storage.StorageUnavailable as e:
+            raise HTTPException(
+                status_code=503,
+                detail="File storage is unavailable, retry later",
+                headers={"Retry-After": str(e.retry_after)},
+            )
+        except storage.StorageError:
+            # Постійна помилка сховища: generate_variants уже записав {}, повтор не допоможе
+            raise HTTPException(status_code=404, detail="Variant not available")
+    url = (variants or {}).get(name)
+    if not url:
+        raise HTTPException(status_code=404, detail="Variant not available")
+    return RedirectResponse(url, status_code=307)
+
+
+def _get_note_file(db: Session, note_id: int, user_id: int):
+    """
+    Повертає (file_id, variants) нотатки або None, якщо нотатки немає.
+    Для старих нотаток лише з file_url створює запис у files (ref_count = 1),
+    щоб варіанти мали де зберігатися і видалялися разом з файлом.
+    Нотатка прив'язується умовним UPDATE (file_id IS NULL): якщо паралельний запит
+    встиг першим, наш запис відкочується і використовується його.
+    """
+    note = _get_user_note(db, note_id, user_id)
+    if note is None:
+        return None
+    if note.file is None and note.file_url:
+        path = _legacy_file_path(note.file_url)
+        if path is None:
+            return note.file_id, None
+        new_file = models.File(
+            filename=os.path.basename(path),
+            url=note.file_url,
+            path=path,
+            content_type=mimetypes.guess_type(path)[0],
+            ref_count=1,
+            user_id=user_id,
+        )
+        try:
+            db.add(new_file)
+            db.flush()  # Потрібен new_file.id
+            attached = db.execute(
+                update(models.Note)
+                .where(models.Note.id == note.id, models.Note.file_id.is_(None))
+                .values(file_id=new_file.id)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            if attached:
+                db.commit()
+            else:
+                db.rollback()
+        except Exception:
+            db.rollback()
+            raise
+        db.refresh(note)
+    if note.file is None:
+        return None, None
+    return note.file.id, note.file.variants
+
+
 # Видалення нотатки по ID разом з файлом у Supabase
 @router.delete("/{note_id}", status_code=204)
-def delete_note(
+async def delete_note(
     note_id: int,
     db: Session = Depends(get_db),
-    user: models.User = Depends(get_current_user)
+    user: auth.CurrentUser = Depends(get_current_user)
 ):
     """
     Видаляє нотатку користувача за ID.
     Якщо нотатку не знайдено — повертає 404.
-    Файл з Supabase видаляється перед видаленням запису.
+    Файл видаляється зі сховища лише тоді, коли на нього не посилається жодна інша нотатка.
+    Саме видалення виконує воркер outbox, тож затримка запиту — лише робота з БД.
     """
-    note = db.query(models.Note).filter(
+    note = await run_db(db, _get_user_note, note_id, user.id)
+    if not note:
+        raise HTTPException(status_code=404, detail="Note not found")
+
+    # Видалення запису у базі (разом зі зменшенням лічильника посилань на файл
+    # і подією outbox для видалення файлів, які більше ніхто не використовує)
+    if await run_db(db, _delete_note, note):
+        outbox.worker.notify()
+    search.invalidate(user.id)
+    return
+
+
+def _get_user_note(db: Session, note_id: int, user_id: int):
+    return db.query(models.Note).filter(
         and_(
             models.Note.id == note_id,
-            models.Note.user_id == user.id
+            models.Note.user_id == user_id
         )
     ).first()
-    if not note:
-        raise HTTPException(status_code=404, detail="Note not found")
 
-    #  Видалення файлу у Supabase (якщо є)
-    if note.file_url:
-        try:
-            parsed_path = urlparse(note.file_url).path  # /storage/v1/object/public/notes-files/2/UUID_filename.jpeg
-            # Беремо все після 'notes-files/' → '2/UUID_filename.jpeg'
-            idx = parsed_path.find("notes-files/")
-            if idx == -1:
-                raise HTTPException(status_code=500, detail="Invalid file_url format")
-            path_inside_bucket = parsed_path[idx + len("notes-files/"):]
-            path_inside_bucket = unquote(path_inside_bucket)  # Декодуємо %20 → пробіли
-            print(f"[DEBUG] Correct path to delete: '{path_inside_bucket}'")
-            storage.remove_file("notes-files", path_inside_bucket)
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Error deleting file: {e}")
-
-    # Видалення запису у базі
+
+def _delete_note(db: Session, note) -> list[str]:
+    """
+    Видаляє нотатку; файли, на які більше ніхто не посилається, ставить у outbox
+    в тій самій транзакції. Повертає їхні шляхи у бакеті.
+    """
+    file_id, file_url = note.file_id, note.file_url
+    version = changes.bump_version(db, note.user_id)
+    changes.record_deleted(db, note.user_id, [note.id], version)
     db.delete(note)
+    db.flush()
+
+    orphaned_paths = []
+    if file_id is not None:
+        orphaned_paths = _release_files(db, [file_id])
+    elif file_url:
+        path = _legacy_file_path(file_url)
+        if path:
+            orphaned_paths.append(path)
+    outbox.enqueue_storage_remove(db, NOTES_BUCKET, orphaned_paths)
     db.commit()
-    return
+    return orphaned_paths
+
+
+def _release_files(db: Session, file_ids: list[int]) -> list[str]:
+    """
+    Зменшує ref_count файлів (по одному на кожне входження id у списку).
+    Записи з нульовим лічильником видаляються, їхні шляхи (разом зі зменшеними копіями)
+    повертаються для видалення зі сховища.
+    """
+    orphaned_ids, orphaned_paths = [], []
+    for file_id, count in Counter(file_ids).items():
+        row = db.execute(
+            update(models.File)
+            .where(models.File.id == file_id)
+            .values(ref_count=models.File.ref_count - count)
+            .returning(models.File.ref_count, models.File.path, models.File.variants)
+            .execution_options(synchronize_session=False)
+        ).first()
+        if row is not None and row.ref_count <= 0:
+            orphaned_ids.append(file_id)
+            if row.path:
+                orphaned_paths.append(row.path)
+                orphaned_paths += [thumbnails.variant_path(row.path, name) for name in (row.variants or {})]
+    if orphaned_ids:
+        db.execute(
+            delete(models.File)
+            .where(models.File.id.in_(orphaned_ids))
+            .execution_options(synchronize_session=False)
+        )
+    return orphaned_paths
+
+
+def _legacy_file_path(file_url: str) -> Optional[str]:
+    """
+    Шлях у бакеті для старих нотаток без запису у files — файл належить лише цій нотатці.
+    """
+    try:
+        return storage.path_from_url(NOTES_BUCKET, file_url)
+    except ValueError:
+        logger.warning("Cannot resolve storage path for '%s'", file_url)
+        return None
+
+
+# Пакетні операції над нотатками
+@router.post("/batch", response_model=NoteBatchResult)
+async def batch_notes(
+    batch: NoteBatch,
+    db: Session = Depends(get_db),
+    user: auth.CurrentUser = Depends(get_current_user)
+):
+    """
+    Створює, оновлює та видаляє нотатки одним запитом в одній транзакції
+    (bulk INSERT / UPDATE / DELETE) і повертає результат для кожної операції.
+    Файли, на які більше ніхто не посилається, потрапляють в одну подію outbox
+    (той самий commit), і воркер видаляє їх одним викликом remove([...]).
+    """
+    total = len(batch.create) + len(batch.update) + len(batch.delete)
+    if total > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"Batch is limited to {MAX_BATCH_SIZE} operations")
+    if total == 0:
+        return {"results": []}
+
+    results, orphaned_paths = await run_db(db, _apply_batch, user.id, batch)
+    search.invalidate(user.id)
+    if orphaned_paths:
+        outbox.worker.notify()
+    return {"results": results}
+
+
+def _apply_batch(db: Session, user_id: int, batch: NoteBatch):
+    """
+    Виконує пакет в одній транзакції. Повертає (результати, шляхи файлів для видалення).
+    Якщо будь-який запит до БД падає — відкочується весь пакет.
+    """
+    results, orphaned_paths = [], []
+    try:
+        # Одна нова версія колекції на весь пакет
+        version = changes.bump_version(db, user_id)
+        now = models.utcnow()
+
+        if batch.create:
+            created_ids = db.scalars(
+                insert(models.Note).returning(models.Note.id, sort_by_parameter_order=True),
+                [
+                    {"title": item.title, "content": item.content, "user_id": user_id,
+                     "version": version, "updated_at": now}
+                    for item in batch.create
+                ],
+            ).all()
+            results += [{"op": "create", "id": note_id, "status": 201} for note_id in created_ids]
+
+        if batch.update:
+            owned = set(db.scalars(
+                select(models.Note.id).where(
+                    models.Note.id.in_({item.id for item in batch.update}),
+                    models.Note.user_id == user_id,
+                )
+            ))
+            rows = []
+            for item in batch.update:
+                values = item.model_dump(exclude_unset=True)
+                if item.id not in owned:
+                    results.append({"op": "update", "id": item.id, "status": 404, "detail": "Note not found"})
+                elif "title" in values and values["title"] is None:
+                    results.append({"op": "update", "id": item.id, "status": 422, "detail": "title cannot be null"})
+                else:
+                    if len(values) > 1:
+                        rows.append({**values, "version": version, "updated_at": now})
+                    results.append({"op": "update", "id": item.id, "status": 200})
+            if rows:
+                # ORM bulk UPDATE за первинним ключем (executemany)
+                db.execute(update(models.Note), rows)
 
+        if batch.delete:
+            requested = list(dict.fromkeys(batch.delete))
+            deleted = db.execute(
+                delete(models.Note)
+                .where(models.Note.id.in_(requested), models.Note.user_id == user_id)
+                .returning(models.Note.id, models.Note.file_id, models.Note.file_url)
+                .execution_options(synchronize_session=False)
+            ).all()
+            deleted_ids = {row.id for row in deleted}
+            changes.record_deleted(db, user_id, list(deleted_ids), version)
+            file_ids = [row.file_id for row in deleted if row.file_id is not None]
+            orphaned_paths += _release_files(db, file_ids)
+            for row in deleted:
+                if row.file_id is None and row.file_url:
+                    path = _legacy_file_path(row.file_url)
+                    if path:
+                        orphaned_paths.append(path)
+            results += [
+                {"op": "delete", "id": note_id, "status": 204} if note_id in deleted_ids
+                else {"op": "delete", "id": note_id, "status": 404, "detail": "Note not found"}
+                for note_id in requested
+            ]
+
+        outbox.enqueue_storage_remove(db, NOTES_BUCKET, orphaned_paths)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return results, orphaned_paths
 
 
 @router.post("/upload", response_model=NoteOut)
-def upload_note_file(
+async def upload_note_file(
     title: str = Form(...),
     content: Optional[str] = Form(None),
     file: UploadFile = File(...),
     db: Session = Depends(get_db),
-    user: models.User = Depends(get_current_user)
+    user: auth.CurrentUser = Depends(get_current_user)
 ):
     """
-    Завантаження нової нотатки з файлом у Supabase.
-    Використовує унікальні імена файлів, щоб уникнути помилки 409 Duplicate.
+    Завантаження нової нотатки з файлом у сховище.
+    Файли дедуплікуються за вмістом (sha256): якщо такий самий файл уже завантажено —
+    передача у сховище пропускається,
+    а нова нотатка посилається на наявний запис у files (ref_count + 1).
+    Розмір обмежується ще під час приймання тіла (UploadSizeLimitMiddleware);
+    sha256 рахується з прийнятого файлу, і у сховище передається він же — потоком,
+    без читання в пам'ять і без другої копії на диску.
     """
     try:
-        # Читаємо байти файлу
-        file_bytes = file.file.read()
-
-        # Генеруємо унікальне ім'я файлу: user_id/UUID_оригінальна_назва
+        # Хеш і розмір прийнятого файлу
+        received = await uploads.inspect_upload(file)
 
-        unique_filename = f"{user.id}/{uuid.uuid4()}_{file.filename}"
+        # Вже відомий вміст — лише нове посилання
+        note = await run_db(db, _add_note_for_known_file, user.id, received.sha256, title, content)
+        if note is not None:
+            return note
 
-        # Завантажуємо файл у Supabase
-        file_url = storage.upload_file("notes-files", unique_filename, file_bytes)
+        # Новий вміст — завантажуємо у сховище (асинхронно, з повторами та лімітом одночасних викликів)
+        path = _object_path(user.id, received.sha256, received.filename)
+        file_url = await storage.upload_file_async(NOTES_BUCKET, path, received.file, received.content_type)
+        note = await run_db(db, _add_note_with_new_file, user.id, received, path, file_url, title, content)
+        if note is not None and thumbnails.is_image(received.content_type):
+            outbox.worker.notify()  # Мініатюри генерує воркер outbox
+        if note is None:
+            # Той самий файл паралельно завантажив інший запит — посилаємося на його запис,
+            # а свою копію у сховищі прибираємо через outbox
+            await run_db(db, _discard_objects, [path])
+            outbox.worker.notify()
+            note = await run_db(db, _add_note_for_known_file, user.id, received.sha256, title, content)
+        if note is None:
+            raise HTTPException(status_code=409, detail="File was modified concurrently, retry upload")
+        return note
 
-        # Створюємо нову нотатку
-        new_note = models.Note(
-            title=title,
-            content=content,
-            file_url=file_url,
-            user_id=user.id,
+    except HTTPException:
+        raise
+    except storage.StorageUnavailable as e:
+        raise HTTPException(
+            status_code=503,
+            detail="File storage is unavailable, retry later",
+            headers={"Retry-After": str(e.retry_after)},
         )
-        db.add(new_note)
-        db.commit()
-        db.refresh(new_note)
-
-        return new_note
-
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/upload/by-hash", response_model=NoteOut)
+async def create_note_from_hash(
+    data: NoteFromHash,
+    db: Session = Depends(get_db),
+    user: auth.CurrentUser = Depends(get_current_user)
+):
+    """
+    Створює нотатку з файлом, який користувач уже завантажував, — за sha256 вмісту.
+    Клієнт може спершу спробувати цей endpoint і не передавати файл повторно.
+    Якщо файлу з таким хешем немає — 404, тоді потрібне звичайне /notes/upload.
+    """
+    note = await run_db(db, _add_note_for_known_file, user.id, data.sha256.lower(), data.title, data.content)
+    if note is None:
+        raise HTTPException(status_code=404, detail="File not found")
+    return note
+
+
+def _object_path(user_id: int, sha256: str, filename: str) -> str:
+    """
+    Ключ нового файлу у сховищі: {user_id}/{sha256}-{випадковий суфікс}{розширення}.
+    Кожен запис у files отримує власний ключ, тож відкладене видалення (outbox) файлу,
+    який знову завантажили з тим самим вмістом, не зачепить новий об'єкт.
+    """
+    return f"{user_id}/{sha256}-{secrets.token_hex(8)}{_file_extension(filename)}"
+
+
+def _discard_objects(db: Session, paths: list[str]):
+    outbox.enqueue_storage_remove(db, NOTES_BUCKET, paths)
+    db.commit()
+
+
+def _file_extension(filename: str) -> str:
+    """
+    Розширення файлу для ключа у сховищі (лише безпечні символи).
+    """
+    ext = os.path.splitext(filename)[1].lower()
+    return ext if re.fullmatch(r"\.[a-z0-9]{1,10}", ext) else ""
+
+
+def _add_note_for_known_file(db: Session, user_id: int, sha256: str, title: str, content: Optional[str]):
+    """
+    Якщо у користувача вже є файл з таким sha256 — збільшує його ref_count
+    і створює нотатку з посиланням на нього. Інакше повертає None.
+    """
+    row = db.execute(
+        update(models.File)
+        .where(models.File.user_id == user_id, models.File.sha256 == sha256)
+        .values(ref_count=models.File.ref_count + 1)
+        .returning(models.File.id, models.File.url)
+        .execution_options(synchronize_session=False)
+    ).first()
+    if row is None:
+        return None
+    note = models.Note(title=title, content=content, file_url=row.url, file_id=row.id, user_id=user_id,
+                       version=changes.bump_version(db, user_id))
+    return _save_note(db, note)
+
+
+def _add_note_with_new_file(db: Session, user_id: int, received, path: str, file_url: str,
+                            title: str, content: Optional[str]):
+    """
+    Створює запис у files (ref_count = 1) і нотатку в одній транзакції;
+    для зображень у ту саму транзакцію додається задача генерації мініатюр.
+    Повертає None, якщо запис з таким sha256 паралельно створив інший запит.
+    """
+    new_file = models.File(
+        filename=received.filename,
+        url=file_url,
+        path=path,
+        sha256=received.sha256,
+        size=received.size,
+        content_type=received.content_type,
+        ref_count=1,
+        user_id=user_id,
+    )
+    note = models.Note(title=title, content=content, file_url=file_url, file=new_file, user_id=user_id,
+                       version=changes.bump_version(db, user_id))
+    try:
+        db.add(note)
+        if thumbnails.is_image(new_file.content_type):
+            db.flush()  # Потрібен new_file.id
+            thumbnails.enqueue_generate(db, NOTES_BUCKET, new_file.id)
+        return _save_note(db, note)
+    except IntegrityError:
+        db.rollback()
+        return None
+
+
+def _save_note(db: Session, note):
+    db.add(note)
+    db.commit()
+    db.refresh(note)
+    search.invalidate(note.user_id)
+    return note
@@ -1,5 +1,6 @@
-from pydantic import BaseModel, EmailStr  # BaseModel для схем, EmailStr для валідації email
-from typing import Optional  # Optional для необов'язкових полів
+from pydantic import BaseModel, EmailStr, Field  # BaseModel для схем, EmailStr для валідації email
+from typing import Dict, List, Optional  # Optional для необов'язкових полів
+from datetime import datetime  # Час останньої зміни нотатки
 
 
 # Схеми для користувачів
@@ -41,6 +42,18 @@ class NoteCreate(BaseModel):
     content: Optional[str] = None
     file_url: Optional[str] = None
 
+class NoteFromHash(BaseModel):
+    """
+    Схема для створення нотатки з уже завантаженим файлом.
+    Поля:
+    - title: заголовок нотатки (обов'язкове)
+    - content: текст нотатки (необов'язкове)
+    - sha256: хеш вмісту файлу (hex)
+    """
+    title: str
+    content: Optional[str] = None
+    sha256: str = Field(..., pattern="^[0-9a-fA-F]{64}$")
+
 class NoteOut(BaseModel):
     """
     Схема для відправки нотатки у відповіді API.
@@ -49,12 +62,104 @@ class NoteOut(BaseModel):
     - title: заголовок нотатки
     - content: текст нотатки (може бути None)
     - user_id: ID користувача-власника
+    - variants: URL зменшених копій зображення ({"thumb": ..., "small": ..., "medium": ...}),
+      None — ще не згенеровано або файлу немає
+    - version: версія колекції на момент останньої зміни нотатки
+    - updated_at: час останньої зміни (UTC)
     """
     id: int
     title: str
     content: Optional[str] = None
     user_id: int
     file_url: Optional[str] = None
+    variants: Optional[Dict[str, str]] = None
+    version: int = 0
+    updated_at: Optional[datetime] = None
 
     class Config:
         orm_mode = True  # Дозволяє Pydantic працювати з ORM-моделями SQLAlchemy
+
+class NoteUpdate(BaseModel):
+    """
+    Часткове оновлення нотатки у пакетному запиті.
+    Змінюються лише передані поля.
+    """
+    id: int
+    title: Optional[str] = None
+    content: Optional[str] = None
+
+class NoteBatchCreate(BaseModel):
+    """
+    Нотатка для пакетного створення (без файлу — файли додаються через /notes/upload).
+    """
+    title: str
+    content: Optional[str] = None
+
+class NoteBatch(BaseModel):
+    """
+    Пакет операцій над нотатками, що виконується в одній транзакції.
+    Поля:
+    - create: нові нотатки
+    - update: часткові оновлення
+    - delete: ID нотаток для видалення
+    """
+    create: List[NoteBatchCreate] = []
+    update: List[NoteUpdate] = []
+    delete: List[int] = []
+
+class BatchItemResult(BaseModel):
+    """
+    Результат однієї операції пакета.
+    Поля:
+    - op: "create", "update" або "delete"
+    - id: ID нотатки
+    - status: HTTP-подібний статус операції (201, 200, 204, 404, 422)
+    - detail: опис помилки
+    """
+    op: str
+    id: Optional[int] = None
+    status: int
+    detail: Optional[str] = None
+
+class NoteBatchResult(BaseModel):
+    """
+    Відповідь на пакетний запит: результати у порядку create → update → delete.
+    """
+    results: List[BatchItemResult]
+
+class NoteSearchResult(BaseModel):
+    """
+    Один результат пошуку.
+    Поля:
+    - id, title: нотатка
+    - snippet: фрагмент тексту зі збігами у <b>...</b>
+    - rank: релевантність (більше — краще)
+    """
+    id: int
+    title: str
+    snippet: str
+    rank: float
+
+class NoteSearchPage(BaseModel):
+    """
+    Сторінка результатів пошуку.
+    Поля:
+    - results: результати, відсортовані за релевантністю
+    - next_offset: offset наступної сторінки (None, якщо це остання)
+    """
+    results: List[NoteSearchResult]
+    next_offset: Optional[int] = None
+
+class NoteChanges(BaseModel):
+    """
+    Зміни нотаток після версії since.
+    Поля:
+    - version: версія, яку клієнт передає як since наступного разу
+    - notes: створені або змінені нотатки
+    - deleted: ID видалених нотаток
+    - has_more: є ще зміни — запитати знову з since = version
+    """
+    version: int
+    notes: List[NoteOut]
+    deleted: List[int]
+    has_more: bool = False
@@ -1,46 +1,87 @@
 # routes/users.py — маршрути для управління користувачами (реєстрація та логін)
 
-from fastapi import APIRouter, Depends, HTTPException   # FastAPI — для створення API-роутів
+import math                                                    # Округлення Retry-After
+from fastapi import APIRouter, Depends, HTTPException, Request  # FastAPI — для створення API-роутів
 from sqlalchemy.orm import Session                             # Сесія SQLAlchemy для роботи з БД
 from app import models, auth                                   # Моделі таблиць та модуль авторизації
-from app.database import get_db                                # Функція для підключення до БД
+from app.database import get_db, run_db                        # Сесія БД та виконання запитів без блокування event loop
 from app.routes.schemas import UserCreate, Token                      # Pydantic-схеми для валідації вхідних даних
+from app.services.workers import PoolSaturated                 # Перевантаження пулу хешування
+from app.services import ratelimit                             # Backoff після невдалих логінів
 
 # Створення роутера з префіксом `/users`
 # У Swagger UI групуватиметься під тегом "users"
 router = APIRouter(prefix="/users", tags=["users"])
 
+
+def _get_user_by_email(db: Session, email: str):
+    return db.query(models.User).filter(models.User.email == email).first()
+
+
+def _create_user(db: Session, email: str, hashed_password: str):
+    new_user = models.User(email=email, hashed_password=hashed_password)
+    db.add(new_user)
+    db.commit()
+    db.refresh(new_user)
+    return new_user
+
+
+async def _run_password_job(job, *args):
+    """
+    Виконує хешування/перевірку пароля у пулі процесів.
+    Якщо пул перевантажений — відповідаємо 503 з Retry-After.
+    """
+    try:
+        return await job(*args)
+    except PoolSaturated as e:
+        raise HTTPException(
+            status_code=503,
+            detail="Authentication service is busy, try again later",
+            headers={"Retry-After": str(e.retry_after)},
+        )
+
+
 @router.post("/register", response_model=Token)
-def register(user: UserCreate, db: Session = Depends(get_db)):
+async def register(user: UserCreate, db: Session = Depends(get_db)):
     """
        Реєстрація нового користувача:
        - Перевірка унікальності email
-       - Хешування пароля
+       - Хешування пароля (у пулі процесів)
        - Створення користувача в БД
        - Повернення JWT-токена
        """
-    db_user = db.query(models.User).filter(models.User.email == user.email).first()
+    db_user = await run_db(db, _get_user_by_email, user.email)
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
-    hashed = auth.hash_password(user.password)
-    new_user = models.User(email=user.email, hashed_password=hashed)
-    db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    hashed = await _run_password_job(auth.hash_password_async, user.password)
+    new_user = await run_db(db, _create_user, user.email, hashed)
     token = auth.create_access_token({"sub": new_user.email})
     return {"access_token": token, "token_type": "bearer"}
 
 @router.post("/login", response_model=Token)
-def login(user: UserCreate, db: Session = Depends(get_db)):
+async def login(user: UserCreate, request: Request, db: Session = Depends(get_db)):
     """
       Вхід користувача:
+      - Перевірка, чи email не заблоковано для цього IP після невдалих спроб (429 з Retry-After)
       - Перевірка існування користувача
-      - Перевірка правильності пароля
+      - Перевірка правильності пароля (у пулі процесів)
       - Повернення JWT-токена
       """
-    db_user = db.query(models.User).filter(models.User.email == user.email).first()
-    if not db_user or not auth.verify_password(user.password, db_user.hashed_password):
+    limiter = ratelimit.get_limiter()
+    ip = ratelimit.client_ip(request.scope)
+    retry_after = await limiter.login_retry_after(user.email, ip)
+    if retry_after > 0:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many failed login attempts, try again later",
+            headers={"Retry-After": str(math.ceil(retry_after))},
+        )
+    db_user = await run_db(db, _get_user_by_email, user.email)
+    if not db_user or not await _run_password_job(
+        auth.verify_password_async, user.password, db_user.hashed_password
+    ):
+        await limiter.login_failed(user.email, ip)
         raise HTTPException(status_code=401, detail="Invalid credentials")
+    await limiter.login_succeeded(user.email, ip)
     token = auth.create_access_token({"sub": db_user.email})
     return {"access_token": token, "token_type": "bearer"}
-
@@ -0,0 +1,132 @@
+# services/changes.py — версії колекції нотаток, tombstones та ETag
+#
+# Кожна зміна нотаток користувача збільшує users.notes_version (атомарний UPDATE ... RETURNING,
+# що заодно серіалізує паралельні записи одного користувача). Змінені нотатки отримують
+# цю версію в notes.version, видалені — запис у note_tombstones. На цьому побудовані
+# ETag для читання та /notes/changes?since=.
+# Tombstones старші за TOMBSTONE_RETENTION_DAYS періодично видаляє воркер outbox; найбільша
+# видалена версія запам'ятовується в users.notes_pruned_version, і since нижче неї — ChangesExpired.
+
+import hashlib                         # Короткий хеш параметрів запиту для ETag списку
+import os                              # Налаштування зі змінних середовища
+from datetime import timedelta         # Термін зберігання tombstones
+from sqlalchemy import delete, func, insert, select, update  # Запити до БД
+from sqlalchemy.orm import Session     # Сесія SQLAlchemy
+from app import models                 # Моделі User, NoteTombstone
+from app.services import feed, outbox  # Сповіщення потоку подій, періодичне очищення
+
+CACHE_CONTROL = "private, no-cache"    # Відповіді персональні; клієнт завжди перевіряє ETag
+
+TOMBSTONE_RETENTION_DAYS = float(os.getenv("TOMBSTONE_RETENTION_DAYS", "30"))      # Скільки днів зберігати tombstones
+TOMBSTONE_PRUNE_INTERVAL = float(os.getenv("TOMBSTONE_PRUNE_INTERVAL", "3600"))    # Як часто їх очищати (секунди)
+
+
+class ChangesExpired(Exception):
+    """
+    Tombstones після since вже видалено: зміни не відновити, клієнт має перечитати список нотаток.
+    """
+
+    def __init__(self, pruned_version: int):
+        super().__init__(f"Changes before version {pruned_version} are no longer available, resync")
+        self.pruned_version = pruned_version
+
+
+def bump_version(db: Session, user_id: int) -> int:
+    """
+    Збільшує версію колекції нотаток користувача в поточній транзакції
+    і повертає нове значення. Потоки подій користувача дізнаються про неї після commit.
+    """
+    version = db.execute(
+        update(models.User)
+        .where(models.User.id == user_id)
+        .values(notes_version=models.User.notes_version + 1)
+        .returning(models.User.notes_version)
+        .execution_options(synchronize_session=False)
+    ).scalar_one()
+    feed.publish(db, user_id, version)
+    return version
+
+
+def current_version(db: Session, user_id: int) -> int:
+    return db.scalar(select(models.User.notes_version).where(models.User.id == user_id)) or 0
+
+
+def version_since(db: Session, user_id: int, since: int) -> int:
+    """
+    Поточна версія колекції для читання змін після since.
+    ChangesExpired, якщо since нижче горизонту очищення tombstones (since = 0 — клієнт без
+    локальних даних, йому видалення не потрібні).
+    """
+    row = db.execute(
+        select(models.User.notes_version, models.User.notes_pruned_version).where(models.User.id == user_id)
+    ).one_or_none()
+    if row is None:
+        return 0
+    if 0 < since < row.notes_pruned_version:
+        raise ChangesExpired(row.notes_pruned_version)
+    return row.notes_version
+
+
+def record_deleted(db: Session, user_id: int, note_ids: list[int], version: int):
+    """
+    Записує tombstones для видалених нотаток (у поточній транзакції).
+    """
+    if note_ids:
+        db.execute(
+            insert(models.NoteTombstone),
+            [{"note_id": note_id, "user_id": user_id, "version": version, "deleted_at": models.utcnow()}
+             for note_id in note_ids],
+        )
+
+
+@outbox.periodic("tombstones.prune", TOMBSTONE_PRUNE_INTERVAL)
+def prune_tombstones(db: Session) -> int:
+    """
+    Видаляє tombstones, старші за TOMBSTONE_RETENTION_DAYS, і піднімає горизонт
+    users.notes_pruned_version до найбільшої видаленої версії. Повертає кількість видалених.
+    """
+    cutoff = models.utcnow() - timedelta(days=TOMBSTONE_RETENTION_DAYS)
+    expired = models.NoteTombstone.deleted_at < cutoff
+    pruned_version = (
+        select(func.max(models.NoteTombstone.version))
+        .where(models.NoteTombstone.user_id == models.User.id, expired)
+        .scalar_subquery()
+    )
+    try:
+        db.execute(
+            update(models.User)
+            .where(models.User.id.in_(select(models.NoteTombstone.user_id).where(expired)))
+            .values(notes_pruned_version=pruned_version)
+            .execution_options(synchronize_session=False)
+        )
+        deleted = db.execute(delete(models.NoteTombstone).where(expired)).rowcount
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return deleted
+
+
+def collection_etag(user_id: int, version: int, params: str = "") -> str:
+    """
+    Сильний ETag списку: версія колекції + параметри запиту (limit, cursor, fields).
+    """
+    digest = hashlib.sha1(params.encode()).hexdigest()[:12]
+    return f'"c{user_id}-{version}-{digest}"'
+
+
+def note_etag(note_id: int, version: int) -> str:
+    return f'"n{note_id}-{version}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """
+    Перевіряє заголовок If-None-Match (список ETag через кому, W/-префікс або *).
+    """
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
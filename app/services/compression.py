@@ -0,0 +1,174 @@
+# services/compression.py — стиснення відповідей (brotli або gzip) понад поріг розміру
+#
+# Стискаються лише текстові типи (JSON, NDJSON, text/*) від COMPRESS_MIN_SIZE байт:
+# дрібні відповіді не варті CPU, а файли/зображення вже стиснені.
+# Потокові відповіді (?stream=) стискаються по блоках із flush, тож клієнт отримує
+# рядки одразу, а не в кінці.
+
+import os                                      # Налаштування зі змінних середовища
+import zlib                                    # gzip (завжди доступний)
+
+try:
+    import brotli                              # Необов'язкова залежність: pip install brotli
+except ImportError:
+    brotli = None
+
+COMPRESS_ENABLED = os.getenv("COMPRESS_ENABLED", "True").lower() == "true"  # Вмикає middleware
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "1024"))             # Менші відповіді не стискаються (байти)
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))                              # 1 — швидше, 9 — менше
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))                      # 0..11; вище 5 надто дорого для динамічних відповідей
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/", "application/javascript", "image/svg+xml")
+
+
+def choose_encoding(accept_encoding: str) -> str | None:
+    """
+    Обирає кодування за заголовком Accept-Encoding: br (якщо встановлено brotli), інакше gzip.
+    Кодування з q=0 вважаються забороненими.
+    """
+    accepted = set()
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        params = params.replace(" ", "")
+        if params.startswith("q=") and params[2:] in ("0", "0.0", "0.00", "0.000"):
+            continue
+        accepted.add(name.strip().lower())
+    if brotli is not None and ("br" in accepted or "*" in accepted):
+        return "br"
+    if "gzip" in accepted or "*" in accepted:
+        return "gzip"
+    return None
+
+
+class _Compressor:
+    def __init__(self, encoding: str):
+        if encoding == "br":
+            self._br = brotli.Compressor(quality=BROTLI_QUALITY)
+            self._gz = None
+        else:
+            self._br = None
+            self._gz = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, zlib.MAX_WBITS | 16)  # 16 — формат gzip
+
+    def chunk(self, data: bytes) -> bytes:
+        """
+        Стискає блок і скидає буфер, щоб потокова відповідь не затримувалась.
+        """
+        if self._br is not None:
+            return self._br.process(data) + self._br.flush()
+        return self._gz.compress(data) + self._gz.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        if self._br is not None:
+            return self._br.process(data) + self._br.finish()
+        return self._gz.compress(data) + self._gz.flush()
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware: стискає текстові відповіді від minimum_size байт.
+    ETag стає слабким (W/"..."), бо байти відповіді відрізняються від нестисненої;
+    If-None-Match його все одно приймає (див. changes.etag_matches).
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESS_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not COMPRESS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        accept_encoding = ""
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                accept_encoding = value.decode("latin-1")
+                break
+        encoding = choose_encoding(accept_encoding) if accept_encoding else None
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        compressor = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start_message, compressor, passthrough
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if compressor is None:
+                headers = start_message["headers"]
+                if not _compressible(headers) or (not more_body and len(body) < self.minimum_size):
+                    # Не стискаємо, але за іншого Accept-Encoding відповідь могла бути стиснена
+                    passthrough = True
+                    start_message["headers"] = _with_vary(headers)
+                    await send(start_message)
+                    await send(message)
+                    return
+                compressor = _Compressor(encoding)
+                if more_body:
+                    start_message["headers"] = _encoded_headers(headers, encoding, None)
+                    await send(start_message)
+                else:
+                    body = compressor.finish(body)
+                    start_message["headers"] = _encoded_headers(headers, encoding, len(body))
+                    await send(start_message)
+                    await send({"type": "http.response.body", "body": body})
+                    return
+
+            body = compressor.chunk(body) if more_body else compressor.finish(body)
+            await send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
+
+
+def _compressible(headers) -> bool:
+    content_type = b""
+    for name, value in headers:
+        if name == b"content-encoding":
+            return False  # Уже стиснено
+        if name == b"content-type":
+            content_type = value
+    content_type = content_type.decode("latin-1").lower()
+    # Потоки подій не стискаємо: компресор на кожне довге з'єднання — це сотні КБ пам'яті
+    return content_type.startswith(COMPRESSIBLE_TYPES) and not content_type.startswith("text/event-stream")
+
+
+def _with_vary(headers) -> list:
+    """
+    Заголовки з Vary: Accept-Encoding (дописується до наявного Vary, якщо його там ще немає).
+    """
+    result = []
+    vary = None
+    for name, value in headers:
+        if name == b"vary":
+            vary = value
+            continue
+        result.append((name, value))
+    if not vary:
+        vary = b"Accept-Encoding"
+    elif vary.strip() != b"*" and b"accept-encoding" not in vary.lower():
+        vary += b", Accept-Encoding"
+    result.append((b"vary", vary))
+    return result
+
+
+def _encoded_headers(headers, encoding: str, length: int | None) -> list:
+    result = []
+    for name, value in _with_vary(headers):
+        if name == b"content-length":
+            continue
+        if name == b"etag" and not value.startswith(b"W/"):
+            value = b"W/" + value
+        result.append((name, value))
+    result.append((b"content-encoding", encoding.encode()))
+    if length is not None:
+        result.append((b"content-length", str(length).encode()))
+    return result
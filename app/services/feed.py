@@ -0,0 +1,280 @@
+# services/feed.py — сповіщення про зміни нотаток для потоку подій (/notes/events)
+#
+# Кожна зміна нотаток проходить через changes.bump_version, яка викликає publish():
+# - local: сповіщення (user_id, version) доставляється після commit транзакції
+#          підписникам цього процесу
+# - postgres: pg_notify у тій самій транзакції — Postgres розсилає його після commit
+#          усім воркерам і подам, де PostgresListener слухає канал FEED_CHANNEL
+# (auto — postgres, якщо БД PostgreSQL, інакше local)
+#
+# Підписка не має черги: вона пам'ятає лише найбільшу оголошену версію. Потік сам дочитує
+# зміни після своєї версії (логіка /notes/changes), тож повільний клієнт не накопичує
+# подій у пам'яті, а пам'ять на одне неактивне з'єднання стала.
+
+import asyncio                             # Пробудження підписок у event loop
+import logging                             # Помилки слухача Postgres
+import os                                  # Налаштування зі змінних середовища
+import select                              # Очікування NOTIFY на сокеті psycopg2
+import threading                           # Потік слухача Postgres
+from sqlalchemy import event, text         # after_commit і pg_notify
+from sqlalchemy.orm import Session         # Сесія SQLAlchemy
+from fastapi.concurrency import run_in_threadpool  # Зупинка потоку слухача поза event loop
+
+logger = logging.getLogger(__name__)
+
+FEED_BACKEND = os.getenv("FEED_BACKEND", "auto")                               # auto | local | postgres
+FEED_CHANNEL = os.getenv("FEED_CHANNEL", "note_changes")                       # Канал LISTEN/NOTIFY
+FEED_MAX_CONNECTIONS = int(os.getenv("FEED_MAX_CONNECTIONS", "50000"))         # Потоків подій на процес
+FEED_MAX_PER_USER = int(os.getenv("FEED_MAX_PER_USER", "10"))                  # Потоків подій на користувача (у процесі)
+FEED_LISTEN_RECONNECT = float(os.getenv("FEED_LISTEN_RECONNECT", "5"))         # Пауза перед повторним LISTEN (секунди)
+
+
+class FeedFull(Exception):
+    """
+    Забагато потоків подій: на процес (status 503) або на користувача (status 429).
+    """
+
+    def __init__(self, message: str, status_code: int):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class Subscription:
+    """
+    Підписка одного потоку: latest — найбільша оголошена версія колекції користувача.
+    """
+    __slots__ = ("user_id", "latest", "_event")
+
+    def __init__(self, user_id: int, version: int):
+        self.user_id = user_id
+        self.latest = version
+        self._event = asyncio.Event()
+
+    def announce(self, version: int | None = None):
+        if version is None or version > self.latest:
+            if version is not None:
+                self.latest = version
+            self._event.set()
+
+    async def wait(self, timeout: float) -> bool:
+        """
+        Чекає на оголошення не довше timeout. True — було оголошення.
+        """
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        self._event.clear()
+        return True
+
+
+class Broadcaster:
+    """
+    Підписки процесу за user_id. Змінюється лише з event loop;
+    з інших потоків сповіщення передаються через publish_threadsafe().
+    """
+
+    def __init__(self, max_connections: int = FEED_MAX_CONNECTIONS, max_per_user: int = FEED_MAX_PER_USER):
+        self.max_connections = max_connections
+        self.max_per_user = max_per_user
+        self.closed = False
+        self._loop = None
+        self._subscribers = {}    # user_id -> set[Subscription]
+        self._count = 0
+        self._dispatched = 0
+        self._rejected = 0
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+        self.closed = False
+
+    def subscribe(self, user_id: int, version: int) -> Subscription:
+        subscribers = self._subscribers.get(user_id, ())
+        if self._count >= self.max_connections:
+            self._rejected += 1
+            raise FeedFull("Too many event streams on this server", 503)
+        if len(subscribers) >= self.max_per_user:
+            self._rejected += 1
+            raise FeedFull("Too many event streams for this user", 429)
+        subscription = Subscription(user_id, version)
+        self._subscribers.setdefault(user_id, set()).add(subscription)
+        self._count += 1
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscribers = self._subscribers.get(subscription.user_id)
+        if subscribers and subscription in subscribers:
+            subscribers.discard(subscription)
+            self._count -= 1
+            if not subscribers:
+                del self._subscribers[subscription.user_id]
+
+    def dispatch(self, user_id: int, version: int):
+        for subscription in self._subscribers.get(user_id, ()):
+            subscription.announce(version)
+        self._dispatched += 1
+
+    def wake_all(self):
+        """
+        Будить усі підписки, щоб вони перевірили версію в БД
+        (після перепідключення слухача могли загубитися сповіщення) або завершились (close()).
+        """
+        for subscribers in self._subscribers.values():
+            for subscription in subscribers:
+                subscription.announce()
+
+    def call_threadsafe(self, fn, *args):
+        """
+        Виконує fn(*args) в event loop broadcaster (з будь-якого потоку).
+        До start() і після зупинки loop — нічого не робить (скрипти, окремий воркер outbox).
+        """
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(fn, *args)
+
+    def publish_threadsafe(self, user_id: int, version: int):
+        self.call_threadsafe(self.dispatch, user_id, version)
+
+    def close(self):
+        self.closed = True
+        self.wake_all()
+
+    def stats(self) -> dict:
+        return {
+            "connections": self._count,
+            "users": len(self._subscribers),
+            "dispatched": self._dispatched,
+            "rejected": self._rejected,
+        }
+
+
+broadcaster = Broadcaster()
+
+
+class AccessLogFilter(logging.Filter):
+    """
+    Фільтр журналу доступу uvicorn (і gunicorn з UvicornWorker): для шляхів потоку подій
+    query string не пишеться — EventSource передає JWT у ?access_token=.
+    """
+
+    def __init__(self, paths: tuple[str, ...]):
+        super().__init__()
+        self.paths = paths
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        # uvicorn.access: (адреса клієнта, метод, шлях із query string, версія HTTP, статус)
+        args = record.args
+        if isinstance(args, tuple) and len(args) >= 3 and isinstance(args[2], str):
+            path, separator, _ = args[2].partition("?")
+            if separator and path in self.paths:
+                record.args = args[:2] + (path,) + args[3:]
+        return True
+
+
+def _uses_notify(db: Session) -> bool:
+    if FEED_BACKEND == "auto":
+        return db.get_bind().dialect.name == "postgresql"
+    return FEED_BACKEND == "postgres"
+
+
+def publish(db: Session, user_id: int, version: int):
+    """
+    Оголошує нову версію колекції користувача. Викликається в транзакції зміни
+    (changes.bump_version); доставка — лише після commit.
+    """
+    if _uses_notify(db):
+        db.execute(text("SELECT pg_notify(:channel, :payload)"),
+                   {"channel": FEED_CHANNEL, "payload": f"{user_id}:{version}"})
+    else:
+        db.info.setdefault("feed_pending", []).append((user_id, version))
+
+
+@event.listens_for(Session, "after_commit")
+def _deliver_pending(session):
+    for user_id, version in session.info.pop("feed_pending", ()):
+        broadcaster.publish_threadsafe(user_id, version)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_pending(session):
+    session.info.pop("feed_pending", None)
+
+
+class PostgresListener:
+    """
+    LISTEN на FEED_CHANNEL в окремому потоці з власним з'єднанням psycopg2
+    (одне на процес, поза пулом). Після кожного (пере)підключення будить усі підписки,
+    бо сповіщення, надіслані без слухача, втрачено.
+    """
+
+    def __init__(self, engine, channel: str = FEED_CHANNEL):
+        self.engine = engine
+        self.channel = channel
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="feed-listener", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            connection = None
+            try:
+                connection = self.engine.raw_connection()
+                connection.detach()  # Не повертаємо з'єднання з LISTEN у пул
+                dbapi = connection.driver_connection
+                dbapi.autocommit = True
+                with dbapi.cursor() as cursor:
+                    cursor.execute(f'LISTEN "{self.channel}"')
+                broadcaster.call_threadsafe(broadcaster.wake_all)
+                self._listen(dbapi)
+            except Exception:
+                logger.exception("Feed listener failed, reconnecting in %.0fs", FEED_LISTEN_RECONNECT)
+                self._stop.wait(FEED_LISTEN_RECONNECT)
+            finally:
+                if connection is not None:
+                    connection.close()
+
+    def _listen(self, dbapi):
+        while not self._stop.is_set():
+            if select.select([dbapi], [], [], 1.0) == ([], [], []):
+                continue
+            dbapi.poll()
+            while dbapi.notifies:
+                notify = dbapi.notifies.pop(0)
+                user_id, _, version = notify.payload.partition(":")
+                broadcaster.publish_threadsafe(int(user_id), int(version))
+
+
+_listener = None
+
+
+def start(engine):
+    """
+    З lifespan: прив'язує broadcaster до event loop і, для postgres, запускає слухача.
+    """
+    global _listener
+    broadcaster.start(asyncio.get_running_loop())
+    use_notify = FEED_BACKEND == "postgres" or (FEED_BACKEND == "auto" and engine.dialect.name == "postgresql")
+    if use_notify and _listener is None:
+        _listener = PostgresListener(engine)
+        _listener.start()
+
+
+async def stop():
+    """
+    Завершує відкриті потоки подій (клієнти перепідключаться з Last-Event-ID) і слухача.
+    """
+    global _listener
+    broadcaster.close()
+    if _listener is not None:
+        await run_in_threadpool(_listener.stop)
+        _listener = None
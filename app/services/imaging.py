@@ -0,0 +1,28 @@
+# services/imaging.py — обробка зображень у пулі процесів
+#
+# Модуль навмисно легкий (лише Pillow): його імпортують дочірні процеси пулу.
+
+from io import BytesIO              # Результат у пам'яті (мініатюри невеликі)
+from PIL import Image, ImageOps     # Pillow
+
+
+def render_variants(source_path: str, sizes: dict, max_pixels: int, fmt: str = "WEBP", quality: int = 80) -> dict:
+    """
+    Створює зменшені копії зображення.
+    - sizes: {назва: максимальна сторона в пікселях}
+    - max_pixels: захист від "decompression bomb"
+    Повертає {назва: bytes}. Зображення не збільшуються — лише зменшуються.
+    """
+    Image.MAX_IMAGE_PIXELS = max_pixels
+    with Image.open(source_path) as image:
+        image = ImageOps.exif_transpose(image)  # Враховуємо орієнтацію з EXIF
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+        variants = {}
+        for name, size in sizes.items():
+            variant = image.copy()
+            variant.thumbnail((size, size), Image.Resampling.LANCZOS)
+            out = BytesIO()
+            variant.save(out, fmt, quality=quality)
+            variants[name] = out.getvalue()
+        return variants
@@ -0,0 +1,233 @@
+# services/metrics.py — метрики продуктивності для Prometheus і вибіркове профілювання запитів
+#
+# Для кожного HTTP-запиту: затримка за маршрутом, кількість SQL-запитів і сумарний час у БД
+# (через події SQLAlchemy before/after_cursor_execute), виклики сховища.
+# Лічильники запиту живуть у contextvar — він успадковується threadpool (run_in_threadpool)
+# і run_sync асинхронної сесії, тож SQL з будь-якого режиму DB_ASYNC потрапляє у свій запит.
+
+import cProfile                                    # Профілювання без зовнішніх залежностей
+import contextvars                                 # Лічильники поточного запиту
+import logging                                     # Повідомлення про збережені профілі
+import os                                          # Налаштування зі змінних середовища
+import random                                      # Вибірка запитів для профілювання
+import re                                          # Безпечні імена файлів профілів
+import threading                                   # Одночасно профілюється лише один запит
+import time                                        # Вимірювання затримок
+from contextlib import contextmanager              # observe_storage()
+from dataclasses import dataclass                  # Лічильники запиту
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from sqlalchemy import event                       # Хуки виконання SQL
+from sqlalchemy.engine import Engine               # Слухаємо всі двигуни (sync і async.sync_engine)
+
+logger = logging.getLogger(__name__)
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "True").lower() == "true"      # Збирати метрики і віддавати /metrics
+PROFILE_MODE = os.getenv("PROFILE_MODE", "off")                                # off | cprofile | pyinstrument
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0.01"))          # Частка запитів, що профілюються
+PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_MS", "500"))                   # Зберігати профіль лише повільніших запитів
+PROFILE_DIR = os.getenv("PROFILE_DIR", "./profiles")                           # Куди зберігати звіти
+
+# Межі гістограм: від 1 мс до 10 с (затримки) і від 1 до 200 (SQL-запитів на HTTP-запит)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "HTTP request latency", ["method", "route", "status"], buckets=LATENCY_BUCKETS,
+)
+REQUESTS_IN_PROGRESS = Gauge("http_requests_in_progress", "HTTP requests being served", multiprocess_mode="livesum")
+REQUEST_DB_STATEMENTS = Histogram(
+    "http_request_db_statements", "SQL statements executed per HTTP request", ["route"], buckets=COUNT_BUCKETS,
+)
+REQUEST_DB_TIME = Histogram(
+    "http_request_db_seconds", "Total time spent in SQL per HTTP request", ["route"], buckets=LATENCY_BUCKETS,
+)
+DB_STATEMENTS = Counter("db_statements_total", "SQL statements executed (including background work)")
+RATE_LIMITED = Counter("rate_limited_requests_total", "Requests rejected by rate limit policies", ["policy"])
+STORAGE_LATENCY = Histogram(
+    "storage_operation_duration_seconds", "Object storage call latency", ["operation", "outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+# Черга outbox — стан БД, однаковий для всіх процесів: у multiprocess-режимі береться останнє значення
+OUTBOX_DEPTH = Gauge("outbox_pending_events", "Outbox events waiting to be processed", multiprocess_mode="mostrecent")
+OUTBOX_DEAD = Gauge("outbox_dead_events", "Outbox events that ran out of attempts", multiprocess_mode="mostrecent")
+OUTBOX_LAG = Gauge("outbox_lag_seconds", "Age of the oldest pending outbox event", multiprocess_mode="mostrecent")
+
+
+@dataclass
+class RequestStats:
+    db_statements: int = 0
+    db_seconds: float = 0.0
+
+
+_request_stats: contextvars.ContextVar = contextvars.ContextVar("request_stats", default=None)
+
+
+def current_stats() -> RequestStats | None:
+    return _request_stats.get()
+
+
+# SQLAlchemy: час кожного запиту зберігаємо на з'єднанні (стек — на випадок вкладених викликів)
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("query_start")
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    if not METRICS_ENABLED:
+        return
+    DB_STATEMENTS.inc()
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.db_statements += 1
+        stats.db_seconds += elapsed
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(context):
+    # after_cursor_execute не викликається для запиту з помилкою — прибираємо його час
+    connection = context.connection
+    if connection is not None and connection.info.get("query_start"):
+        connection.info["query_start"].pop()
+
+
+@contextmanager
+def observe_storage(operation: str):
+    """
+    Вимірює виклик сховища: with observe_storage("upload"): ...
+    """
+    if not METRICS_ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        STORAGE_LATENCY.labels(operation, outcome).observe(time.perf_counter() - start)
+
+
+def render() -> tuple[bytes, str]:
+    """
+    Текст для /metrics. При кількох воркерах gunicorn (PROMETHEUS_MULTIPROC_DIR)
+    агрегує значення всіх процесів.
+    """
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+class RequestProfiler:
+    """
+    Вибіркове профілювання: PROFILE_SAMPLE_RATE запитів виконуються під профайлером,
+    звіт зберігається у PROFILE_DIR, якщо запит тривав довше за PROFILE_SLOW_MS.
+    Одночасно профілюється лише один запит (профайлер бачить увесь event loop).
+    """
+
+    def __init__(self, mode: str, sample_rate: float, slow_ms: float, directory: str):
+        self.mode = mode
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self.directory = directory
+        self._busy = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode in ("cprofile", "pyinstrument") and self.sample_rate > 0
+
+    def start(self):
+        """
+        Повертає запущений профайлер або None, якщо запит не потрапив у вибірку.
+        """
+        if random.random() >= self.sample_rate or not self._busy.acquire(blocking=False):
+            return None
+        try:
+            if self.mode == "pyinstrument":
+                from pyinstrument import Profiler  # Необов'язкова залежність: pip install pyinstrument
+                profiler = Profiler(async_mode="enabled")
+                profiler.start()
+            else:
+                profiler = cProfile.Profile()
+                profiler.enable()
+            return profiler
+        except BaseException:
+            self._busy.release()
+            raise
+
+    def stop(self, profiler, method: str, route: str, elapsed: float):
+        try:
+            if self.mode == "pyinstrument":
+                profiler.stop()
+            else:
+                profiler.disable()
+            if elapsed * 1000 < self.slow_ms:
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            slug = re.sub(r"[^A-Za-z0-9]+", "_", route).strip("_") or "root"
+            name = f"{time.strftime('%Y%m%d-%H%M%S')}-{method}-{slug}-{int(elapsed * 1000)}ms"
+            if self.mode == "pyinstrument":
+                path = os.path.join(self.directory, name + ".html")
+                with open(path, "w") as f:
+                    f.write(profiler.output_html())
+            else:
+                path = os.path.join(self.directory, name + ".prof")
+                profiler.dump_stats(path)  # Перегляд: python -m pstats або snakeviz
+            logger.warning("Slow request %s %s took %.0f ms, profile saved to %s", method, route, elapsed * 1000, path)
+        finally:
+            self._busy.release()
+
+
+profiler = RequestProfiler(PROFILE_MODE, PROFILE_SAMPLE_RATE, PROFILE_SLOW_MS, PROFILE_DIR)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware: затримка, статус, SQL-запити і час у БД для кожного HTTP-запиту.
+    Маршрут береться з шаблону (/notes/{note_id}), а не з фактичного шляху,
+    щоб кількість рядків у метриках не росла з кількістю нотаток.
+    """
+
+    def __init__(self, app, skip_paths: tuple[str, ...] = ("/metrics",)):
+        self.app = app
+        self.skip_paths = skip_paths
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED or scope["path"] in self.skip_paths:
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        status = 500
+        session_profiler = profiler.start() if profiler.enabled else None
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        REQUESTS_IN_PROGRESS.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            REQUESTS_IN_PROGRESS.dec()
+            _request_stats.reset(token)
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            method = scope["method"]
+            REQUEST_LATENCY.labels(method, route, str(status)).observe(elapsed)
+            REQUEST_DB_STATEMENTS.labels(route).observe(stats.db_statements)
+            REQUEST_DB_TIME.labels(route).observe(stats.db_seconds)
+            if session_profiler is not None:
+                profiler.stop(session_profiler, method, route, elapsed)
@@ -0,0 +1,292 @@
+# services/outbox.py — transactional outbox для побічних дій (сховище файлів, похідні об'єкти)
+#
+# Роут записує подію в таблицю outbox у тій самій транзакції, що й зміни даних,
+# а воркер (у процесі застосунку або окремо: python -m app.worker) забирає події пачками,
+# виконує їх з повторними спробами та експоненційним backoff і видаляє виконані.
+# Той самий воркер запускає періодичні задачі обслуговування (@periodic), наприклад очищення tombstones.
+
+import asyncio                                  # Фоновий цикл воркера
+import logging                                  # Помилки обробки подій
+import os                                       # Налаштування зі змінних середовища
+import random                                   # Jitter для backoff
+import time                                     # Розклад періодичних задач
+from collections import defaultdict             # Групування подій за типом / бакетом
+from datetime import timedelta                 # Backoff і lease
+from fastapi.concurrency import run_in_threadpool   # Синхронна обробка пачки поза event loop
+from sqlalchemy import select, update, delete, func  # Запити до outbox
+from sqlalchemy.orm import Session              # Сесія SQLAlchemy
+from app import database, models                # Фабрика сесій та модель OutboxEvent
+from app.services import metrics, storage       # Gauge-и черги, обробник storage.remove
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_WORKER = os.getenv("OUTBOX_WORKER", "inprocess")                     # inprocess — воркер у процесі API; external — окремий процес
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "100"))              # Подій за одну пачку
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", "2"))        # Пауза, коли черга порожня (секунди)
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "10"))           # Після цього подія стає dead
+OUTBOX_BACKOFF_BASE = float(os.getenv("OUTBOX_BACKOFF_BASE", "1"))          # Перша пауза між спробами (секунди)
+OUTBOX_BACKOFF_MAX = float(os.getenv("OUTBOX_BACKOFF_MAX", "300"))          # Максимальна пауза між спробами
+OUTBOX_LEASE_SECONDS = float(os.getenv("OUTBOX_LEASE_SECONDS", "60"))       # Скільки подія зарезервована за воркером
+
+STORAGE_REMOVE = "storage.remove"  # payload: {"bucket": ..., "paths": [...]}
+
+
+def enqueue(db: Session, kind: str, payload: dict):
+    """
+    Додає подію в поточну транзакцію (commit робить викликач).
+    """
+    now = models.utcnow()
+    db.add(models.OutboxEvent(kind=kind, payload=payload, status="pending",
+                              attempts=0, available_at=now, created_at=now))
+
+
+def enqueue_storage_remove(db: Session, bucket: str, paths: list[str]):
+    if paths:
+        enqueue(db, STORAGE_REMOVE, {"bucket": bucket, "paths": list(paths)})
+
+
+# Обробники подій: kind → функція(список payload), що виконує всю пачку одного типу
+HANDLERS = {}
+# kind → скільки подій цього типу брати за одну пачку (для повільних обробників, щоб встигнути за lease)
+BATCH_LIMITS = {}
+
+
+class PartialFailure(Exception):
+    """
+    Обробник виконав лише частину пачки: failed — індекси payload, які треба повторити,
+    решта вважається виконаною.
+    """
+
+    def __init__(self, failed: list[int], error: Exception):
+        super().__init__(f"{len(failed)} payloads failed: {error!r}")
+        self.failed = failed
+        self.error = error
+
+
+def handler(kind: str, batch_size: int | None = None):
+    def register(fn):
+        HANDLERS[kind] = fn
+        if batch_size:
+            BATCH_LIMITS[kind] = batch_size
+        return fn
+    return register
+
+
+# Періодичні задачі воркера: назва → (інтервал у секундах, функція(сесія))
+PERIODIC = {}
+
+
+def periodic(name: str, interval: float):
+    def register(fn):
+        PERIODIC[name] = (interval, fn)
+        return fn
+    return register
+
+
+def run_periodic(names: list[str]):
+    """
+    Виконує періодичні задачі, кожну у власній сесії; помилка однієї не зупиняє інші.
+    """
+    for name in names:
+        _, fn = PERIODIC[name]
+        try:
+            with database.SessionLocal() as db:
+                fn(db)
+        except Exception as e:
+            logger.exception("Periodic task %s failed: %s", name, e)
+
+
+@handler(STORAGE_REMOVE)
+def _remove_from_storage(payloads: list[dict]):
+    """
+    Один виклик remove([...]) на бакет для всієї пачки.
+    """
+    by_bucket = defaultdict(list)
+    for payload in payloads:
+        by_bucket[payload["bucket"]].extend(payload["paths"])
+    for bucket, paths in by_bucket.items():
+        storage.remove_files(bucket, list(dict.fromkeys(paths)))
+
+
+def backoff(attempts: int) -> float:
+    delay = min(OUTBOX_BACKOFF_BASE * 2 ** max(attempts - 1, 0), OUTBOX_BACKOFF_MAX)
+    return delay * random.uniform(0.5, 1.5)
+
+
+def _claim(db: Session, limit: int) -> list:
+    """
+    Резервує пачку доступних подій: піднімає attempts і зсуває available_at на lease,
+    щоб інші воркери їх не взяли. У PostgreSQL — FOR UPDATE SKIP LOCKED.
+    Подій типу з BATCH_LIMITS береться не більше ліміту; решта лишається для наступної пачки.
+    """
+    now = models.utcnow()
+    stmt = (
+        select(models.OutboxEvent.id, models.OutboxEvent.kind,
+               models.OutboxEvent.payload, models.OutboxEvent.attempts)
+        .where(models.OutboxEvent.status == "pending", models.OutboxEvent.available_at <= now)
+        .order_by(models.OutboxEvent.id)
+        .limit(limit)
+    )
+    if db.get_bind().dialect.name == "postgresql":
+        stmt = stmt.with_for_update(skip_locked=True)
+    events = []
+    taken = defaultdict(int)
+    for event in db.execute(stmt).all():
+        limit_for_kind = BATCH_LIMITS.get(event.kind)
+        if limit_for_kind is not None and taken[event.kind] >= limit_for_kind:
+            continue
+        taken[event.kind] += 1
+        events.append(event)
+    if events:
+        db.execute(
+            update(models.OutboxEvent)
+            .where(models.OutboxEvent.id.in_([event.id for event in events]))
+            .values(attempts=models.OutboxEvent.attempts + 1,
+                    available_at=now + timedelta(seconds=OUTBOX_LEASE_SECONDS))
+            .execution_options(synchronize_session=False)
+        )
+    db.commit()
+    return events
+
+
+def process_batch(limit: int = OUTBOX_BATCH_SIZE) -> int:
+    """
+    Забирає та виконує одну пачку подій. Повертає кількість оброблених подій.
+    """
+    with database.SessionLocal() as db:
+        events = _claim(db, limit)
+        if not events:
+            return 0
+
+        by_kind = defaultdict(list)
+        for event in events:
+            by_kind[event.kind].append(event)
+
+        done, failed = [], []
+        for kind, group in by_kind.items():
+            try:
+                fn = HANDLERS.get(kind)
+                if fn is None:
+                    raise LookupError(f"No outbox handler for '{kind}'")
+                fn([event.payload for event in group])
+                done += [event.id for event in group]
+            except PartialFailure as e:
+                logger.warning("%s failed for %d of %d events: %s", kind, len(e.failed), len(group), e.error)
+                retry = set(e.failed)
+                done += [event.id for i, event in enumerate(group) if i not in retry]
+                failed += [(event, repr(e.error)) for i, event in enumerate(group) if i in retry]
+            except Exception as e:
+                logger.warning("%s failed for %d events: %s", kind, len(group), e)
+                failed += [(event, repr(e)) for event in group]
+
+        if done:
+            db.execute(
+                delete(models.OutboxEvent)
+                .where(models.OutboxEvent.id.in_(done))
+                .execution_options(synchronize_session=False)
+            )
+        now = models.utcnow()
+        for event, error in failed:
+            attempts = event.attempts + 1
+            values = {"last_error": error[:2000]}
+            if attempts >= OUTBOX_MAX_ATTEMPTS:
+                values["status"] = "dead"
+            else:
+                values["available_at"] = now + timedelta(seconds=backoff(attempts))
+            db.execute(
+                update(models.OutboxEvent)
+                .where(models.OutboxEvent.id == event.id)
+                .values(**values)
+                .execution_options(synchronize_session=False)
+            )
+        db.commit()
+        return len(events)
+
+
+def stats(db: Session) -> dict:
+    """
+    Метрики черги: глибина (pending), dead-події та lag — вік найстарішої pending-події.
+    """
+    depth, oldest = db.execute(
+        select(func.count(), func.min(models.OutboxEvent.created_at))
+        .where(models.OutboxEvent.status == "pending")
+    ).one()
+    dead = db.scalar(
+        select(func.count()).select_from(models.OutboxEvent).where(models.OutboxEvent.status == "dead")
+    )
+    lag = (models.utcnow() - oldest).total_seconds() if oldest else 0.0
+    return {"depth": depth, "dead": dead, "lag_seconds": round(max(lag, 0.0), 3)}
+
+
+async def export_metrics():
+    """
+    Оновлює gauge-и черги перед віддачею /metrics (черга — у БД, тож знімаємо її під час scrape).
+    Якщо БД недоступна, лишаються попередні значення, а решта метрик віддається як завжди.
+    """
+    try:
+        queue = await database.run_in_session(stats)
+    except Exception:
+        logger.warning("Failed to read outbox stats for metrics", exc_info=True)
+        return
+    metrics.OUTBOX_DEPTH.set(queue["depth"])
+    metrics.OUTBOX_DEAD.set(queue["dead"])
+    metrics.OUTBOX_LAG.set(queue["lag_seconds"])
+
+
+class OutboxWorker:
+    """
+    Фоновий цикл: обробляє пачки, поки є події, інакше чекає OUTBOX_POLL_INTERVAL
+    або сигналу notify() (роут щойно записав подію). Між пачками запускає періодичні задачі,
+    інтервал яких минув.
+    """
+
+    def __init__(self):
+        self._task = None
+        self._wakeup = None
+        self._stopping = False
+        self._next_periodic = {}
+
+    def start(self):
+        if self._task is None:
+            self._stopping = False
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+
+    def notify(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _due_periodic(self) -> list[str]:
+        now = time.monotonic()
+        due = [name for name in PERIODIC if self._next_periodic.get(name, 0) <= now]
+        for name in due:
+            self._next_periodic[name] = now + PERIODIC[name][0]
+        return due
+
+    async def run(self):
+        while not self._stopping:
+            due = self._due_periodic()
+            if due:
+                await run_in_threadpool(run_periodic, due)
+            try:
+                processed = await run_in_threadpool(process_batch)
+            except Exception as e:
+                logger.exception("Outbox worker error: %s", e)
+                processed = 0
+            if processed:
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=OUTBOX_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+
+worker = OutboxWorker()
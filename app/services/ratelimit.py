@@ -0,0 +1,560 @@
+# services/ratelimit.py — обмеження частоти запитів (token bucket) і backoff для невдалих логінів
+#
+# Політики описують відро токенів: rate запитів за секунду в середньому і burst — скільки можна
+# одразу. Ключ відра — IP клієнта або користувач (для анонімних запитів — IP), тож одна політика
+# діє окремо для кожного клієнта. Запит перевіряється одразу проти всіх політик, що йому
+# відповідають, за один виклик бекенду: токен списується лише якщо всі відра дозволяють.
+#
+# Бекенди (RATE_LIMIT_BACKEND):
+# - memory — словник у пам'яті процесу (один воркер або ліміти "на процес")
+# - redis  — спільний стан для всіх воркерів і подів; відра оновлює Lua-скрипт атомарно,
+#            час береться з Redis (годинники подів не мусять збігатися)
+# - fake   — RedisBackend поверх FakeRedis у пам'яті (для тестів без Redis)
+# Якщо Redis недоступний, запити пропускаються (RATE_LIMIT_FAIL_OPEN) — ліміти не мають
+# класти API разом із собою.
+#
+# IP клієнта — адреса з'єднання (scope["client"]). За балансувальником це адреса самого балансувальника,
+# тож усі клієнти ділили б одне відро: задайте FORWARDED_ALLOW_IPS (gunicorn.conf.py, docker-compose.yml),
+# і uvicorn підставить справжню адресу з X-Forwarded-For ще до цього middleware.
+# RATE_LIMIT_TRUST_PROXY — лише для запуску без uvicorn/gunicorn: бере першу адресу X-Forwarded-For,
+# яку клієнт може підробити, якщо проксі дописує заголовок, а не перезаписує його.
+#
+# Невдалі логіни рахуються для пари (email, IP клієнта): після LOGIN_BACKOFF_FREE_ATTEMPTS спроб
+# пара блокується на LOGIN_BACKOFF_BASE × 2^n секунд (до LOGIN_BACKOFF_MAX), і під час блокування
+# пароль навіть не перевіряється — перебір паролів не спалює CPU на bcrypt. Блокування лише за email
+# дозволило б будь-кому заблокувати чужий акаунт; тому для email загалом (з усіх IP) діє значно
+# вільніший поріг LOGIN_EMAIL_FREE_ATTEMPTS — проти розподіленого перебору з багатьох адрес.
+
+import hashlib                             # Ключі без email і токенів у відкритому вигляді
+import json                                # Політики зі змінної середовища
+import logging                             # Попередження про недоступний бекенд
+import math                                # Округлення Retry-After
+import os                                  # Налаштування зі змінних середовища
+import threading                           # Ліниве створення лімітера
+import time                                # Монотонний час для відер у пам'яті
+from collections import OrderedDict        # LRU відер у пам'яті
+from dataclasses import dataclass          # Політика ліміту
+from jose import jwt                       # sub з токена без перевірки підпису (для політик "user")
+from starlette.responses import JSONResponse  # Відповідь 429 з middleware
+from app.services import metrics           # Лічильник відхилених запитів
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "True").lower() == "true"  # Вмикає middleware
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")                 # memory | redis | fake
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL", os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+RATE_LIMIT_REDIS_TIMEOUT = float(os.getenv("RATE_LIMIT_REDIS_TIMEOUT", "0.25"))  # Таймаут одного виклику Redis (секунди)
+RATE_LIMIT_PREFIX = os.getenv("RATE_LIMIT_PREFIX", "rl:")                       # Префікс ключів у Redis
+RATE_LIMIT_FAIL_OPEN = os.getenv("RATE_LIMIT_FAIL_OPEN", "True").lower() == "true"  # Пропускати запити, якщо бекенд недоступний
+RATE_LIMIT_TRUST_PROXY = os.getenv("RATE_LIMIT_TRUST_PROXY", "False").lower() == "true"  # IP з X-Forwarded-For; під gunicorn краще FORWARDED_ALLOW_IPS
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))          # Відер у пам'яті (memory), найстаріші витісняються
+RATE_LIMIT_POLICIES = os.getenv("RATE_LIMIT_POLICIES")                          # JSON-список політик замість стандартних
+
+# Backoff невдалих логінів
+LOGIN_BACKOFF_FREE_ATTEMPTS = int(os.getenv("LOGIN_BACKOFF_FREE_ATTEMPTS", "3"))  # Невдалих спроб без блокування
+LOGIN_BACKOFF_BASE = float(os.getenv("LOGIN_BACKOFF_BASE", "1"))                   # Перше блокування (секунди)
+LOGIN_BACKOFF_MAX = float(os.getenv("LOGIN_BACKOFF_MAX", "900"))                   # Максимальне блокування (секунди)
+LOGIN_FAILURE_WINDOW = float(os.getenv("LOGIN_FAILURE_WINDOW", "3600"))            # Лічильник скидається після паузи (секунди)
+LOGIN_EMAIL_FREE_ATTEMPTS = int(os.getenv("LOGIN_EMAIL_FREE_ATTEMPTS", "100"))     # Невдач з усіх IP до блокування email загалом
+
+SKIP_PATHS = ("/metrics", "/health/live", "/health/ready")
+
+
+@dataclass(frozen=True)
+class Policy:
+    """
+    Політика ліміту:
+    - name: назва (частина ключа відра і значення X-RateLimit-Policy)
+    - requests / per: середня швидкість — requests запитів за per секунд
+    - burst: місткість відра (скільки запитів можна зробити поспіль)
+    - key: "ip" або "user" (анонімні запити рахуються за IP)
+    - path: префікс шляху ("" — усі шляхи)
+    - methods: HTTP-методи (порожній — усі)
+    """
+    name: str
+    requests: float
+    per: float
+    burst: int
+    key: str = "ip"
+    path: str = ""
+    methods: tuple[str, ...] = ()
+
+    @property
+    def rate(self) -> float:
+        return self.requests / self.per
+
+    def matches(self, method: str, path: str) -> bool:
+        return path.startswith(self.path) and (not self.methods or method in self.methods)
+
+
+DEFAULT_POLICIES = (
+    # bcrypt на кожен логін/реєстрацію — найдорожчі запити API
+    Policy("login", requests=10, per=60, burst=5, key="ip", path="/users/login", methods=("POST",)),
+    Policy("register", requests=5, per=60, burst=5, key="ip", path="/users/register", methods=("POST",)),
+    Policy("upload", requests=30, per=60, burst=10, key="user", path="/notes/upload", methods=("POST",)),
+    Policy("user", requests=20, per=1, burst=40, key="user"),
+    Policy("ip", requests=50, per=1, burst=100, key="ip"),
+)
+
+
+def load_policies(raw: str | None = RATE_LIMIT_POLICIES) -> tuple[Policy, ...]:
+    """
+    Політики з JSON (RATE_LIMIT_POLICIES), наприклад:
+    [{"name": "login", "requests": 5, "per": 60, "burst": 3, "path": "/users/login", "methods": ["POST"]}]
+    """
+    if not raw:
+        return DEFAULT_POLICIES
+    policies = []
+    for item in json.loads(raw):
+        item["methods"] = tuple(method.upper() for method in item.get("methods", ()))
+        policy = Policy(**item)
+        if policy.key not in ("ip", "user") or policy.requests <= 0 or policy.per <= 0 or policy.burst < 1:
+            raise ValueError(f"Invalid rate limit policy: {item}")
+        policies.append(policy)
+    return tuple(policies)
+
+
+# Алгоритм відра (спільний для MemoryBackend і FakeRedis; той самий, що в Lua-скрипті)
+
+def take_buckets(states: list, now: float, limits: list[tuple[float, int]]):
+    """
+    states — (tokens, updated_at) для кожного відра або None для нового (повне відро),
+    limits — (rate за секунду, burst). Списує по токену з кожного відра, лише якщо всі дозволяють.
+    Повертає (allowed, wait — секунд до дозволу, index — відро, що обмежує, нові states).
+    """
+    tokens = []
+    wait, index = 0.0, -1
+    for i, (state, (rate, burst)) in enumerate(zip(states, limits)):
+        current, updated_at = state if state is not None else (burst, now)
+        current = min(burst, current + max(0.0, now - updated_at) * rate)
+        tokens.append(current)
+        if current < 1 and (1 - current) / rate > wait:
+            wait, index = (1 - current) / rate, i
+    allowed = index == -1
+    new_states = [(current - 1 if allowed else current, now) for current in tokens]
+    return allowed, wait, index, new_states
+
+
+class BackendError(Exception):
+    """
+    Бекенд лімітів недоступний (Redis не відповідає).
+    """
+
+
+class MemoryBackend:
+    """
+    Відра й блокування логінів у пам'яті процесу.
+    Виконується в event loop без await усередині, тож блокування не потрібні.
+    clock — джерело часу (підміняється в тестах).
+    """
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS, clock=time.monotonic):
+        self.max_keys = max_keys
+        self.clock = clock
+        self._buckets = OrderedDict()   # key -> (tokens, updated_at)
+        self._expiring = {}             # key -> (value, expires_at): лічильники та блокування логінів
+
+    async def take(self, keys: list[str], limits: list[tuple[float, int]]):
+        now = self.clock()
+        allowed, wait, index, states = take_buckets([self._buckets.get(key) for key in keys], now, limits)
+        for key, state in zip(keys, states):
+            self._buckets[key] = state
+            self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return allowed, wait, index
+
+    def _get(self, key):
+        item = self._expiring.get(key)
+        if item is not None and item[1] <= self.clock():
+            del self._expiring[key]
+            return None
+        return item
+
+    async def ttl(self, key: str) -> float:
+        item = self._get(key)
+        return item[1] - self.clock() if item else 0.0
+
+    async def incr(self, key: str, ttl: float) -> int:
+        item = self._get(key)
+        count = (item[0] if item else 0) + 1
+        self._expiring[key] = (count, self.clock() + ttl)
+        if len(self._expiring) > self.max_keys:
+            self._expiring.pop(next(iter(self._expiring)))
+        return count
+
+    async def set(self, key: str, ttl: float):
+        self._expiring[key] = (1, self.clock() + ttl)
+
+    async def delete(self, *keys: str):
+        for key in keys:
+            self._expiring.pop(key, None)
+
+    async def aclose(self):
+        pass
+
+    def stats(self) -> dict:
+        return {"backend": "memory", "buckets": len(self._buckets), "keys": len(self._expiring)}
+
+
+# Lua: те саме, що take_buckets. KEYS — відра, ARGV — rate (за мс) і burst для кожного відра.
+# Повертає {allowed, wait_ms, index (з 0, -1 — без обмеження)}
+TOKEN_BUCKET_LUA = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local tokens = {}
+local wait, index = 0, -1
+for i = 1, #KEYS do
+    local rate, burst = tonumber(ARGV[i * 2 - 1]), tonumber(ARGV[i * 2])
+    local state = redis.call('HMGET', KEYS[i], 'tokens', 'ts')
+    local current = tonumber(state[1]) or burst
+    local ts = tonumber(state[2]) or now
+    current = math.min(burst, current + math.max(0, now - ts) * rate)
+    tokens[i] = current
+    if current < 1 and (1 - current) / rate > wait then
+        wait, index = (1 - current) / rate, i - 1
+    end
+end
+for i = 1, #KEYS do
+    local rate, burst = tonumber(ARGV[i * 2 - 1]), tonumber(ARGV[i * 2])
+    local current = tokens[i]
+    if index == -1 then current = current - 1 end
+    redis.call('HSET', KEYS[i], 'tokens', tostring(current), 'ts', now)
+    redis.call('PEXPIRE', KEYS[i], math.ceil((burst - current) / rate) + 1000)
+end
+return {index == -1 and 1 or 0, math.ceil(wait), index}
+"""
+
+
+class RedisBackend:
+    """
+    Спільні відра в Redis (або сумісному сервері: Valkey, KeyDB, DragonflyDB).
+    client — redis.asyncio.Redis або FakeRedis.
+    """
+
+    def __init__(self, client, prefix: str = RATE_LIMIT_PREFIX):
+        self.client = client
+        self.prefix = prefix
+        self._script = client.register_script(TOKEN_BUCKET_LUA)
+        try:
+            from redis.exceptions import RedisError
+            self._errors = (RedisError, OSError, TimeoutError)
+        except ImportError:
+            self._errors = (OSError, TimeoutError)
+
+    async def _call(self, coro):
+        try:
+            return await coro
+        except self._errors as e:
+            raise BackendError(f"Rate limit backend unavailable: {type(e).__name__}") from e
+
+    async def take(self, keys: list[str], limits: list[tuple[float, int]]):
+        args = []
+        for rate, burst in limits:
+            args += [rate / 1000, burst]
+        allowed, wait_ms, index = await self._call(
+            self._script(keys=[self.prefix + key for key in keys], args=args)
+        )
+        return bool(allowed), wait_ms / 1000, int(index)
+
+    async def ttl(self, key: str) -> float:
+        ms = await self._call(self.client.pttl(self.prefix + key))
+        return ms / 1000 if ms > 0 else 0.0
+
+    async def incr(self, key: str, ttl: float) -> int:
+        count = await self._call(self.client.incr(self.prefix + key))
+        await self._call(self.client.pexpire(self.prefix + key, math.ceil(ttl * 1000)))
+        return count
+
+    async def set(self, key: str, ttl: float):
+        await self._call(self.client.set(self.prefix + key, 1, px=math.ceil(ttl * 1000)))
+
+    async def delete(self, *keys: str):
+        await self._call(self.client.delete(*(self.prefix + key for key in keys)))
+
+    async def aclose(self):
+        await self.client.aclose()
+
+    def stats(self) -> dict:
+        return {"backend": type(self.client).__name__}
+
+
+class FakeRedis:
+    """
+    Підміна redis.asyncio.Redis у пам'яті — лише команди, які використовує RedisBackend.
+    Скрипт відер виконується через take_buckets (той самий алгоритм, що й Lua).
+    fail_next(n) — наступні n викликів піднімуть ConnectionError (перевірка fail-open).
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.hashes = {}
+        self.values = {}     # key -> (value, expires_at)
+        self._failures = 0
+
+    def fail_next(self, count: int = 1):
+        self._failures = count
+
+    def _check(self):
+        if self._failures > 0:
+            self._failures -= 1
+            raise ConnectionError("FakeRedis: injected failure")
+
+    def register_script(self, script: str):
+        async def run(keys, args):
+            self._check()
+            limits = [(args[i] * 1000, args[i + 1]) for i in range(0, len(args), 2)]
+            now = self.clock()
+            allowed, wait, index, states = take_buckets([self.hashes.get(key) for key in keys], now, limits)
+            self.hashes.update(zip(keys, states))
+            return [int(allowed), math.ceil(wait * 1000), index]
+        return run
+
+    def _get(self, key):
+        item = self.values.get(key)
+        if item is not None and item[1] is not None and item[1] <= self.clock():
+            del self.values[key]
+            return None
+        return item
+
+    async def pttl(self, key):
+        self._check()
+        item = self._get(key)
+        if item is None:
+            return -2
+        return -1 if item[1] is None else math.ceil((item[1] - self.clock()) * 1000)
+
+    async def incr(self, key):
+        self._check()
+        item = self._get(key)
+        value = (item[0] if item else 0) + 1
+        self.values[key] = (value, item[1] if item else None)
+        return value
+
+    async def pexpire(self, key, ms):
+        self._check()
+        item = self._get(key)
+        if item is not None:
+            self.values[key] = (item[0], self.clock() + ms / 1000)
+
+    async def set(self, key, value, px=None):
+        self._check()
+        self.values[key] = (value, self.clock() + px / 1000 if px else None)
+
+    async def delete(self, *keys):
+        self._check()
+        for key in keys:
+            self.values.pop(key, None)
+            self.hashes.pop(key, None)
+
+    async def aclose(self):
+        pass
+
+
+def create_backend(kind: str = RATE_LIMIT_BACKEND):
+    if kind == "redis":
+        import redis.asyncio  # Потрібен лише для RATE_LIMIT_BACKEND=redis
+        client = redis.asyncio.from_url(
+            RATE_LIMIT_REDIS_URL,
+            socket_timeout=RATE_LIMIT_REDIS_TIMEOUT,
+            socket_connect_timeout=RATE_LIMIT_REDIS_TIMEOUT,
+        )
+        return RedisBackend(client)
+    if kind == "fake":
+        return RedisBackend(FakeRedis())
+    return MemoryBackend()
+
+
+@dataclass
+class Decision:
+    allowed: bool
+    retry_after: float = 0.0
+    policy: str | None = None
+
+
+def _digest(value: str) -> str:
+    return hashlib.sha256(value.encode()).hexdigest()[:24]
+
+
+def _login_keys(email: str, ip: str) -> tuple[str, str]:
+    """
+    Ключі лічильників невдалих логінів: (пара email + IP, email загалом).
+    """
+    email = email.strip().lower()
+    return _digest(f"{email}|{ip}"), f"email:{_digest(email)}"
+
+
+class RateLimiter:
+    """
+    Політики + бекенд. check() визначає відра запиту і списує токени.
+    """
+
+    def __init__(self, backend, policies: tuple[Policy, ...] = DEFAULT_POLICIES, fail_open: bool = RATE_LIMIT_FAIL_OPEN):
+        self.backend = backend
+        self.policies = policies
+        self.fail_open = fail_open
+        self.rejected = {}
+        self.backend_errors = 0
+
+    async def check(self, scope) -> Decision:
+        method, path = scope["method"], scope["path"]
+        policies = [policy for policy in self.policies if policy.matches(method, path)]
+        if not policies:
+            return Decision(True)
+        ip = client_ip(scope)
+        user = None
+        if any(policy.key == "user" for policy in policies):
+            user = _user_identity(scope)
+        keys = [
+            f"{policy.name}:u:{user}" if policy.key == "user" and user else f"{policy.name}:ip:{ip}"
+            for policy in policies
+        ]
+        try:
+            allowed, wait, index = await self.backend.take(keys, [(policy.rate, policy.burst) for policy in policies])
+        except BackendError as e:
+            return self._backend_failed(e)
+        if allowed:
+            return Decision(True)
+        name = policies[index].name
+        self.rejected[name] = self.rejected.get(name, 0) + 1
+        metrics.RATE_LIMITED.labels(name).inc()
+        return Decision(False, wait, name)
+
+    def _backend_failed(self, error) -> Decision:
+        self.backend_errors += 1
+        logger.warning("%s; %s", error, "allowing request" if self.fail_open else "rejecting request")
+        return Decision(self.fail_open, 1.0, None if self.fail_open else "backend")
+
+    # Backoff невдалих логінів
+
+    async def login_retry_after(self, email: str, ip: str) -> float:
+        """
+        Скільки секунд вхід для email з цього IP ще заблокований (0 — можна перевіряти пароль).
+        """
+        pair, account = _login_keys(email, ip)
+        try:
+            return max(await self.backend.ttl(f"login-lock:{pair}"), await self.backend.ttl(f"login-lock:{account}"))
+        except BackendError as e:
+            return 0.0 if self._backend_failed(e).allowed else 1.0
+
+    async def login_failed(self, email: str, ip: str) -> float:
+        """
+        Рахує невдалу спробу: після LOGIN_BACKOFF_FREE_ATTEMPTS з одного IP блокує пару (email, IP),
+        після LOGIN_EMAIL_FREE_ATTEMPTS з усіх IP — email загалом, на експоненційно зростаючий час.
+        Повертає тривалість блокування (0 — без блокування).
+        """
+        delays = []
+        try:
+            for key, free in zip(_login_keys(email, ip), (LOGIN_BACKOFF_FREE_ATTEMPTS, LOGIN_EMAIL_FREE_ATTEMPTS)):
+                failures = await self.backend.incr(f"login-fail:{key}", LOGIN_FAILURE_WINDOW)
+                if failures > free:
+                    delay = min(LOGIN_BACKOFF_MAX, LOGIN_BACKOFF_BASE * 2 ** (failures - free - 1))
+                    await self.backend.set(f"login-lock:{key}", delay)
+                    delays.append(delay)
+        except BackendError as e:
+            self._backend_failed(e)
+        return max(delays, default=0.0)
+
+    async def login_succeeded(self, email: str, ip: str):
+        """
+        Скидає лічильник пари (email, IP). Лічильник email загалом спливає сам (LOGIN_FAILURE_WINDOW):
+        успішний вхід власника не має обнуляти розподілений перебір з інших адрес.
+        """
+        pair, _ = _login_keys(email, ip)
+        try:
+            await self.backend.delete(f"login-fail:{pair}", f"login-lock:{pair}")
+        except BackendError as e:
+            self._backend_failed(e)
+
+    def stats(self) -> dict:
+        return {
+            **self.backend.stats(),
+            "policies": [policy.name for policy in self.policies],
+            "rejected": dict(self.rejected),
+            "backend_errors": self.backend_errors,
+        }
+
+
+def client_ip(scope) -> str:
+    """
+    IP клієнта; за довіреним проксі (RATE_LIMIT_TRUST_PROXY) — перша адреса X-Forwarded-For.
+    """
+    if RATE_LIMIT_TRUST_PROXY:
+        for name, value in scope["headers"]:
+            if name == b"x-forwarded-for":
+                return value.decode("latin-1").split(",")[0].strip()
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+def _user_identity(scope) -> str | None:
+    """
+    Відро користувача за Bearer-токеном: sub з токена без перевірки підпису + сам токен.
+    Підпис і строк дії перевіряє залежність роуту (get_current_user) — повний jwt.decode тут
+    коштував би HMAC на кожен запит поза кешем автентифікації. Підроблений токен з чужим sub
+    отримує власне відро (токен інший) і не витрачає ліміт жертви; від перебору токенів
+    захищає політика за IP. Не JWT — None (запит рахується за IP).
+    """
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() != "bearer" or not token:
+                return None
+            try:
+                sub = jwt.get_unverified_claims(token).get("sub")
+            except Exception:
+                return None
+            return _digest(f"{sub}|{token}") if sub else None
+    return None
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_limiter() -> RateLimiter:
+    """
+    Повертає лімітер, створюючи його при першому виклику (клієнт Redis — у воркері, а не при імпорті).
+    """
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                _limiter = RateLimiter(create_backend(), load_policies())
+    return _limiter
+
+
+async def aclose():
+    """
+    Закриває з'єднання з Redis (при зупинці застосунку).
+    """
+    global _limiter
+    if _limiter is not None:
+        await _limiter.backend.aclose()
+        _limiter = None
+
+
+class RateLimitMiddleware:
+    """
+    ASGI middleware: 429 з Retry-After, якщо будь-яка політика запиту вичерпана.
+    """
+
+    def __init__(self, app, skip_paths: tuple[str, ...] = SKIP_PATHS):
+        self.app = app
+        self.skip_paths = skip_paths
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not RATE_LIMIT_ENABLED or scope["path"] in self.skip_paths:
+            await self.app(scope, receive, send)
+            return
+        decision = await get_limiter().check(scope)
+        if not decision.allowed:
+            response = JSONResponse(
+                status_code=429,
+                content={"detail": "Too many requests"},
+                headers={"Retry-After": str(max(1, math.ceil(decision.retry_after))),
+                         "X-RateLimit-Policy": decision.policy or ""},
+            )
+            await response(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
@@ -0,0 +1,205 @@
+# services/search.py — повнотекстовий пошук по нотатках
+#
+# PostgreSQL: згенерована колонка notes.search_vector (tsvector, заголовок важить більше за текст)
+# з GIN-індексом; ранжування ts_rank_cd, фрагменти ts_headline.
+# Фрагменти обох варіантів мають однаковий формат: екранований текст, збіги у <b>...</b>.
+# Інші БД (SQLite для локальної розробки): інвертований індекс у пам'яті процесу,
+# що будується ліниво для користувача і скидається після змін його нотаток.
+
+import math                          # idf для ранжування у fallback-індексі
+import re                            # Розбиття тексту на слова
+import threading                     # Індекс використовується з потоків threadpool
+from collections import OrderedDict  # LRU для індексів користувачів
+from html import escape              # Екранування фрагментів перед підсвічуванням
+from sqlalchemy import select, text  # Запити до БД
+from sqlalchemy.orm import Session   # Сесія SQLAlchemy
+from app import models               # Модель Note
+
+SEARCH_CONFIG = "simple"             # Конфігурація text search (без стемінгу — для будь-якої мови)
+TITLE_WEIGHT = 2.0                   # Вага слова в заголовку відносно тексту (fallback)
+SNIPPET_WORDS = 20                   # Довжина фрагмента у словах
+MAX_INDEXED_USERS = 100              # Скільки індексів користувачів тримати в пам'яті (fallback)
+
+# Межі збігів у ts_headline: символи приватної зони Unicode, а не <b>, щоб текст нотатки
+# можна було екранувати вже після підсвічування (з тексту ці символи прибираються)
+_MARK_START, _MARK_STOP = "\ue000", "\ue001"
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(value: str | None) -> list[str]:
+    return [word.lower() for word in _WORD_RE.findall(value or "")]
+
+
+def search_notes(db: Session, user_id: int, query: str, limit: int, offset: int = 0) -> list[dict]:
+    """
+    Шукає нотатки користувача. Повертає до limit словників
+    {id, title, snippet, rank}, відсортованих за релевантністю.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        return _search_postgres(db, user_id, query, limit, offset)
+    return fallback_index.search(db, user_id, query, limit, offset)
+
+
+def invalidate(user_id: int):
+    """
+    Викликається після змін нотаток користувача (для fallback-індексу;
+    у Postgres search_vector оновлюється автоматично).
+    """
+    fallback_index.invalidate(user_id)
+
+
+# PostgreSQL
+
+# Ранжуємо у підзапиті, а дорогий ts_headline рахуємо лише для рядків сторінки
+_PG_SEARCH_SQL = text(f"""
+    SELECT page.id, page.title, page.rank,
+           ts_headline('{SEARCH_CONFIG}',
+                       translate(coalesce(nullif(page.content, ''), page.title), '{_MARK_START}{_MARK_STOP}', ''),
+                       page.query,
+                       'StartSel={_MARK_START}, StopSel={_MARK_STOP}, MaxWords={SNIPPET_WORDS}, MinWords=5, MaxFragments=2'
+           ) AS snippet
+    FROM (
+        SELECT n.id, n.title, n.content, q.query, ts_rank_cd(n.search_vector, q.query) AS rank
+        FROM notes n, websearch_to_tsquery('{SEARCH_CONFIG}', :query) AS q(query)
+        WHERE n.user_id = :user_id AND n.search_vector @@ q.query
+        ORDER BY rank DESC, n.id DESC
+        LIMIT :limit OFFSET :offset
+    ) AS page
+    ORDER BY page.rank DESC, page.id DESC
+""")
+
+
+def _search_postgres(db: Session, user_id: int, query: str, limit: int, offset: int) -> list[dict]:
+    rows = db.execute(_PG_SEARCH_SQL, {"query": query, "user_id": user_id, "limit": limit, "offset": offset})
+    return [
+        {"id": row.id, "title": row.title, "snippet": _headline_html(row.snippet), "rank": float(row.rank)}
+        for row in rows
+    ]
+
+
+def _headline_html(snippet: str) -> str:
+    """
+    Фрагмент ts_headline у форматі highlight(): текст екранований, збіги — у <b>...</b>.
+    """
+    return escape(snippet).replace(_MARK_START, "<b>").replace(_MARK_STOP, "</b>")
+
+
+# Fallback для SQLite: інвертований індекс у пам'яті
+
+class _UserIndex:
+    """
+    Індекс нотаток одного користувача:
+    postings: слово → {note_id: зважена частота (заголовок × TITLE_WEIGHT + текст)}
+    """
+
+    def __init__(self, notes):
+        self.postings = {}
+        self.notes = {}
+        for note_id, title, content in notes:
+            self.notes[note_id] = (title, content)
+            weights = {}
+            for word in tokenize(title):
+                weights[word] = weights.get(word, 0.0) + TITLE_WEIGHT
+            for word in tokenize(content):
+                weights[word] = weights.get(word, 0.0) + 1.0
+            for word, weight in weights.items():
+                self.postings.setdefault(word, {})[note_id] = weight
+
+    def search(self, terms: list[str]) -> list[tuple[float, int]]:
+        """
+        Нотатки, що містять усі слова запиту, з tf-idf рангом.
+        """
+        if not terms:
+            return []
+        postings = [self.postings.get(term) for term in terms]
+        if not all(postings):
+            return []
+        total = len(self.notes)
+        candidates = set.intersection(*(set(p) for p in postings))
+        ranked = []
+        for note_id in candidates:
+            rank = sum(
+                math.log1p(p[note_id]) * math.log(1 + total / len(p))
+                for p in postings
+            )
+            ranked.append((rank, note_id))
+        ranked.sort(key=lambda item: (-item[0], -item[1]))
+        return ranked
+
+
+class FallbackSearchIndex:
+    """
+    Індекси користувачів у пам'яті процесу (LRU на MAX_INDEXED_USERS).
+    Індекс будується при першому пошуку і скидається через invalidate().
+    """
+
+    def __init__(self, max_users: int = MAX_INDEXED_USERS):
+        self.max_users = max_users
+        self._indexes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def invalidate(self, user_id: int):
+        with self._lock:
+            self._indexes.pop(user_id, None)
+
+    def _get(self, db: Session, user_id: int) -> _UserIndex:
+        with self._lock:
+            index = self._indexes.get(user_id)
+            if index is not None:
+                self._indexes.move_to_end(user_id)
+                return index
+        rows = db.execute(
+            select(models.Note.id, models.Note.title, models.Note.content)
+            .where(models.Note.user_id == user_id)
+        )
+        index = _UserIndex(rows)
+        with self._lock:
+            self._indexes[user_id] = index
+            while len(self._indexes) > self.max_users:
+                self._indexes.popitem(last=False)
+        return index
+
+    def search(self, db: Session, user_id: int, query: str, limit: int, offset: int = 0) -> list[dict]:
+        terms = list(dict.fromkeys(tokenize(query)))
+        index = self._get(db, user_id)
+        results = []
+        for rank, note_id in index.search(terms)[offset:offset + limit]:
+            title, content = index.notes[note_id]
+            results.append({
+                "id": note_id,
+                "title": title,
+                "snippet": highlight(content or title, terms),
+                "rank": round(rank, 6),
+            })
+        return results
+
+
+def highlight(value: str, terms: list[str], words: int = SNIPPET_WORDS) -> str:
+    """
+    Фрагмент тексту довжиною до words слів навколо першого збігу,
+    збіги обгорнуто у <b>...</b> (як ts_headline), решта тексту екранована.
+    """
+    tokens = value.split()
+    wanted = set(terms)
+    first = next(
+        (i for i, token in enumerate(tokens) if any(w.lower() in wanted for w in _WORD_RE.findall(token))),
+        0,
+    )
+    start = max(0, first - words // 4)
+    return " ".join(_mark(token, wanted) for token in tokens[start:start + words])
+
+
+def _mark(token: str, wanted: set[str]) -> str:
+    parts = []
+    pos = 0
+    for match in _WORD_RE.finditer(token):
+        word = match.group(0)
+        parts.append(escape(token[pos:match.start()]))
+        parts.append(f"<b>{escape(word)}</b>" if word.lower() in wanted else escape(word))
+        pos = match.end()
+    parts.append(escape(token[pos:]))
+    return "".join(parts)
+
+
+fallback_index = FallbackSearchIndex()
@@ -0,0 +1,48 @@
+# services/serialization.py — швидка серіалізація списків нотаток: рядки БД → JSON байти
+#
+# Рядки з БД (уже перевірені схемою таблиць) кодуються orjson напряму, без проходу
+# ORM-об'єкт → NoteOut → dict → json.dumps. Формат збігається з NoteOut:
+# datetime — ISO 8601, JSON-колонки — як є.
+#
+# Форми відповіді (?shape=):
+# - rows (за замовчуванням): [{"id": 1, "title": ...}, ...] — як і раніше
+# - columns: {"id": [1, 2, ...], "title": [...], ...} — ключі не повторюються в кожному рядку,
+#   великі списки помітно менші (і до, і після стиснення)
+
+import orjson                                   # Швидке кодування JSON у байти
+from fastapi.responses import Response          # Базовий клас відповіді
+
+SHAPES = ("rows", "columns")                    # Допустимі значення ?shape=
+
+
+def encode_rows(keys: list[str], rows: list[tuple], shape: str = "rows") -> bytes:
+    """
+    Кодує рядки (кортежі значень у порядку keys) в JSON обраної форми.
+    """
+    if shape == "columns":
+        columns = list(zip(*rows)) if rows else [()] * len(keys)
+        return orjson.dumps(dict(zip(keys, columns)))
+    return orjson.dumps([dict(zip(keys, row)) for row in rows])
+
+
+def encode_row(keys: list[str], row) -> bytes:
+    """
+    Один рядок як JSON-об'єкт (для потокових відповідей).
+    """
+    return orjson.dumps(dict(zip(keys, row)))
+
+
+class RowsResponse(Response):
+    """
+    Відповідь зі списком рядків БД: content — (keys, rows), кодується через encode_rows.
+    Валідація response_model при цьому не виконується — дані йдуть прямо з БД.
+    """
+    media_type = "application/json"
+
+    def __init__(self, keys: list[str], rows: list[tuple], shape: str = "rows", **kwargs):
+        self.shape = shape
+        super().__init__(content=(keys, rows), **kwargs)
+
+    def render(self, content) -> bytes:
+        keys, rows = content
+        return encode_rows(keys, rows, self.shape)
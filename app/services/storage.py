@@ -1,28 +1,538 @@
-from supabase import create_client
+# services/storage.py — сховище файлів нотаток
+#
+# StorageService працює поверх асинхронного бекенду і додає до кожного виклику:
+# - семафор: не більше STORAGE_MAX_CONCURRENCY одночасних викликів
+# - повторні спроби з експоненційним backoff і jitter для тимчасових помилок (мережа, 429, 5xx)
+# - circuit breaker: після STORAGE_CIRCUIT_THRESHOLD невдач поспіль виклики одразу
+#   отримують StorageUnavailable на STORAGE_CIRCUIT_RESET секунд, а не чекають таймаутів
+# Supabase викликається напряму через REST API одним httpx.AsyncClient з keep-alive пулом.
+# Сервіс і HTTP-клієнт створюються ліниво: імпорт і старт застосунку не потребують мережі чи ключів.
+#
+# Асинхронний код викликає *_async функції. Синхронні upload_file / remove_files / download_file
+# призначені для коду у threadpool (outbox, мініатюри): виклик виконується в event loop застосунку,
+# тож ліміти, пул з'єднань і circuit breaker спільні для всіх.
+
+import asyncio
+import contextlib
 import os
+import random
+import shutil
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlparse, unquote, quote
+
+import anyio.from_thread
+import httpx
+from fastapi.concurrency import run_in_threadpool
+
+from app.services.metrics import observe_storage
 
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_KEY")  # Використовуємо service role key
 
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+# Бекенд сховища: "supabase" (за замовчуванням), "local" — файли на диску (для розробки)
+# або "memory" — словник у пам'яті процесу (для тестів і бенчмарків без мережі та диска)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "supabase")
+LOCAL_STORAGE_DIR = os.getenv("LOCAL_STORAGE_DIR", "./storage")                 # Коренева тека для "local"
+LOCAL_STORAGE_URL = os.getenv("LOCAL_STORAGE_URL", "http://localhost:8000/files")  # Публічний URL для "local"
+
+# HTTP-клієнт Supabase
+STORAGE_CONNECT_TIMEOUT = float(os.getenv("STORAGE_CONNECT_TIMEOUT", "5"))    # Встановлення з'єднання (секунди)
+STORAGE_TIMEOUT = float(os.getenv("STORAGE_TIMEOUT", "30"))                    # Читання / запис / очікування пулу
+STORAGE_MAX_CONNECTIONS = int(os.getenv("STORAGE_MAX_CONNECTIONS", "20"))      # Розмір пулу з'єднань
+STORAGE_MAX_KEEPALIVE = int(os.getenv("STORAGE_MAX_KEEPALIVE", "10"))          # Скільки з'єднань тримати відкритими
+STORAGE_KEEPALIVE_EXPIRY = float(os.getenv("STORAGE_KEEPALIVE_EXPIRY", "30"))  # Закривати неактивні з'єднання після
+
+# Обмеження та стійкість
+STORAGE_MAX_CONCURRENCY = int(os.getenv("STORAGE_MAX_CONCURRENCY", "16"))      # Одночасних викликів сховища
+STORAGE_RETRIES = int(os.getenv("STORAGE_RETRIES", "3"))                        # Повторів після першої спроби
+STORAGE_BACKOFF_BASE = float(os.getenv("STORAGE_BACKOFF_BASE", "0.2"))          # Перша пауза (секунди)
+STORAGE_BACKOFF_MAX = float(os.getenv("STORAGE_BACKOFF_MAX", "5"))              # Максимальна пауза
+STORAGE_CIRCUIT_THRESHOLD = int(os.getenv("STORAGE_CIRCUIT_THRESHOLD", "5"))    # Невдач поспіль до розмикання
+STORAGE_CIRCUIT_RESET = float(os.getenv("STORAGE_CIRCUIT_RESET", "30"))         # Скільки ланцюг розімкнений (секунди)
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # Блок читання файлу при потоковому завантаженні
+RETRYABLE_STATUSES = {408, 429, 500, 502, 503, 504}
+
+
+class StorageError(Exception):
+    """
+    Помилка сховища, яку не має сенсу повторювати (4xx, неправильний шлях).
+    """
+
+
+class StorageTransientError(StorageError):
+    """
+    Тимчасова помилка (мережа, таймаут, 429, 5xx) — виклик повторюється.
+    """
+
+
+class StorageUnavailable(StorageError):
+    """
+    Сховище недоступне: circuit breaker розімкнений або вичерпано повторні спроби.
+    retry_after — рекомендована пауза (секунди) для заголовка Retry-After.
+    """
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class SupabaseStorage:
+    """
+    Supabase Storage через REST API (/storage/v1/object). Файли передаються потоком
+    блоками по UPLOAD_CHUNK_SIZE, завантаження на диск — теж потоком.
+    """
+
+    def __init__(self, url: str, key: str):
+        self.url = url.rstrip("/") if url else url
+        self.key = key
+        self._client = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            if not self.url or not self.key:
+                raise StorageError("SUPABASE_URL and SUPABASE_SERVICE_KEY must be set")
+            self._client = httpx.AsyncClient(
+                base_url=f"{self.url}/storage/v1",
+                headers={"Authorization": f"Bearer {self.key}", "apikey": self.key},
+                timeout=httpx.Timeout(STORAGE_TIMEOUT, connect=STORAGE_CONNECT_TIMEOUT),
+                limits=httpx.Limits(
+                    max_connections=STORAGE_MAX_CONNECTIONS,
+                    max_keepalive_connections=STORAGE_MAX_KEEPALIVE,
+                    keepalive_expiry=STORAGE_KEEPALIVE_EXPIRY,
+                ),
+            )
+        return self._client
+
+    async def _request(self, method: str, path: str, **kwargs) -> httpx.Response:
+        try:
+            response = await self._get_client().request(method, path, **kwargs)
+        except httpx.TransportError as e:  # Таймаути, розірвані з'єднання, DNS
+            raise StorageTransientError(f"{method} {path}: {e!r}") from e
+        _raise_for_status(response, method, path)
+        return response
+
+    async def upload(self, bucket_name: str, file_name: str, data, content_type: str | None = None):
+        # upsert: повтор після обірваної спроби перезаписує той самий ключ
+        headers = {"x-upsert": "true", "content-type": content_type or "application/octet-stream"}
+        content = data if isinstance(data, bytes) else _iter_file(data)
+        await self._request("POST", f"/object/{bucket_name}/{quote(file_name)}", content=content, headers=headers)
+
+    async def remove(self, bucket_name: str, file_paths: list[str]):
+        response = await self._request("DELETE", f"/object/{bucket_name}", json={"prefixes": file_paths})
+        return response.json()
+
+    async def download(self, bucket_name: str, file_name: str, destination: str):
+        path = f"/object/{bucket_name}/{quote(file_name)}"
+        try:
+            async with self._get_client().stream("GET", path) as response:
+                if response.status_code >= 400:
+                    await response.aread()
+                    _raise_for_status(response, "GET", path)
+                with open(destination, "wb") as out:
+                    async for chunk in response.aiter_bytes():
+                        await run_in_threadpool(out.write, chunk)
+        except httpx.TransportError as e:
+            raise StorageTransientError(f"GET {path}: {e!r}") from e
+
+    def public_url(self, bucket_name: str, file_name: str) -> str:
+        return f"{self.url}/storage/v1/object/public/{bucket_name}/{file_name}"
+
+    async def aclose(self):
+        client, self._client = self._client, None
+        if client is not None:
+            await client.aclose()
+
+    def reset(self):
+        # Клієнт прив'язаний до event loop, у якому створений
+        self._client = None
+
+
+def _raise_for_status(response: httpx.Response, method: str, path: str):
+    if response.status_code < 400:
+        return
+    message = f"{method} {path}: HTTP {response.status_code} {response.text[:200]}"
+    if response.status_code in RETRYABLE_STATUSES:
+        raise StorageTransientError(message)
+    raise StorageError(message)
+
+
+async def _iter_file(source):
+    """
+    Читає файл (шлях або відкритий бінарний файл) блоками у threadpool — тіло запиту
+    не завантажується в пам'ять. Для кожної спроби створюється новий генератор,
+    який починає з початку файлу, тож повтор передає файл повністю.
+    """
+    with open(source, "rb") if isinstance(source, (str, Path)) else contextlib.nullcontext(source) as f:
+        await run_in_threadpool(f.seek, 0)
+        while chunk := await run_in_threadpool(f.read, UPLOAD_CHUNK_SIZE):
+            yield chunk
+
+
+class LocalStorage:
+    """
+    Сховище на локальному диску: {root}/{bucket}/{file_name}.
+    Використовується без мережі — для розробки.
+    """
+
+    def __init__(self, root: str, base_url: str):
+        self.root = Path(root).resolve()
+        self.base_url = base_url.rstrip("/")
+
+    def _path(self, bucket_name: str, file_name: str) -> Path:
+        path = (self.root / bucket_name / file_name).resolve()
+        if self.root not in path.parents:
+            raise StorageError(f"Invalid file path: {file_name}")
+        return path
+
+    def _upload(self, bucket_name: str, file_name: str, data):
+        destination = self._path(bucket_name, file_name)
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        if isinstance(data, bytes):
+            destination.write_bytes(data)
+        elif isinstance(data, (str, Path)):
+            shutil.copyfile(data, destination)
+        else:
+            data.seek(0)  # Повторна спроба передає файл з початку
+            with open(destination, "wb") as out:
+                shutil.copyfileobj(data, out)
+
+    def _remove(self, bucket_name: str, file_paths: list[str]):
+        removed = []
+        for file_path in file_paths:
+            path = self._path(bucket_name, file_path)
+            if path.exists():
+                path.unlink()
+                removed.append(file_path)
+        return removed
+
+    async def upload(self, bucket_name: str, file_name: str, data, content_type: str | None = None):
+        await run_in_threadpool(self._upload, bucket_name, file_name, data)
+
+    async def remove(self, bucket_name: str, file_paths: list[str]):
+        return await run_in_threadpool(self._remove, bucket_name, file_paths)
+
+    async def download(self, bucket_name: str, file_name: str, destination: str):
+        await run_in_threadpool(shutil.copyfile, self._path(bucket_name, file_name), destination)
+
+    def public_url(self, bucket_name: str, file_name: str) -> str:
+        return f"{self.base_url}/{bucket_name}/{quote(file_name)}"
+
+    async def aclose(self):
+        pass
+
+    def reset(self):
+        pass
+
+
+class MemoryStorage:
+    """
+    Фейкове сховище в пам'яті процесу: {(bucket, file_name): (bytes, content_type)}.
+    Для тестів і бенчмарків. inject_failures(n) змушує наступні n викликів
+    впасти з тимчасовою помилкою — так перевіряються повтори та circuit breaker.
+    """
+
+    def __init__(self, base_url: str = "http://memory.storage"):
+        self.base_url = base_url
+        self.objects = {}
+        self.calls = 0
+        self._failures = 0
+        self._lock = threading.Lock()
+
+    def inject_failures(self, count: int):
+        with self._lock:
+            self._failures = count
+
+    def _call(self):
+        with self._lock:
+            self.calls += 1
+            if self._failures > 0:
+                self._failures -= 1
+                raise StorageTransientError("Injected storage failure")
+
+    async def upload(self, bucket_name: str, file_name: str, data, content_type: str | None = None):
+        self._call()
+        if isinstance(data, (str, Path)):
+            data = await run_in_threadpool(Path(data).read_bytes)
+        elif not isinstance(data, bytes):
+            data.seek(0)
+            data = await run_in_threadpool(data.read)
+        with self._lock:
+            self.objects[(bucket_name, file_name)] = (data, content_type)
+
+    async def remove(self, bucket_name: str, file_paths: list[str]):
+        self._call()
+        with self._lock:
+            return [path for path in file_paths if self.objects.pop((bucket_name, path), None) is not None]
+
+    async def download(self, bucket_name: str, file_name: str, destination: str):
+        self._call()
+        with self._lock:
+            data = self.objects.get((bucket_name, file_name))
+        if data is None:
+            raise StorageError(f"Object not found: {bucket_name}/{file_name}")
+        await run_in_threadpool(Path(destination).write_bytes, data[0])
 
+    def public_url(self, bucket_name: str, file_name: str) -> str:
+        return f"{self.base_url}/{bucket_name}/{quote(file_name)}"
 
-def upload_file(bucket_name: str, file_name: str, data: bytes):
+    async def aclose(self):
+        pass
+
+    def reset(self):
+        pass
+
+
+class CircuitBreaker:
+    """
+    closed → (threshold невдач поспіль) → open → (через reset_timeout) → half-open:
+    пропускається одна пробна спроба; успіх замикає ланцюг, невдача знову розмикає.
+    Пробна спроба, що закінчилась інакше (скасування), лише звільняє місце для наступної.
+    Використовується лише з event loop, тож блокування не потрібні.
+    """
+
+    def __init__(self, threshold: int, reset_timeout: float):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._probe_started = None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    @property
+    def probe_stuck(self) -> bool:
+        """
+        Пробна спроба half-open триває довше за reset_timeout — сховище не відповідає.
+        """
+        return (self._probing and self.state == "half-open"
+                and time.monotonic() - self._probe_started > self.reset_timeout)
+
+    def before_call(self) -> bool:
+        """
+        Піднімає StorageUnavailable, якщо виклик не можна пропустити.
+        Повертає True, якщо цей виклик — пробна спроба half-open (її треба завершити end_probe).
+        """
+        state = self.state
+        if state == "open" or (state == "half-open" and self._probing):
+            remaining = self.reset_timeout - (time.monotonic() - self.opened_at)
+            raise StorageUnavailable("Storage circuit is open", retry_after=max(1, round(remaining)))
+        if state == "half-open":
+            self._probing = True
+            self._probe_started = time.monotonic()
+            return True
+        return False
+
+    def end_probe(self):
+        self._probing = False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._probing = False
+        if self.opened_at is not None or self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+
+
+class StorageService:
+    """
+    Обгортка бекенду: семафор, повтори з jitter, circuit breaker і метрики для кожного виклику.
+    """
+
+    def __init__(self, backend, max_concurrency: int = STORAGE_MAX_CONCURRENCY, retries: int = STORAGE_RETRIES,
+                 backoff_base: float = STORAGE_BACKOFF_BASE, backoff_max: float = STORAGE_BACKOFF_MAX,
+                 circuit_threshold: int = STORAGE_CIRCUIT_THRESHOLD, circuit_reset: float = STORAGE_CIRCUIT_RESET):
+        self.backend = backend
+        self.max_concurrency = max_concurrency
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = CircuitBreaker(circuit_threshold, circuit_reset)
+        self._loop = None
+        self._semaphore = None
+
+    def _bind_loop(self) -> asyncio.Semaphore:
+        # Семафор і HTTP-клієнт належать конкретному event loop (окремі loop у скриптах і тестах)
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self.backend.reset()
+        return self._semaphore
+
+    def backoff(self, attempt: int) -> float:
+        # "Full jitter": випадкова пауза до експоненційної межі
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    async def _call(self, operation: str, fn, *args):
+        semaphore = self._bind_loop()
+        with observe_storage(operation):
+            for attempt in range(self.retries + 1):
+                probe = self.breaker.before_call()
+                try:
+                    async with semaphore:
+                        result = await fn(*args)
+                except StorageTransientError as e:
+                    self.breaker.record_failure()
+                    if attempt == self.retries:
+                        raise StorageUnavailable(f"Storage {operation} failed: {e}",
+                                                 retry_after=max(1, round(self.backoff_max))) from e
+                    await asyncio.sleep(self.backoff(attempt))
+                    continue
+                except StorageError:
+                    # Сховище відповіло (404, неправильний запит) — воно доступне
+                    self.breaker.record_success()
+                    raise
+                finally:
+                    # Пробна спроба завершена за будь-якого результату, зокрема CancelledError
+                    if probe:
+                        self.breaker.end_probe()
+                self.breaker.record_success()
+                return result
+
+    async def upload(self, bucket_name: str, file_name: str, data, content_type: str | None = None) -> str:
+        await self._call("upload", self.backend.upload, bucket_name, file_name, data, content_type)
+        return self.backend.public_url(bucket_name, file_name)
+
+    async def remove(self, bucket_name: str, file_paths: list[str]):
+        if not file_paths:
+            return []
+        return await self._call("remove", self.backend.remove, bucket_name, file_paths)
+
+    async def download(self, bucket_name: str, file_name: str, destination: str):
+        await self._call("download", self.backend.download, bucket_name, file_name, destination)
+
+    async def aclose(self):
+        await self.backend.aclose()
+
+    def stats(self) -> dict:
+        return {
+            "backend": type(self.backend).__name__,
+            "circuit": self.breaker.state,
+            "probe_stuck": self.breaker.probe_stuck,
+            "consecutive_failures": self.breaker.failures,
+            "max_concurrency": self.max_concurrency,
+        }
+
+
+def create_backend(kind: str = STORAGE_BACKEND):
+    if kind == "local":
+        return LocalStorage(LOCAL_STORAGE_DIR, LOCAL_STORAGE_URL)
+    if kind == "memory":
+        return MemoryStorage()
+    return SupabaseStorage(SUPABASE_URL, SUPABASE_KEY)
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_service() -> StorageService:
     """
-    Завантажуємо файл у Supabase і повертаємо публічний URL.
+    Повертає сервіс сховища, створюючи його при першому виклику
+    (імпорт модуля не потребує мережі чи ключів Supabase).
     """
-    supabase.storage.from_(bucket_name).upload(file_name, data)
-    url = f"{SUPABASE_URL}/storage/v1/object/public/{bucket_name}/{file_name}"
-    return url
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = StorageService(create_backend())
+    return _service
+
+
+async def aclose():
+    """
+    Закриває з'єднання HTTP-клієнта (при зупинці застосунку).
+    """
+    if _service is not None:
+        await _service.aclose()
+
+
+# Асинхронний інтерфейс — для роутів
+
+async def upload_file_async(bucket_name: str, file_name: str, data, content_type: str | None = None) -> str:
+    """
+    Завантажуємо файл у сховище і повертаємо публічний URL.
+    data — bytes, шлях до файлу або відкритий бінарний файл (два останні передаються потоком).
+    """
+    return await get_service().upload(bucket_name, file_name, data, content_type)
+
+
+async def remove_files_async(bucket_name: str, file_paths: list[str]):
+    return await get_service().remove(bucket_name, file_paths)
+
+
+async def download_file_async(bucket_name: str, file_path: str, destination: str):
+    await get_service().download(bucket_name, file_path, destination)
+
+
+# Синхронний інтерфейс — для коду у threadpool (outbox, мініатюри) і скриптів
+
+def _run(fn, *args):
+    """
+    Виконує корутину fn(*args) в event loop застосунку, з якого запущено поточний потік.
+    Поза event loop (скрипти) — у тимчасовому loop.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        pass
+    else:
+        raise RuntimeError("Synchronous storage call from the event loop; use the *_async function")
+    try:
+        return anyio.from_thread.run(fn, *args)
+    except anyio.NoEventLoopError:
+        return asyncio.run(fn(*args))
+
+
+def upload_file(bucket_name: str, file_name: str, data, content_type: str | None = None) -> str:
+    return _run(upload_file_async, bucket_name, file_name, data, content_type)
 
 
 def remove_file(bucket_name: str, file_path: str):
     """
-    Видаляє файл із Supabase Storage.
+    Видаляє файл зі сховища.
     file_path - шлях всередині бакета, без назви bucket_name
     Наприклад: "2/uuid_filename.jpeg"
     """
-    # Відправляємо як список
-    response = supabase.storage.from_(bucket_name).remove([file_path])
-    print("[DEBUG] Supabase remove response:", response)
+    return remove_files(bucket_name, [file_path])
+
+
+def remove_files(bucket_name: str, file_paths: list[str]):
+    """
+    Видаляє кілька файлів одним викликом до сховища.
+    """
+    return _run(remove_files_async, bucket_name, file_paths)
 
+
+def download_file(bucket_name: str, file_path: str, destination: str):
+    """
+    Копіює файл зі сховища у локальний файл destination (без читання в пам'ять).
+    """
+    _run(download_file_async, bucket_name, file_path, destination)
+
+
+def path_from_url(bucket_name: str, file_url: str) -> str:
+    """
+    Повертає шлях всередині бакета з публічного URL файлу:
+    .../notes-files/2/UUID_filename.jpeg → "2/UUID_filename.jpeg"
+    """
+    parsed_path = urlparse(file_url).path
+    marker = f"/{bucket_name}/"
+    idx = parsed_path.find(marker)
+    if idx == -1:
+        raise ValueError("Invalid file_url format")
+    return unquote(parsed_path[idx + len(marker):])  # Декодуємо %20 → пробіли
@@ -0,0 +1,177 @@
+# services/thumbnails.py — мініатюри та зменшені копії зображень, прикріплених до нотаток
+#
+# Після завантаження зображення роут записує подію "thumbnails.generate" в outbox
+# (у тій самій транзакції, що й файл). Воркер outbox завантажує оригінал зі сховища,
+# рендерить варіанти у пулі процесів (Pillow не блокує event loop і не конкурує з GIL),
+# кладе їх поруч з оригіналом і зберігає URL у files.variants.
+# Якщо варіанти ще не готові, GET /notes/{id}/variants/{name} генерує їх на вимогу.
+
+import logging                                 # Файли, які не вдалося обробити
+import os                                      # Налаштування та тимчасові файли
+import tempfile                                # Оригінал завантажується на диск, не в пам'ять
+from concurrent.futures import ThreadPoolExecutor  # Пачка outbox рендериться паралельно
+from PIL import Image, UnidentifiedImageError  # Помилки розбору зображень
+from sqlalchemy import select, update          # Запити до БД
+from app import database, models               # Фабрика сесій та моделі
+from app.services import changes, imaging, outbox, storage  # Версії, рендеринг, outbox, сховище
+from app.services.workers import BoundedProcessPool  # Пул процесів із контролем черги
+
+logger = logging.getLogger(__name__)
+
+# Назва варіанта → максимальна сторона в пікселях (пропорції зберігаються)
+VARIANTS = {"thumb": 128, "small": 320, "medium": 800}
+VARIANT_FORMAT = "WEBP"                        # Формат варіантів
+VARIANT_CONTENT_TYPE = "image/webp"
+VARIANT_QUALITY = int(os.getenv("THUMBNAIL_QUALITY", "80"))                        # Якість стиснення
+THUMBNAIL_MAX_PIXELS = int(os.getenv("THUMBNAIL_MAX_PIXELS", str(50_000_000)))    # Більші зображення не обробляються
+THUMBNAIL_WORKERS = int(os.getenv("THUMBNAIL_WORKERS", "2"))                      # Процесів для рендерингу
+THUMBNAIL_QUEUE_LIMIT = int(os.getenv("THUMBNAIL_QUEUE_LIMIT", "8"))              # Задач, що можуть чекати у черзі
+THUMBNAIL_RETRY_AFTER = int(os.getenv("THUMBNAIL_RETRY_AFTER", "2"))              # Retry-After при переповненні (секунди)
+# Подій за пачку outbox: рендеримо по THUMBNAIL_WORKERS одночасно, тож пачка — кілька "раундів".
+# Найгірший випадок (THUMBNAIL_MAX_PIXELS, повільне сховище) — до ~10 с на зображення:
+# 4 раунди вкладаються в OUTBOX_LEASE_SECONDS (60 с), і подію не забере інший воркер.
+THUMBNAIL_BATCH_SIZE = int(os.getenv("THUMBNAIL_BATCH_SIZE", str(THUMBNAIL_WORKERS * 4)))
+
+GENERATE = "thumbnails.generate"  # payload: {"bucket": ..., "file_id": ...}
+
+image_pool = BoundedProcessPool(
+    "thumbnails",
+    max_workers=THUMBNAIL_WORKERS,
+    max_pending=THUMBNAIL_QUEUE_LIMIT,
+    retry_after=THUMBNAIL_RETRY_AFTER,
+    preload=("app.services.imaging",),
+)
+
+
+def is_image(content_type: str | None) -> bool:
+    """
+    Растрові зображення (SVG не рендеримо — це текст і потенційно небезпечний вміст).
+    """
+    return bool(content_type) and content_type.startswith("image/") and content_type != "image/svg+xml"
+
+
+def variant_path(path: str, name: str) -> str:
+    """
+    Ключ варіанта поруч з оригіналом: "2/<sha256>.jpg" → "2/<sha256>.jpg.thumb.webp"
+    """
+    return f"{path}.{name}.{VARIANT_FORMAT.lower()}"
+
+
+def enqueue_generate(db, bucket: str, file_id: int):
+    """
+    Додає задачу генерації варіантів у поточну транзакцію.
+    """
+    outbox.enqueue(db, GENERATE, {"bucket": bucket, "file_id": file_id})
+
+
+def generate_variants(bucket: str, file_id: int) -> dict | None:
+    """
+    Створює варіанти для файлу і повертає {назва: URL}.
+    Ідемпотентно: якщо варіанти вже є — повертає їх без повторного рендерингу.
+    Для не-зображень, пошкоджених файлів і файлів, яких немає у сховищі, зберігає {}
+    (повторно не обробляються). StorageUnavailable і PoolSaturated — тимчасові, передаються викликачу.
+    None — файл уже видалено.
+    """
+    with database.SessionLocal() as db:
+        row = db.execute(
+            select(models.File.path, models.File.content_type, models.File.variants)
+            .where(models.File.id == file_id)
+        ).first()
+    if row is None:
+        return None
+    if row.variants is not None:
+        return row.variants
+
+    rendered = {}
+    if is_image(row.content_type) and row.path:
+        rendered = _render(bucket, row.path)
+
+    urls = {}
+    paths = []
+    orphans = []
+    try:
+        for name, data in rendered.items():
+            path = variant_path(row.path, name)
+            urls[name] = storage.upload_file(bucket, path, data, VARIANT_CONTENT_TYPE)
+            paths.append(path)
+    except storage.StorageUnavailable:
+        raise
+    except storage.StorageError as e:
+        # Сховище відхилило запис (не тимчасово) — варіантів не буде, вже записані прибираємо
+        logger.warning("Cannot store variants for %s/%s: %s", bucket, row.path, e)
+        urls, orphans = {}, paths
+
+    with database.SessionLocal() as db:
+        saved = db.execute(
+            update(models.File)
+            .where(models.File.id == file_id, models.File.variants.is_(None))
+            .values(variants=urls)
+            .returning(models.File.user_id)
+            .execution_options(synchronize_session=False)
+        ).first()
+        if saved is None:
+            db.rollback()
+            current = db.scalar(select(models.File.variants).where(models.File.id == file_id))
+            if current is None:
+                # Файл видалили, поки ми рендерили — прибираємо осиротілі варіанти
+                storage.remove_files(bucket, paths)
+                return None
+            return current  # Паралельний виклик встиг першим; ключі ті самі
+
+        outbox.enqueue_storage_remove(db, bucket, orphans)
+        if urls:
+            # Нотатки з цим файлом змінились (з'явились variants) — нова версія для ETag і /notes/changes
+            version = changes.bump_version(db, saved.user_id)
+            db.execute(
+                update(models.Note)
+                .where(models.Note.file_id == file_id)
+                .values(version=version, updated_at=models.utcnow())
+                .execution_options(synchronize_session=False)
+            )
+        db.commit()
+    return urls
+
+
+def _render(bucket: str, path: str) -> dict:
+    fd, source = tempfile.mkstemp(prefix="variant-")
+    os.close(fd)
+    try:
+        try:
+            storage.download_file(bucket, path, source)
+        except storage.StorageUnavailable:
+            raise  # Тимчасова недоступність (як і PoolSaturated нижче) — outbox повторить спробу
+        except storage.StorageError as e:
+            # Оригіналу немає (наприклад, старий file_url без об'єкта) — повтор не допоможе
+            logger.warning("Cannot download %s/%s for variants: %s", bucket, path, e)
+            return {}
+        try:
+            return image_pool.call(
+                imaging.render_variants, source, VARIANTS, THUMBNAIL_MAX_PIXELS, VARIANT_FORMAT, VARIANT_QUALITY,
+            )
+        except (UnidentifiedImageError, Image.DecompressionBombError, OSError, ValueError) as e:
+            logger.warning("Cannot render variants for %s/%s: %s", bucket, path, e)
+            return {}
+    finally:
+        os.unlink(source)
+
+
+def _generate_one(payload: dict) -> Exception | None:
+    try:
+        generate_variants(payload["bucket"], payload["file_id"])
+    except Exception as e:
+        return e
+    return None
+
+
+@outbox.handler(GENERATE, batch_size=THUMBNAIL_BATCH_SIZE)
+def _generate_from_outbox(payloads: list[dict]):
+    """
+    Кожен файл обробляється окремо, по THUMBNAIL_WORKERS одночасно (рендеринг — у пулі процесів).
+    Постійні помилки generate_variants вже записала як {}; повторюються лише ті payload,
+    що впали з тимчасовою помилкою (StorageUnavailable, PoolSaturated), а не вся пачка.
+    """
+    with ThreadPoolExecutor(max_workers=THUMBNAIL_WORKERS, thread_name_prefix="thumbnails") as executor:
+        errors = list(executor.map(_generate_one, payloads))
+    failed = [i for i, error in enumerate(errors) if error is not None]
+    if failed:
+        raise outbox.PartialFailure(failed, errors[failed[0]])
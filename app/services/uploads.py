@@ -0,0 +1,107 @@
+# services/uploads.py — приймання файлів без завантаження в пам'ять
+#
+# Тіло multipart розбирає Starlette: файл до 1 МБ лишається в пам'яті, більший пишеться
+# у тимчасовий файл (SpooledTemporaryFile). UploadSizeLimitMiddleware рахує байти тіла під час
+# читання і обриває запит з 413, щойно ліміт перевищено, — навіть без Content-Length (chunked).
+# inspect_upload рахує sha256 і розмір з того самого файлу, і у сховище передається теж він:
+# другої копії на диску немає.
+
+import hashlib                                   # Інкрементальний хеш вмісту
+import os                                        # Налаштування та ім'я файлу
+from dataclasses import dataclass                # Результат приймання файлу
+from typing import BinaryIO                      # Файл запиту
+from fastapi import HTTPException, UploadFile    # Помилка 413 та вхідний файл
+from fastapi.concurrency import run_in_threadpool  # Читання файлу поза event loop
+from starlette.responses import JSONResponse      # Відповідь 413 з middleware
+
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(100 * 1024 * 1024)))  # Максимальний розмір файлу (100 МБ)
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))       # Розмір блоку читання (1 МБ)
+
+
+@dataclass
+class ReceivedUpload:
+    """
+    Прийнятий файл:
+    - file: файл запиту (SpooledTemporaryFile Starlette), позиція — на початку;
+      закривається разом із запитом
+    - size: розмір у байтах
+    - sha256: хеш вмісту (hex)
+    """
+    file: BinaryIO
+    size: int
+    sha256: str
+    filename: str
+    content_type: str | None
+
+
+def _too_large(max_bytes: int) -> HTTPException:
+    return HTTPException(status_code=413, detail=f"File is larger than {max_bytes} bytes")
+
+
+def _hash_file(file: BinaryIO, max_bytes: int) -> tuple[str, int]:
+    digest = hashlib.sha256()
+    size = 0
+    file.seek(0)
+    while chunk := file.read(UPLOAD_CHUNK_SIZE):
+        size += len(chunk)
+        if size > max_bytes:
+            raise _too_large(max_bytes)
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest(), size
+
+
+async def inspect_upload(upload: UploadFile, max_bytes: int = UPLOAD_MAX_BYTES) -> ReceivedUpload:
+    """
+    Рахує sha256 і розмір файлу запиту блоками по UPLOAD_CHUNK_SIZE (у threadpool).
+    Якщо файл перевищує max_bytes — 413.
+    """
+    sha256, size = await run_in_threadpool(_hash_file, upload.file, max_bytes)
+    return ReceivedUpload(
+        file=upload.file,
+        size=size,
+        sha256=sha256,
+        filename=os.path.basename(upload.filename or "file"),
+        content_type=upload.content_type,
+    )
+
+
+class UploadSizeLimitMiddleware:
+    """
+    ASGI middleware: ліміт тіла запиту для шляхів завантаження.
+    - Content-Length більший за ліміт — 413 одразу, тіло не читається взагалі
+    - інакше (зокрема chunked) байти рахуються під час читання: щойно ліміт перевищено,
+      розбір multipart обривається з 413, тож на диск потрапляє не більше ліміту
+    """
+
+    def __init__(self, app, paths: tuple[str, ...], max_bytes: int = UPLOAD_MAX_BYTES):
+        self.app = app
+        self.paths = paths
+        # Запас на заголовки multipart і текстові поля форми
+        self.max_body = max_bytes + 64 * 1024
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+        for name, value in scope["headers"]:
+            if name == b"content-length":
+                if value.isdigit() and int(value) > self.max_body:
+                    response = JSONResponse(status_code=413, content={"detail": "Request body too large"})
+                    await response(scope, receive, send)
+                    return
+                break
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body:
+                    # FastAPI передає HTTPException з розбору тіла далі, і запит отримує 413
+                    raise HTTPException(status_code=413, detail="Request body too large")
+            return message
+
+        await self.app(scope, limited_receive, send)
@@ -0,0 +1,152 @@
+# services/workers.py — пули процесів для CPU-важкої роботи (bcrypt, обробка зображень)
+
+import asyncio                                      # Очікування результатів без блокування event loop
+import importlib                                    # Попередній імпорт модулів у дочірніх процесах
+import multiprocessing                              # Контекст запуску процесів
+import threading                                    # Захист лічильника черги
+from concurrent.futures import ProcessPoolExecutor  # Сам пул процесів
+from concurrent.futures.process import BrokenProcessPool  # Процес пулу аварійно завершився
+
+
+class PoolSaturated(Exception):
+    """
+    Пул перевантажений: усі воркери зайняті і черга заповнена.
+    retry_after — рекомендована пауза (секунди) для заголовка Retry-After.
+    """
+
+    def __init__(self, name: str, retry_after: int):
+        super().__init__(f"Worker pool '{name}' is saturated")
+        self.retry_after = retry_after
+
+
+def _preload(modules: tuple[str, ...]):
+    """
+    Initializer дочірнього процесу: імпортує модулі робочих функцій одразу при старті процесу.
+    """
+    for module in modules:
+        importlib.import_module(module)
+
+
+def _noop():
+    return None
+
+
+class BoundedProcessPool:
+    """
+    Пул процесів із контролем допуску:
+    - max_workers: кількість процесів
+    - max_pending: скільки задач може чекати в черзі понад зайняті воркери
+    Якщо черга повна — run() одразу піднімає PoolSaturated замість того,
+    щоб накопичувати запити і збільшувати затримку для всіх.
+    - preload: модулі, які кожен процес імпортує при старті (модулі робочих функцій)
+    Процеси створюються ліниво, при першій задачі, або заздалегідь через warmup().
+    Якщо процес пулу аварійно завершився (OOM killer, segfault у нативному коді),
+    ProcessPoolExecutor стає непридатним назавжди — пул створює новий і повторює задачу один раз.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_pending: int, retry_after: int = 1,
+                 preload: tuple[str, ...] = ()):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.retry_after = retry_after
+        self.preload = preload
+        self._executor = None
+        self._in_flight = 0
+        self._rejected = 0
+        self._rebuilds = 0
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # spawn — безпечно для процесу з потоками (uvicorn, threadpool)
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_preload if self.preload else None,
+                    initargs=(self.preload,),
+                )
+            return self._executor
+
+    def _rebuild(self, broken: ProcessPoolExecutor) -> ProcessPoolExecutor:
+        """
+        Замінює зламаний executor новим. Паралельні задачі, що побачили той самий
+        зламаний executor, перебудовують його лише один раз.
+        """
+        with self._lock:
+            if self._executor is broken:
+                self._executor = None
+                self._rebuilds += 1
+        broken.shutdown(wait=False, cancel_futures=True)
+        return self._get_executor()
+
+    def _admit(self):
+        with self._lock:
+            if self._in_flight >= self.max_workers + self.max_pending:
+                self._rejected += 1
+                raise PoolSaturated(self.name, self.retry_after)
+            self._in_flight += 1
+
+    def _release(self):
+        with self._lock:
+            self._in_flight -= 1
+
+    async def run(self, fn, *args):
+        """
+        Виконує fn(*args) в окремому процесі й очікує результат.
+        fn має бути функцією верхнього рівня модуля (щоб її можна було серіалізувати).
+        """
+        executor = self._get_executor()
+        self._admit()
+        try:
+            try:
+                return await asyncio.wrap_future(executor.submit(fn, *args))
+            except BrokenProcessPool:
+                executor = self._rebuild(executor)
+                return await asyncio.wrap_future(executor.submit(fn, *args))
+        finally:
+            self._release()
+
+    def call(self, fn, *args):
+        """
+        Блокуючий варіант run() для коду, що вже працює у фоновому потоці
+        (наприклад, обробники outbox).
+        """
+        executor = self._get_executor()
+        self._admit()
+        try:
+            try:
+                return executor.submit(fn, *args).result()
+            except BrokenProcessPool:
+                executor = self._rebuild(executor)
+                return executor.submit(fn, *args).result()
+        finally:
+            self._release()
+
+    async def warmup(self):
+        """
+        Запускає всі процеси пулу заздалегідь (з lifespan, до готовності воркера),
+        щоб перший запит не чекав на spawn інтерпретатора та імпорт модулів.
+        """
+        executor = self._get_executor()
+        await asyncio.gather(*(asyncio.wrap_future(executor.submit(_noop)) for _ in range(self.max_workers)))
+
+    def shutdown(self):
+        """
+        Зупиняє процеси пулу (викликається при завершенні застосунку).
+        """
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "max_pending": self.max_pending,
+                "in_flight": self._in_flight,
+                "rejected": self._rejected,
+                "rebuilds": self._rebuilds,
+            }
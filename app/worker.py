@@ -0,0 +1,31 @@
+# worker.py — окремий процес для обробки outbox
+#
+# Запуск: python -m app.worker
+# У цьому режимі API слід запускати з OUTBOX_WORKER=external.
+
+import asyncio                       # Цикл воркера
+import logging                       # Лог воркера у stdout
+from app import database             # Двигуни БД цього процесу
+from app.services import outbox      # Воркер outbox
+from app.services import thumbnails  # Реєструє обробник thumbnails.generate, пул рендерингу
+from app.services import changes     # noqa: F401 — реєструє періодичне очищення tombstones
+
+
+async def main():
+    database.init_engines()
+    logging.getLogger(__name__).info("Outbox worker started")
+    outbox.worker.start()
+    try:
+        await asyncio.Event().wait()  # Працюємо, доки процес не зупинять
+    finally:
+        await outbox.worker.stop()
+        thumbnails.image_pool.shutdown()
+        await database.dispose_engines()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
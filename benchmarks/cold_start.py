@@ -0,0 +1,132 @@
+# benchmarks/cold_start.py — холодний старт: імпорт, міграції, час до готовності, перший запит
+#
+# Кожен запуск — новий процес на новій тимчасовій SQLite БД (або на заданій --database-url):
+# - import: час "import app.main" в окремому інтерпретаторі (без lifespan і з'єднань)
+# - migrate: alembic upgrade head на порожній БД
+# - ready: від запуску сервера (uvicorn або gunicorn) до першої відповіді 200 від /health/ready
+# - first_request / second_request: реєстрація користувача одразу після готовності
+#   (перший виклик піднімає пул процесів bcrypt — саме ця ціна потрапляє на першого клієнта)
+#
+# Приклади:
+#   python benchmarks/cold_start.py
+#   python benchmarks/cold_start.py --server gunicorn --workers 4 --runs 5
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.common import ROOT, latency_stats, metadata, save_results  # noqa: E402
+
+IMPORT_SNIPPET = "import time; t = time.perf_counter(); import app.main; print(time.perf_counter() - t)"
+
+
+def offline_env(database_url, storage_dir, bcrypt_rounds):
+    env = dict(os.environ)
+    env.update(
+        DATABASE_URL=database_url,
+        STORAGE_BACKEND="local",
+        LOCAL_STORAGE_DIR=storage_dir,
+        BCRYPT_ROUNDS=str(bcrypt_rounds),
+        DB_AUTO_CREATE="False",
+        PYTHONPATH=ROOT,
+    )
+    return env
+
+
+def server_command(args):
+    if args.server == "gunicorn":
+        return [sys.executable, "-m", "gunicorn", "app.main:app", "--bind", f"127.0.0.1:{args.port}",
+                "--workers", str(args.workers), "--access-logfile", "/dev/null"]
+    return [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(args.port),
+            "--workers", str(args.workers), "--no-access-log"]
+
+
+def wait_ready(client, process, timeout):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}")
+        try:
+            if client.get("/health/ready").status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.01)
+    raise TimeoutError("Server did not become ready")
+
+
+def register(client):
+    credentials = {"email": f"cold-{uuid.uuid4().hex[:12]}@example.com", "password": "cold-start-password"}
+    start = time.perf_counter()
+    response = client.post("/users/register", json=credentials)
+    response.raise_for_status()
+    return time.perf_counter() - start
+
+
+def one_run(args):
+    workdir = tempfile.mkdtemp(prefix="cold-start-")
+    database_url = args.database_url or f"sqlite:///{workdir}/cold.db"
+    env = offline_env(database_url, os.path.join(workdir, "storage"), args.bcrypt_rounds)
+    try:
+        output = subprocess.run(
+            [sys.executable, "-c", IMPORT_SNIPPET], cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+        ).stdout
+        import_seconds = float(output.strip().splitlines()[-1])
+
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-m", "alembic", "upgrade", "head"], cwd=ROOT, env=env,
+                       capture_output=True, check=True)
+        migrate_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        process = subprocess.Popen(server_command(args), cwd=ROOT, env=env,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            with httpx.Client(base_url=f"http://127.0.0.1:{args.port}", timeout=30) as client:
+                wait_ready(client, process, args.timeout)
+                ready_seconds = time.perf_counter() - start
+                first_seconds = register(client)
+                second_seconds = register(client)
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+        return import_seconds, migrate_seconds, ready_seconds, first_seconds, second_seconds
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main(args):
+    samples = {"import": [], "migrate": [], "ready": [], "first_request": [], "second_request": []}
+    for run in range(args.runs):
+        values = one_run(args)
+        for key, value in zip(samples, values):
+            samples[key].append(value)
+        print(f"run {run + 1}: " + "  ".join(f"{key}={value * 1e3:.0f}ms" for key, value in zip(samples, values)))
+
+    results = {**metadata(args), "cold_start": {key: latency_stats(values) for key, values in samples.items()}}
+    print()
+    for key, stats in results["cold_start"].items():
+        print(f"{key:<16} p50={stats['p50_ms']:>9.1f} ms  max={stats['max_ms']:>9.1f} ms")
+    save_results("cold_start", results, args.output)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cold-start timings: import, migrations, time to ready, first request")
+    parser.add_argument("--server", choices=("uvicorn", "gunicorn"), default="uvicorn")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--timeout", type=float, default=60, help="Скільки чекати на /health/ready (секунди)")
+    parser.add_argument("--database-url", default=None, help="За замовчуванням — нова тимчасова SQLite БД на кожен запуск")
+    parser.add_argument("--bcrypt-rounds", type=int, default=12)
+    parser.add_argument("--output", default=None, help="Файл результатів (за замовчуванням benchmarks/results/)")
+    main(parser.parse_args())
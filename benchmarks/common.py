@@ -0,0 +1,110 @@
+# benchmarks/common.py — спільне для бенчмарків: офлайн-оточення, статистика затримок, збереження JSON
+#
+# Результати зберігаються у benchmarks/results/<назва>-<час>.json разом з метаданими запуску
+# (коміт, Python, БД, параметри), тож два запуски можна порівняти через benchmarks/compare.py.
+
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+
+def configure_offline(database_url=None, db_async=False, bcrypt_rounds=None):
+    """
+    Налаштовує змінні середовища до імпорту app: тимчасова SQLite БД (або задана),
+    сховище в пам'яті замість Supabase, воркер outbox у процесі.
+    Повертає URL БД.
+    """
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    database_url = database_url or f"sqlite:///{tempfile.mkdtemp(prefix='bench-')}/bench.db"
+    os.environ["DATABASE_URL"] = database_url
+    os.environ["DB_ASYNC"] = str(bool(db_async))
+    os.environ["STORAGE_BACKEND"] = "memory"
+    os.environ.setdefault("OUTBOX_WORKER", "inprocess")
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "False")  # Бенчмарки міряють обробку, а не ліміти
+    if bcrypt_rounds is not None:
+        os.environ["BCRYPT_ROUNDS"] = str(bcrypt_rounds)
+    return database_url
+
+
+def prepare_database():
+    """
+    Створює двигуни й таблиці та вимикає SQL-лог (echo), який інакше домінує у вимірах.
+    """
+    from app import database, models  # noqa: F401 — моделі реєструють таблиці в metadata
+    database.init_engines()
+    database.engine.echo = False
+    if database.async_engine is not None:
+        database.async_engine.sync_engine.echo = False
+    database.Base.metadata.create_all(bind=database.engine)
+    return database
+
+
+def percentile(values, p):
+    """
+    Перцентиль p (0..100) для списку значень.
+    """
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = max(0, min(len(values) - 1, round(p / 100 * (len(values) - 1))))
+    return values[k]
+
+
+def latency_stats(latencies, elapsed=None, statuses=None, unit="ms"):
+    """
+    Зведення затримок (у секундах): кількість, RPS, p50/p95/p99, середнє, максимум.
+    """
+    scale = {"ms": 1e3, "us": 1e6}[unit]
+    values = [x * scale for x in latencies]
+    stats = {
+        "n": len(values),
+        f"p50_{unit}": round(percentile(values, 50), 3),
+        f"p95_{unit}": round(percentile(values, 95), 3),
+        f"p99_{unit}": round(percentile(values, 99), 3),
+        f"mean_{unit}": round(statistics.fmean(values), 3) if values else 0.0,
+        f"max_{unit}": round(max(values), 3) if values else 0.0,
+    }
+    if elapsed:
+        stats["rps"] = round(len(values) / elapsed, 1)
+    if statuses is not None:
+        stats["statuses"] = {str(code): statuses.count(code) for code in sorted(set(statuses))}
+    return stats
+
+
+def metadata(args) -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, timeout=5,
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "params": {key: value for key, value in vars(args).items() if key != "output"},
+    }
+
+
+def save_results(name: str, results: dict, output=None) -> str:
+    """
+    Зберігає результати у JSON (за замовчуванням — у benchmarks/results/).
+    """
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nSaved to {output}")
+    return output
@@ -0,0 +1,45 @@
+# benchmarks/compare.py — порівняння двох JSON-результатів api_load.py / micro_bench.py
+#
+# Приклад:
+#   python benchmarks/compare.py benchmarks/results/api_load-before.json benchmarks/results/api_load-after.json
+
+import argparse
+import json
+
+METRICS = ("rps", "ops_per_sec", "p50_ms", "p95_ms", "p99_ms", "p50_us", "p99_us")
+HIGHER_IS_BETTER = ("rps", "ops_per_sec")
+
+
+def sections(results):
+    return results.get("scenarios") or results.get("benchmarks") or {}
+
+
+def main(args):
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+    print(f"baseline:  {baseline.get('git_commit')} {baseline.get('timestamp')}")
+    print(f"candidate: {candidate.get('git_commit')} {candidate.get('timestamp')}\n")
+
+    base, cand = sections(baseline), sections(candidate)
+    regressions = 0
+    for name in sorted(base.keys() & cand.keys()):
+        for metric in METRICS:
+            if metric not in base[name] or metric not in cand[name] or not base[name][metric]:
+                continue
+            old, new = base[name][metric], cand[name][metric]
+            change = (new - old) / old * 100
+            worse = change < -args.threshold if metric in HIGHER_IS_BETTER else change > args.threshold
+            regressions += worse
+            print(f"{name:<32} {metric:<12} {old:>12.2f} → {new:>12.2f} {change:+7.1f}%{'  REGRESSION' if worse else ''}")
+    raise SystemExit(1 if regressions and args.fail_on_regression else 0)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Допустима зміна у відсотках")
+    parser.add_argument("--fail-on-regression", action="store_true", help="Код виходу 1 при регресії")
+    main(parser.parse_args())
@@ -0,0 +1,184 @@
+# benchmarks/feed_bench.py — потік подій /notes/events: пам'ять на неактивне з'єднання і затримка доставки
+#
+# Запускає uvicorn на тимчасовій SQLite БД, реєструє --users користувачів і відкриває
+# --connections SSE-з'єднань (порівну на користувача) простими сокетами, щоб клієнт
+# не був вузьким місцем. Далі:
+# - idle: RSS сервера до і після відкриття з'єднань → байт на з'єднання
+# - fanout: --writes разів змінює нотатки випадкового користувача і міряє час,
+#   доки подію changes отримають усі його з'єднання
+#
+# Приклади:
+#   python benchmarks/feed_bench.py
+#   python benchmarks/feed_bench.py --connections 20000 --users 2000
+
+import argparse
+import asyncio
+import os
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.common import ROOT, latency_stats, metadata, save_results  # noqa: E402
+
+
+def rss_bytes(pid: int) -> int:
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+def raise_fd_limit(needed: int):
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < needed:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (min(hard, needed), hard))
+
+
+class Stream:
+    """
+    Одне SSE-з'єднання на сирому сокеті: лише рахує події changes.
+    """
+
+    def __init__(self, token: str):
+        self.token = token
+        self.changes = 0
+        self.received = asyncio.Event()
+        self.ready = asyncio.Event()
+
+    async def run(self, host, port):
+        reader, writer = await asyncio.open_connection(host, port)
+        writer.write(
+            f"GET /notes/events?access_token={self.token} HTTP/1.1\r\nHost: {host}\r\n"
+            f"Accept: text/event-stream\r\n\r\n".encode()
+        )
+        await writer.drain()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    return
+                if line.startswith(b"event: ready"):
+                    self.ready.set()
+                elif line.startswith(b"event: changes"):
+                    self.changes += 1
+                    self.received.set()
+        finally:
+            writer.close()
+
+
+async def bench(args, port, pid):
+    host = "127.0.0.1"
+    async with httpx.AsyncClient(base_url=f"http://{host}:{port}", timeout=60) as client:
+        tokens = []
+        for i in range(args.users):
+            response = await client.post(
+                "/users/register", json={"email": f"feed-{i}@example.com", "password": "feed-password"},
+            )
+            response.raise_for_status()
+            tokens.append(response.json()["access_token"])
+
+        baseline = rss_bytes(pid)
+        streams = {i: [] for i in range(args.users)}
+        tasks = []
+        start = time.perf_counter()
+        for n in range(args.connections):
+            user = n % args.users
+            stream = Stream(tokens[user])
+            streams[user].append(stream)
+            tasks.append(asyncio.create_task(stream.run(host, port)))
+            if n % 200 == 199:
+                await stream.ready.wait()  # Не відкриваємо тисячі з'єднань одночасно (backlog сервера)
+        await asyncio.gather(*(s.ready.wait() for group in streams.values() for s in group))
+        connect_seconds = time.perf_counter() - start
+        await asyncio.sleep(1)
+        loaded = rss_bytes(pid)
+
+        rng = random.Random(42)
+        latencies = []
+        for i in range(args.writes):
+            user = rng.randrange(args.users)
+            for stream in streams[user]:
+                stream.received.clear()
+            t0 = time.perf_counter()
+            response = await client.post(
+                "/notes/batch", json={"create": [{"title": f"feed {i}"}]},
+                headers={"Authorization": f"Bearer {tokens[user]}"},
+            )
+            response.raise_for_status()
+            await asyncio.gather(*(stream.received.wait() for stream in streams[user]))
+            latencies.append(time.perf_counter() - t0)
+
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    return {
+        "connections": args.connections,
+        "connect_seconds": round(connect_seconds, 2),
+        "rss_baseline_mb": round(baseline / 2**20, 1),
+        "rss_loaded_mb": round(loaded / 2**20, 1),
+        "bytes_per_connection": round((loaded - baseline) / args.connections),
+        "fanout": latency_stats(latencies),
+    }
+
+
+def main(args):
+    raise_fd_limit(args.connections * 2 + 1024)
+    workdir = tempfile.mkdtemp(prefix="feed-bench-")
+    env = dict(os.environ)
+    env.update(
+        DATABASE_URL=f"sqlite:///{workdir}/feed.db",
+        DB_AUTO_CREATE="True",
+        STORAGE_BACKEND="memory",
+        BCRYPT_ROUNDS="4",
+        RATE_LIMIT_ENABLED="False",
+        FEED_MAX_CONNECTIONS=str(args.connections + 100),
+        FEED_MAX_PER_USER=str(args.connections),
+        PYTHONPATH=ROOT,
+    )
+    command = [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(args.port),
+               "--no-access-log", "--backlog", "4096"]
+    if args.loop:
+        command += ["--loop", args.loop]
+    server = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = time.time() + 60
+        while True:
+            try:
+                if httpx.get(f"http://127.0.0.1:{args.port}/health/ready").status_code == 200:
+                    break
+            except httpx.TransportError:
+                pass
+            if time.time() > deadline or server.poll() is not None:
+                raise RuntimeError("Server did not start")
+            time.sleep(0.05)
+        feed = asyncio.run(bench(args, args.port, server.pid))
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"connections={feed['connections']} connect={feed['connect_seconds']}s "
+          f"rss {feed['rss_baseline_mb']} → {feed['rss_loaded_mb']} MB ({feed['bytes_per_connection']} B/conn)")
+    print(f"fanout p50={feed['fanout']['p50_ms']} ms p95={feed['fanout']['p95_ms']} ms p99={feed['fanout']['p99_ms']} ms")
+    save_results("feed_bench", {**metadata(args), "feed": feed}, args.output)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Idle SSE connections per node and change fan-out latency")
+    parser.add_argument("--connections", type=int, default=5000)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--writes", type=int, default=200)
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--loop", default=None, help="Цикл подій uvicorn: auto | asyncio | uvloop")
+    parser.add_argument("--output", default=None, help="Файл результатів (за замовчуванням benchmarks/results/)")
+    main(parser.parse_args())
@@ -0,0 +1,95 @@
+# benchmarks/login_storm.py — навантажувальний тест "шторму логінів"
+#
+# Запускає багато паралельних /users/login і одночасно опитує інший endpoint,
+# щоб показати, чи впливає bcrypt на затримку решти API.
+#
+# Приклад:
+#   python benchmarks/login_storm.py --base-url http://localhost:8000 --logins 500 --concurrency 50
+
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+
+import httpx
+
+
+def percentile(values, p):
+    """
+    Перцентиль p (0..100) для списку затримок.
+    """
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = max(0, min(len(values) - 1, round(p / 100 * (len(values) - 1))))
+    return values[k]
+
+
+def summary(name, latencies, statuses):
+    ms = [x * 1000 for x in latencies]
+    codes = {code: statuses.count(code) for code in sorted(set(statuses))}
+    print(
+        f"{name:<10} n={len(ms):<6} "
+        f"p50={percentile(ms, 50):8.1f}ms p95={percentile(ms, 95):8.1f}ms "
+        f"p99={percentile(ms, 99):8.1f}ms mean={statistics.fmean(ms) if ms else 0:8.1f}ms "
+        f"statuses={codes}"
+    )
+
+
+async def login_storm(client, credentials, total, concurrency, latencies, statuses):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.post("/users/login", json=credentials)
+            latencies.append(time.perf_counter() - start)
+            statuses.append(response.status_code)
+
+    await asyncio.gather(*(one() for _ in range(total)))
+
+
+async def probe(client, path, headers, stop, interval, latencies, statuses):
+    while not stop.is_set():
+        start = time.perf_counter()
+        response = await client.get(path, headers=headers)
+        latencies.append(time.perf_counter() - start)
+        statuses.append(response.status_code)
+        await asyncio.sleep(interval)
+
+
+async def main(args):
+    limits = httpx.Limits(max_connections=args.concurrency + 10)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=60, limits=limits) as client:
+        credentials = {"email": f"storm-{uuid.uuid4().hex[:8]}@example.com", "password": "storm-password"}
+        response = await client.post("/users/register", json=credentials)
+        response.raise_for_status()
+        headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+        login_latencies, login_statuses = [], []
+        probe_latencies, probe_statuses = [], []
+        stop = asyncio.Event()
+        probe_task = asyncio.create_task(
+            probe(client, args.probe_path, headers, stop, args.probe_interval, probe_latencies, probe_statuses)
+        )
+
+        start = time.perf_counter()
+        await login_storm(client, credentials, args.logins, args.concurrency, login_latencies, login_statuses)
+        elapsed = time.perf_counter() - start
+        stop.set()
+        await probe_task
+
+    print(f"{args.logins} logins in {elapsed:.2f}s ({args.logins / elapsed:.1f} req/s)")
+    summary("login", login_latencies, login_statuses)
+    summary(args.probe_path, probe_latencies, probe_statuses)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Login storm load test")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--probe-path", default="/notes/")
+    parser.add_argument("--probe-interval", type=float, default=0.05)
+    asyncio.run(main(parser.parse_args()))
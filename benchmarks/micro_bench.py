@@ -0,0 +1,201 @@
+# benchmarks/micro_bench.py — мікробенчмарки функцій на шляху кожного запиту
+#
+# - create_access_token / decode_access_token (python-jose, HS256)
+# - get_current_user: з кешу токенів і з промахом кешу (decode + SELECT користувача)
+# - серіалізація NoteOut: ORM-об'єкти та рядки-словники → JSON
+# - список із --list-notes нотаток (10k): шлях response_model=List[NoteOut] (як було в GET /notes/)
+#   проти orjson з кортежів рядків (rows / columns), плюс розмір після gzip і brotli
+#
+# Приклади:
+#   python benchmarks/micro_bench.py
+#   python benchmarks/micro_bench.py --iterations 20000 --notes 1000 --db-async
+#   python benchmarks/micro_bench.py --list-notes 50000
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.common import configure_offline, latency_stats, metadata, prepare_database, save_results  # noqa: E402
+
+
+def measure(fn, iterations, warmup=100):
+    for _ in range(min(warmup, iterations)):
+        fn()
+    timings = []
+    start = time.perf_counter()
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - t0)
+    return timings, time.perf_counter() - start
+
+
+async def measure_async(fn, iterations, warmup=100):
+    for _ in range(min(warmup, iterations)):
+        await fn()
+    timings = []
+    start = time.perf_counter()
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        await fn()
+        timings.append(time.perf_counter() - t0)
+    return timings, time.perf_counter() - start
+
+
+def report(results, name, timings, elapsed, unit="us"):
+    stats = latency_stats(timings, unit=unit)
+    stats["ops_per_sec"] = round(len(timings) / elapsed, 1)
+    results[name] = stats
+    print(
+        f"{name:<32} ops/s={stats['ops_per_sec']:>11.1f} "
+        f"p50={stats[f'p50_{unit}']:>10.2f}{unit} p99={stats[f'p99_{unit}']:>10.2f}{unit}"
+    )
+
+
+async def bench_current_user(results, args):
+    from app import auth, database, models
+    from app.routes.notes import get_current_user
+
+    with database.SessionLocal() as db:
+        user = models.User(email="micro@example.com", hashed_password="x")
+        db.add(user)
+        db.commit()
+    header = "Bearer " + auth.create_access_token({"sub": "micro@example.com"})
+    session_factory = database.AsyncSessionLocal if database.DB_ASYNC else database.SessionLocal
+
+    if database.DB_ASYNC:
+        async with session_factory() as db:
+            await _bench_current_user(results, args, db, header, get_current_user, auth)
+    else:
+        with session_factory() as db:
+            await _bench_current_user(results, args, db, header, get_current_user, auth)
+
+
+async def _bench_current_user(results, args, db, header, get_current_user, auth):
+    auth.user_cache.clear()
+
+    async def cached():
+        return await get_current_user(header, db)
+
+    async def uncached():
+        auth.user_cache.clear()
+        return await get_current_user(header, db)
+
+    report(results, "get_current_user[cache hit]", *await measure_async(cached, args.iterations))
+    report(results, "get_current_user[cache miss]", *await measure_async(uncached, args.db_iterations))
+
+
+def bench_tokens(results, args):
+    from app import auth
+    token = auth.create_access_token({"sub": "micro@example.com"})
+    report(results, "create_access_token", *measure(lambda: auth.create_access_token({"sub": "micro@example.com"}), args.iterations))
+    report(results, "decode_access_token", *measure(lambda: auth.decode_access_token(token), args.iterations))
+
+
+def bench_serialization(results, args):
+    from pydantic import TypeAdapter
+    from app import models
+    from app.routes.schemas import NoteOut
+
+    now = models.utcnow()
+    rows = [
+        {"id": i, "title": f"Note {i}", "content": "benchmark " * args.content_words, "user_id": 1,
+         "file_url": None, "variants": None, "version": i, "updated_at": now}
+        for i in range(args.notes)
+    ]
+    notes = [models.Note(**{k: v for k, v in row.items() if k != "variants"}) for row in rows]
+    adapter = TypeAdapter(List[NoteOut])
+    iterations = max(1, args.iterations // args.notes)
+
+    report(results, f"NoteOut x{args.notes} from ORM", *measure(
+        lambda: adapter.dump_json(adapter.validate_python(notes, from_attributes=True)), iterations, warmup=3,
+    ), unit="ms")
+    report(results, f"NoteOut x{args.notes} from rows", *measure(
+        lambda: adapter.dump_json(adapter.validate_python(rows)), iterations, warmup=3,
+    ), unit="ms")
+    report(results, "NoteOut x1 from ORM", *measure(
+        lambda: NoteOut.model_validate(notes[0], from_attributes=True).model_dump_json(), args.iterations,
+    ))
+
+
+def bench_list_encoding(results, args):
+    """
+    До/після для великого списку: FastAPI response_model (валідація NoteOut, dump у режимі json,
+    json.dumps у JSONResponse) проти serialization.encode_rows з кортежів, як повертає _fetch_rows.
+    """
+    import json
+    import zlib
+    from pydantic import TypeAdapter
+    from app import models
+    from app.routes.schemas import NoteOut
+    from app.services import compression, serialization
+
+    now = models.utcnow()
+    keys = ["id", "title", "content", "user_id", "file_url", "variants", "version", "updated_at"]
+    rows = [
+        (i, f"Note {i}", "benchmark " * args.content_words, 1, None, None, i, now)
+        for i in range(args.list_notes)
+    ]
+    adapter = TypeAdapter(List[NoteOut])
+    iterations = max(3, args.iterations // args.list_notes)
+
+    def response_model_path():
+        dicts = [dict(zip(keys, row)) for row in rows]  # _fetch_rows до змін: dict на рядок
+        payload = adapter.dump_python(adapter.validate_python(dicts), mode="json")
+        return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode()
+
+    n = args.list_notes
+    report(results, f"list x{n} response_model", *measure(response_model_path, iterations, warmup=1), unit="ms")
+    report(results, f"list x{n} orjson rows", *measure(
+        lambda: serialization.encode_rows(keys, rows), iterations, warmup=1,
+    ), unit="ms")
+    report(results, f"list x{n} orjson columns", *measure(
+        lambda: serialization.encode_rows(keys, rows, "columns"), iterations, warmup=1,
+    ), unit="ms")
+
+    sizes = {}
+    for shape in serialization.SHAPES:
+        body = serialization.encode_rows(keys, rows, shape)
+        sizes[shape] = {"raw": len(body), "gzip": len(_gzip(body, zlib, compression.GZIP_LEVEL))}
+        if compression.brotli is not None:
+            sizes[shape]["br"] = len(compression.brotli.compress(body, quality=compression.BROTLI_QUALITY))
+        report(results, f"list x{n} gzip {shape}", *measure(
+            lambda: _gzip(body, zlib, compression.GZIP_LEVEL), iterations, warmup=1,
+        ), unit="ms")
+    results[f"list x{n} sizes"] = sizes
+    print(f"list x{n} sizes (bytes): {sizes}")
+
+
+def _gzip(body, zlib, level):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    return compressor.compress(body) + compressor.flush()
+
+
+def main(args):
+    args.database_url = configure_offline(args.database_url, args.db_async)
+    prepare_database()
+
+    results = {**metadata(args), "benchmarks": {}}
+    bench_tokens(results["benchmarks"], args)
+    asyncio.run(bench_current_user(results["benchmarks"], args))
+    bench_serialization(results["benchmarks"], args)
+    bench_list_encoding(results["benchmarks"], args)
+    save_results("micro_bench", results, args.output)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Micro-benchmarks of per-request hot paths")
+    parser.add_argument("--database-url", default=None, help="За замовчуванням — тимчасова SQLite БД")
+    parser.add_argument("--db-async", action="store_true", help="DB_ASYNC=True (aiosqlite / asyncpg)")
+    parser.add_argument("--iterations", type=int, default=10_000)
+    parser.add_argument("--db-iterations", type=int, default=1_000, help="Ітерацій для шляхів із запитом до БД")
+    parser.add_argument("--notes", type=int, default=100, help="Нотаток у списку для серіалізації")
+    parser.add_argument("--list-notes", type=int, default=10_000, help="Нотаток у великому списку (до/після orjson)")
+    parser.add_argument("--content-words", type=int, default=20)
+    parser.add_argument("--output", default=None, help="Файл результатів (за замовчуванням benchmarks/results/)")
+    main(parser.parse_args())
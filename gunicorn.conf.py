@@ -0,0 +1,71 @@
+# gunicorn.conf.py — продакшн-запуск: кілька воркерів uvicorn під gunicorn
+#
+# Запуск: gunicorn app.main:app   (конфіг підхоплюється автоматично з поточної теки)
+# Міграції застосовуються окремо до старту: alembic upgrade head
+#
+# Кожен воркер — окремий процес зі своїм event loop, пулом з'єднань БД, клієнтом сховища
+# і пулами процесів (bcrypt, мініатюри); усе це створюється в lifespan вже після fork.
+
+import multiprocessing               # Кількість CPU
+import os                            # Налаштування зі змінних середовища
+import shutil                        # Очищення теки метрик між запусками
+import tempfile                      # Тека для метрик prometheus за замовчуванням
+
+_cpus = multiprocessing.cpu_count()
+
+# Сервер
+bind = os.getenv("BIND", "0.0.0.0:8000")
+# Застосунок асинхронний: один воркер на ядро. Ще (2 × CPU + 1) для синхронних
+# серверів тут не потрібен — I/O чекає event loop, а CPU-важке (bcrypt, мініатюри) йде у пули процесів
+# Кількість задавайте через WEB_CONCURRENCY (а не --workers): від неї рахуються розміри пулів нижче
+workers = int(os.getenv("WEB_CONCURRENCY", str(_cpus)))
+worker_class = "uvicorn_worker.UvicornWorker"
+# Імпорт app один раз у master і copy-on-write для воркерів: швидший старт і менше пам'яті.
+# Безпечно, бо імпорт app не відкриває з'єднань і не запускає потоків (див. lifespan у main.py)
+preload_app = os.getenv("GUNICORN_PRELOAD", "True").lower() == "true"
+
+# Таймаути
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))                    # Воркер без heartbeat перезапускається
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))  # Час на завершення запитів при зупинці
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))                 # Має бути більшим за idle timeout балансувальника
+
+# Плановий перезапуск воркерів (обмежує наслідки витоків пам'яті); jitter — щоб не всі разом
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "10000"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "1000"))
+
+# Heartbeat-файли воркерів у пам'яті, а не на диску (overlayfs у Docker може блокувати)
+worker_tmp_dir = "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+# За балансувальником/reverse proxy: адреси проксі, яким довіряємо X-Forwarded-For і X-Forwarded-Proto
+# (через кому, підмережі CIDR або "*"). uvicorn бере з X-Forwarded-For найправішу адресу, що не належить
+# довіреним проксі, і підставляє її як адресу клієнта — її бачать ліміти частоти (ratelimit.client_ip)
+# і журнал доступу. Без цього всі клієнти мають IP балансувальника і ділять одне відро лімітів за IP.
+# "*" — лише якщо до порту API немає доступу в обхід проксі, інакше клієнт підробить свою адресу
+forwarded_allow_ips = os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1")
+
+accesslog = os.getenv("GUNICORN_ACCESS_LOG", "-")
+errorlog = "-"
+loglevel = os.getenv("GUNICORN_LOG_LEVEL", "info")
+
+# Пули процесів створюються в кожному воркері; ділимо ядра між воркерами,
+# щоб N воркерів × cpu_count процесів bcrypt не конкурували за ті самі ядра
+_per_worker = max(1, _cpus // max(1, workers))
+os.environ.setdefault("PASSWORD_HASH_WORKERS", str(_per_worker))
+os.environ.setdefault("THUMBNAIL_WORKERS", str(max(1, min(2, _per_worker))))
+
+# Метрики prometheus з усіх воркерів агрегуються через файли у спільній теці.
+# Змінна має бути задана до імпорту prometheus_client (тобто до preload app); вмикаємо завжди,
+# бо --workers з командного рядка цьому файлу не видно
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "cloudnotes-metrics"))
+# Файли попереднього запуску видаляємо (інакше лічильники "воскреснуть"); тека має існувати до імпорту app
+shutil.rmtree(os.environ["PROMETHEUS_MULTIPROC_DIR"], ignore_errors=True)
+os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+
+
+def child_exit(server, worker):
+    """
+    Gauge-метрики (livesum) померлого воркера більше не враховуються.
+    """
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,105 @@
+"""Версії нотаток, дедуплікація файлів, мініатюри, tombstones, outbox, повнотекстовий пошук
+
+Revision ID: 0002_versions_files_outbox
+Revises: 0001_baseline
+Create Date: 2026-10-18
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002_versions_files_outbox"
+down_revision = "0001_baseline"
+branch_labels = None
+depends_on = None
+
+# Копія models.NOTES_SEARCH_DDL на момент міграції (міграції не залежать від змін у моделях)
+NOTES_SEARCH_DDL = (
+    "ALTER TABLE notes ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('simple', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(content, '')), 'B')) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_notes_search_vector ON notes USING GIN (search_vector)",
+)
+
+
+def upgrade():
+    with op.batch_alter_table("users") as batch:
+        batch.add_column(sa.Column("notes_version", sa.BigInteger(), nullable=False, server_default="0"))
+
+    # Дедуплікація за вмістом і мініатюри
+    with op.batch_alter_table("files") as batch:
+        batch.add_column(sa.Column("path", sa.String(), nullable=True))
+        batch.add_column(sa.Column("sha256", sa.String(length=64), nullable=True))
+        batch.add_column(sa.Column("size", sa.BigInteger(), nullable=True))
+        batch.add_column(sa.Column("content_type", sa.String(), nullable=True))
+        batch.add_column(sa.Column("ref_count", sa.Integer(), nullable=False, server_default="1"))
+        batch.add_column(sa.Column("variants", sa.JSON(none_as_null=True), nullable=True))
+        batch.create_unique_constraint("uq_files_user_id_sha256", ["user_id", "sha256"])
+
+    # Версії для ETag і /notes/changes, посилання на файл, індекси keyset-пагінації
+    with op.batch_alter_table("notes") as batch:
+        batch.add_column(sa.Column("version", sa.BigInteger(), nullable=False, server_default="0"))
+        batch.add_column(sa.Column("updated_at", sa.DateTime(), nullable=True))
+        batch.add_column(sa.Column("file_id", sa.Integer(), nullable=True))
+        batch.create_foreign_key("fk_notes_file_id_files", "files", ["file_id"], ["id"])
+        batch.create_index("ix_notes_file_id", ["file_id"])
+        batch.create_index("ix_notes_user_id_id", ["user_id", "id"])
+        batch.create_index("ix_notes_user_id_version", ["user_id", "version"])
+
+    op.create_table(
+        "note_tombstones",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("note_id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("version", sa.BigInteger(), nullable=False),
+        sa.Column("deleted_at", sa.DateTime(), nullable=False),
+    )
+    op.create_index("ix_note_tombstones_user_id_version", "note_tombstones", ["user_id", "version"])
+
+    op.create_table(
+        "outbox",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("kind", sa.String(), nullable=False),
+        sa.Column("payload", sa.JSON(), nullable=False),
+        sa.Column("status", sa.String(), nullable=False),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+        sa.Column("available_at", sa.DateTime(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("last_error", sa.Text(), nullable=True),
+    )
+    op.create_index("ix_outbox_status_available_at", "outbox", ["status", "available_at"])
+
+    # Повнотекстовий пошук — лише PostgreSQL
+    if op.get_bind().dialect.name == "postgresql":
+        for statement in NOTES_SEARCH_DDL:
+            op.execute(statement)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute("DROP INDEX IF EXISTS ix_notes_search_vector")
+        op.execute("ALTER TABLE notes DROP COLUMN IF EXISTS search_vector")
+
+    op.drop_table("outbox")
+    op.drop_table("note_tombstones")
+
+    with op.batch_alter_table("notes") as batch:
+        batch.drop_index("ix_notes_user_id_version")
+        batch.drop_index("ix_notes_user_id_id")
+        batch.drop_index("ix_notes_file_id")
+        batch.drop_constraint("fk_notes_file_id_files", type_="foreignkey")
+        batch.drop_column("file_id")
+        batch.drop_column("updated_at")
+        batch.drop_column("version")
+
+    with op.batch_alter_table("files") as batch:
+        batch.drop_constraint("uq_files_user_id_sha256", type_="unique")
+        batch.drop_column("variants")
+        batch.drop_column("ref_count")
+        batch.drop_column("content_type")
+        batch.drop_column("size")
+        batch.drop_column("sha256")
+        batch.drop_column("path")
+
+    with op.batch_alter_table("users") as batch:
+        batch.drop_column("notes_version")
@@ -0,0 +1,26 @@
+"""Очищення tombstones: горизонт users.notes_pruned_version та індекс за deleted_at
+
+Revision ID: 0003_tombstone_retention
+Revises: 0002_versions_files_outbox
+Create Date: 2026-10-18
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003_tombstone_retention"
+down_revision = "0002_versions_files_outbox"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("users") as batch:
+        batch.add_column(sa.Column("notes_pruned_version", sa.BigInteger(), nullable=False, server_default="0"))
+    op.create_index("ix_note_tombstones_deleted_at", "note_tombstones", ["deleted_at"])
+
+
+def downgrade():
+    op.drop_index("ix_note_tombstones_deleted_at", table_name="note_tombstones")
+    with op.batch_alter_table("users") as batch:
+        batch.drop_column("notes_pruned_version")
@@ -0,0 +1,31 @@
+"""Версії для нотаток, створених до 0002: version = 0 не потрапляла в /notes/changes?since=0
+
+Revision ID: 0004_backfill_note_versions
+Revises: 0003_tombstone_retention
+Create Date: 2026-10-18
+"""
+
+from alembic import op
+
+revision = "0004_backfill_note_versions"
+down_revision = "0003_tombstone_retention"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Спершу нова версія колекції для користувачів зі старими нотатками, потім вона ж — цим нотаткам:
+    # клієнт, що синхронізується з будь-якої версії (зокрема since=0), отримає їх як зміну
+    op.execute(
+        "UPDATE users SET notes_version = notes_version + 1 "
+        "WHERE EXISTS (SELECT 1 FROM notes WHERE notes.user_id = users.id AND notes.version = 0)"
+    )
+    op.execute(
+        "UPDATE notes SET version = (SELECT users.notes_version FROM users WHERE users.id = notes.user_id) "
+        "WHERE version = 0"
+    )
+
+
+def downgrade():
+    # Дані не відкочуються: версії лише ростуть, а 0 знову сховала б нотатки від /notes/changes
+    pass
@@ -0,0 +1,95 @@
+# tests/conftest.py — спільні фікстури: застосунок на тимчасовій SQLite БД без мережі
+#
+# Кожен тест API виконується двічі: у синхронному режимі (Session у threadpool) і
+# в асинхронному (AsyncSession на aiosqlite) — так само, як DB_ASYNC=False / True у продакшні.
+# Сховище — MemoryStorage (STORAGE_BACKEND=memory), outbox обробляється явно через
+# outbox.process_batch(), тож тести не залежать від фонового воркера.
+#
+# Запуск: python -m pytest
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Налаштування читаються при імпорті модулів app — задаємо їх до імпорту
+os.environ.update(
+    STORAGE_BACKEND="memory",
+    DB_AUTO_CREATE="True",
+    BCRYPT_ROUNDS="4",
+    PASSWORD_HASH_WORKERS="1",
+    PASSWORD_HASH_WARMUP="False",
+    OUTBOX_WORKER="external",
+    RATE_LIMIT_ENABLED="False",
+)
+os.environ.pop("PROMETHEUS_MULTIPROC_DIR", None)
+
+import pytest                                   # noqa: E402
+from fastapi.testclient import TestClient       # noqa: E402
+
+from app import auth, database                  # noqa: E402
+from app.main import app                        # noqa: E402
+from app.services import search, storage        # noqa: E402
+
+PASSWORD = "test-password"
+
+
+@pytest.fixture(scope="session", autouse=True)
+def hash_pool():
+    """
+    Процес bcrypt живе всю сесію тестів: lifespan кожного тесту зупиняв би пул,
+    а spawn нового процесу коштує понад секунду.
+    """
+    shutdown = auth.hash_pool.shutdown
+    auth.hash_pool.shutdown = lambda: None
+    yield auth.hash_pool
+    auth.hash_pool.shutdown = shutdown
+    shutdown()
+
+
+@pytest.fixture(params=[False, True], ids=["sync", "async"])
+def db_mode(request, monkeypatch, tmp_path):
+    """
+    Режим БД тесту: окремий файл SQLite і залежність get_db відповідного режиму.
+    """
+    monkeypatch.setattr(database, "DATABASE_URL", f"sqlite:///{tmp_path}/test.db")
+    monkeypatch.setattr(database, "DB_ASYNC", request.param)
+    app.dependency_overrides[database.get_db] = database.get_async_db if request.param else database.get_sync_db
+    yield request.param
+    app.dependency_overrides.clear()
+
+
+@pytest.fixture
+def client(db_mode, monkeypatch):
+    """
+    TestClient із запущеним lifespan (двигуни БД, таблиці, сховище в пам'яті).
+    Кеші процесу скидаються: у кожного тесту своя БД з тими самими id користувачів.
+    """
+    monkeypatch.setattr(storage, "_service", None)
+    monkeypatch.setattr(search, "fallback_index", search.FallbackSearchIndex())
+    auth.user_cache.clear()
+    with TestClient(app) as test_client:
+        yield test_client
+    auth.user_cache.clear()
+
+
+@pytest.fixture
+def memory_storage(client) -> storage.MemoryStorage:
+    return storage.get_service().backend
+
+
+@pytest.fixture
+def make_user(client):
+    """
+    Реєструє користувача і повертає заголовки з його токеном.
+    """
+    def register(email: str = "user@example.com") -> dict:
+        response = client.post("/users/register", json={"email": email, "password": PASSWORD})
+        assert response.status_code == 200, response.text
+        return {"Authorization": f"Bearer {response.json()['access_token']}"}
+    return register
+
+
+@pytest.fixture
+def headers(make_user) -> dict:
+    return make_user()
@@ -0,0 +1,102 @@
+# tests/test_auth_cache.py — кеш автентифікованих користувачів: без запитів до БД, TTL, інвалідація
+
+import time
+
+import pytest
+from jose import jwt
+from sqlalchemy import event, select
+from sqlalchemy.engine import Engine
+
+from app import auth, database, models
+
+
+@pytest.fixture
+def user_queries():
+    """
+    Запити get_current_user до таблиці users (обидва режими БД: async-двигун виконує їх через sync Engine).
+    """
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("SELECT users.id, users.email"):
+            statements.append(statement)
+
+    event.listen(Engine, "before_cursor_execute", count)
+    yield statements
+    event.remove(Engine, "before_cursor_execute", count)
+
+
+def token_for(headers: dict) -> str:
+    return headers["Authorization"].removeprefix("Bearer ")
+
+
+def test_cache_hit_issues_no_user_query(client, headers, user_queries):
+    assert client.get("/notes/", headers=headers).status_code == 200
+    assert len(user_queries) == 1
+    cached = auth.user_cache.get(token_for(headers))
+    assert cached == auth.CurrentUser(id=cached.id, email="user@example.com")
+
+    for _ in range(3):
+        assert client.get("/notes/", headers=headers).status_code == 200
+    assert len(user_queries) == 1
+
+
+def test_cache_ttl_never_outlives_token(client, make_user):
+    make_user("short@example.com")
+    token = jwt.encode({"sub": "short@example.com", "exp": int(time.time()) + 2}, auth.SECRET_KEY,
+                       algorithm=auth.ALGORITHM)
+    assert client.get("/notes/", headers={"Authorization": f"Bearer {token}"}).status_code == 200
+    _, expires_at = auth.user_cache._data[token]
+    assert expires_at - time.monotonic() <= 2 < auth.AUTH_CACHE_TTL
+
+    # Токен, що вже сплив, не кешується зовсім
+    user = auth.CurrentUser(id=1, email="short@example.com")
+    auth.cache_user("expired", user, {"exp": time.time() - 1})
+    assert auth.user_cache.get("expired") is None
+
+
+def test_password_change_invalidates_cached_tokens(client, headers):
+    token = token_for(headers)
+    client.get("/notes/", headers=headers)
+    assert auth.user_cache.get(token) is not None
+
+    with database.SessionLocal() as db:
+        user = db.scalar(select(models.User).where(models.User.email == "user@example.com"))
+        user.notes_version += 1  # Версія росте з кожною зміною нотаток — це не привід скидати кеш
+        db.commit()
+        assert auth.user_cache.get(token) is not None
+        user.hashed_password = auth.hash_password("new-password")
+        db.commit()
+    assert auth.user_cache.get(token) is None
+
+
+def test_email_change_and_delete_invalidate_cached_tokens(client, headers, make_user):
+    token = token_for(headers)
+    client.get("/notes/", headers=headers)
+    other = make_user("other@example.com")
+    client.get("/notes/", headers=other)
+
+    with database.SessionLocal() as db:
+        user = db.scalar(select(models.User).where(models.User.email == "user@example.com"))
+        user.email = "renamed@example.com"
+        db.commit()
+    assert auth.user_cache.get(token) is None
+    assert auth.user_cache.get(token_for(other)) is not None  # Чужі токени лишаються
+
+    with database.SessionLocal() as db:
+        db.delete(db.scalar(select(models.User).where(models.User.email == "other@example.com")))
+        db.commit()
+    assert auth.user_cache.get(token_for(other)) is None
+    assert client.get("/notes/", headers=other).status_code == 401
+
+
+def test_cache_stats_count_hits_and_misses(client, headers):
+    before = auth.user_cache.stats()
+    client.get("/notes/", headers=headers)   # Промах: токен ще не в кеші
+    client.get("/notes/", headers=headers)   # Влучання
+    client.get("/notes/", headers=headers)   # Влучання
+    after = auth.user_cache.stats()
+    assert after["misses"] - before["misses"] == 1
+    assert after["hits"] - before["hits"] == 2
+    assert after["size"] == 1 and after["maxsize"] == auth.AUTH_CACHE_SIZE
+    assert 0 < after["hit_ratio"] <= 1
@@ -0,0 +1,83 @@
+# tests/test_batch.py — пакетні операції POST /notes/batch: результати, ліміт, видалення файлів через outbox
+
+from sqlalchemy import select
+
+from app import database, models
+from app.routes import notes
+from app.services import outbox
+
+from tests.test_notes import BUCKET, create_notes, upload
+
+
+def batch(client, headers, **operations):
+    return client.post("/notes/batch", json=operations, headers=headers)
+
+
+def test_results_follow_create_update_delete_order(client, headers):
+    first, second, third = create_notes(client, headers, "a", "b", "c")
+    response = batch(
+        client, headers,
+        delete=[third, first],
+        update=[{"id": second, "content": "edited"}, {"id": first, "title": "A"}],
+        create=[{"title": "d"}, {"title": "e"}],
+    )
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [(item["op"], item["status"]) for item in results] == [
+        ("create", 201), ("create", 201), ("update", 200), ("update", 200), ("delete", 204), ("delete", 204),
+    ]
+    created = [item["id"] for item in results[:2]]
+    assert created == sorted(created) and created[0] > third  # id у порядку елементів create
+    assert [item["id"] for item in results[2:]] == [second, first, third, first]
+
+    listed = {note["id"]: note for note in client.get("/notes/", headers=headers).json()}
+    assert set(listed) == {second, *created}
+    assert listed[second]["content"] == "edited"
+    assert [listed[note_id]["title"] for note_id in created] == ["d", "e"]
+
+
+def test_missing_and_invalid_items_do_not_fail_the_batch(client, make_user, headers):
+    [mine] = create_notes(client, headers, "mine")
+    [foreign] = create_notes(client, make_user("other@example.com"), "foreign")
+
+    response = batch(
+        client, headers,
+        create=[{"title": "new"}],
+        update=[{"id": mine, "title": None}, {"id": foreign, "title": "stolen"}, {"id": 999999, "title": "x"}],
+        delete=[foreign, mine, mine],
+    )
+    assert response.status_code == 200
+    assert [(item["op"], item["id"], item["status"]) for item in response.json()["results"][1:]] == [
+        ("update", mine, 422), ("update", foreign, 404), ("update", 999999, 404),
+        ("delete", foreign, 404), ("delete", mine, 204),  # Дублікати id виконуються один раз
+    ]
+    assert response.json()["results"][1]["detail"] == "title cannot be null"
+    assert [note["title"] for note in client.get("/notes/", headers=headers).json()] == ["new"]
+
+
+def test_batch_size_is_limited(client, headers, monkeypatch):
+    monkeypatch.setattr(notes, "MAX_BATCH_SIZE", 3)
+    response = batch(client, headers, create=[{"title": "x"}] * 2, delete=[1, 2])
+    assert response.status_code == 413
+    assert client.get("/notes/", headers=headers).json() == []  # Нічого не виконано
+
+    assert batch(client, headers, create=[{"title": "x"}] * 2, delete=[1]).status_code == 200
+    assert batch(client, headers).json() == {"results": []}
+
+
+def test_deleted_files_go_to_one_outbox_event(client, headers, memory_storage):
+    notes_with_files = [upload(client, headers, f"%PDF-1.4 file {i}".encode()).json() for i in range(3)]
+    shared = upload(client, headers, b"%PDF-1.4 file 0").json()  # Той самий файл, що й у першої нотатки
+    outbox.process_batch()
+
+    response = batch(client, headers, delete=[note["id"] for note in notes_with_files])
+    assert [item["status"] for item in response.json()["results"]] == [204] * 3
+
+    with database.SessionLocal() as db:  # Окрема сесія: подія видима лише після commit пакета
+        events = db.execute(select(models.OutboxEvent.kind, models.OutboxEvent.payload)).all()
+    assert [event.kind for event in events] == [outbox.STORAGE_REMOVE]
+    assert events[0].payload["bucket"] == BUCKET and len(events[0].payload["paths"]) == 2
+
+    assert outbox.process_batch() == 1
+    [(_, path)] = memory_storage.objects  # Лишився лише файл, на який посилається shared
+    assert shared["file_url"].endswith(path)
@@ -0,0 +1,51 @@
+# tests/test_compression.py — стиснення відповідей і потокові відповіді пачками
+
+import json
+
+from sqlalchemy import select
+
+from app import models
+from app.routes import notes
+from app.services import compression
+
+
+def test_large_response_is_compressed(client, headers):
+    client.post("/notes/batch", json={"create": [{"title": f"note {i}", "content": "x" * 100} for i in range(50)]},
+                headers=headers)
+    response = client.get("/notes/", headers={**headers, "Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.headers["etag"].startswith('W/"')
+    assert len(response.json()) == 50
+
+
+def test_uncompressed_responses_still_vary(client, headers):
+    # Замала відповідь
+    response = client.get("/notes/", headers={**headers, "Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert response.headers["vary"] == "Accept-Encoding"
+    # Нестисний тип
+    response = client.get("/metrics", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["vary"] == "Accept-Encoding"
+
+
+def test_vary_is_merged_with_existing_header():
+    assert compression._with_vary([(b"vary", b"Origin")]) == [(b"vary", b"Origin, Accept-Encoding")]
+    assert compression._with_vary([(b"vary", b"accept-encoding")]) == [(b"vary", b"accept-encoding")]
+    assert compression._with_vary([(b"vary", b"*")]) == [(b"vary", b"*")]
+
+
+def test_stream_yields_rows_in_batches(client, headers, monkeypatch, db_mode):
+    monkeypatch.setattr(notes, "STREAM_BATCH_SIZE", 2)
+    client.post("/notes/batch", json={"create": [{"title": f"n{i}"} for i in range(5)]}, headers=headers)
+    stmt = select(models.Note.id, models.Note.title).order_by(models.Note.id)
+
+    chunks = list(notes._stream_notes(stmt, "ndjson"))
+    assert len(chunks) == 3
+    assert [json.loads(line)["title"] for line in b"".join(chunks).splitlines()] == [f"n{i}" for i in range(5)]
+
+    body = b"".join(notes._stream_notes(stmt, "json"))
+    assert [item["title"] for item in json.loads(body)] == [f"n{i}" for i in range(5)]
+
+    response = client.get("/notes/?stream=json", headers=headers)
+    assert [item["title"] for item in response.json()] == [f"n{i}" for i in range(5)]
@@ -0,0 +1,110 @@
+# tests/test_feed.py — потік подій /notes/events (Server-Sent Events)
+#
+# Потік завершується, коли спливає токен, тож тести беруть токен на пару секунд
+# і читають відповідь повністю.
+
+import json
+import logging
+import time
+from datetime import timedelta
+
+import pytest
+from jose import jwt
+from sqlalchemy import update
+
+from app import auth, database, models
+from app.routes import notes
+from app.services import changes, feed
+
+
+@pytest.fixture(autouse=True)
+def fast_heartbeat(monkeypatch):
+    monkeypatch.setattr(notes, "FEED_HEARTBEAT", 0.3)
+
+
+def short_token(email: str = "user@example.com", seconds: int = 1) -> str:
+    return jwt.encode({"sub": email, "exp": int(time.time()) + seconds}, auth.SECRET_KEY, algorithm=auth.ALGORITHM)
+
+
+def read_events(client, url: str, headers: dict | None = None) -> tuple[list[dict], int]:
+    """
+    Повертає (події {id, event, data}, кількість пінгів).
+    """
+    response = client.get(url, headers=headers or {})
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events, pings = [], 0
+    for block in response.text.split("\n\n"):
+        if block == ": ping":
+            pings += 1
+            continue
+        fields = dict(line.split(": ", 1) for line in block.splitlines() if ": " in line)
+        if "event" in fields:
+            events.append({"id": int(fields["id"]), "event": fields["event"], "data": json.loads(fields["data"])})
+    return events, pings
+
+
+def create(client, headers, *titles) -> list[int]:
+    response = client.post("/notes/batch", json={"create": [{"title": title} for title in titles]}, headers=headers)
+    return [item["id"] for item in response.json()["results"]]
+
+
+def test_requires_valid_token(client, headers):
+    assert client.get("/notes/events").status_code == 401
+    assert client.get("/notes/events?access_token=not-a-jwt").status_code == 401
+    assert client.get("/notes/events", headers={"Authorization": "Basic abc"}).status_code == 401
+    expired = jwt.encode({"sub": "user@example.com", "exp": int(time.time()) - 10}, auth.SECRET_KEY,
+                         algorithm=auth.ALGORITHM)
+    assert client.get(f"/notes/events?access_token={expired}").status_code == 401
+    assert client.get(f"/notes/events?access_token={short_token('nobody@example.com')}").status_code == 401
+
+
+def test_resumes_from_since_with_heartbeat(client, headers):
+    [first] = create(client, headers, "first")     # версія 1
+    [second] = create(client, headers, "second")   # версія 2
+
+    events, pings = read_events(client, f"/notes/events?since=1&access_token={short_token(seconds=2)}")
+    assert [(e["event"], e["id"]) for e in events] == [("changes", 2), ("ready", 2)]
+    assert [note["id"] for note in events[0]["data"]["notes"]] == [second]
+    assert pings >= 1
+
+    # Last-Event-ID (перепідключення EventSource) важливіший за since; токен — у заголовку
+    events, _ = read_events(client, "/notes/events?since=2",
+                            headers={"Authorization": f"Bearer {short_token()}", "Last-Event-ID": "0"})
+    assert [note["id"] for note in events[0]["data"]["notes"]] == [first, second]
+
+
+def test_reports_deleted_notes(client, headers):
+    [note_id] = create(client, headers, "doomed")                               # версія 1
+    assert client.delete(f"/notes/{note_id}", headers=headers).status_code == 204  # версія 2
+
+    events, _ = read_events(client, f"/notes/events?since=1&access_token={short_token()}")
+    assert events[0]["event"] == "changes"
+    assert events[0]["data"]["deleted"] == [note_id] and events[0]["data"]["notes"] == []
+
+
+def test_resync_when_tombstones_were_pruned(client, headers):
+    [note_id] = create(client, headers, "old")
+    client.delete(f"/notes/{note_id}", headers=headers)
+    create(client, headers, "new")                                              # версія 3
+    with database.SessionLocal() as db:
+        old = models.utcnow() - timedelta(days=changes.TOMBSTONE_RETENTION_DAYS + 1)
+        db.execute(update(models.NoteTombstone).values(deleted_at=old))
+        db.commit()
+        changes.prune_tombstones(db)
+
+    events, _ = read_events(client, f"/notes/events?since=1&access_token={short_token()}")
+    assert [(e["event"], e["id"]) for e in events] == [("resync", 3), ("ready", 3)]
+
+
+def test_access_log_drops_event_stream_query():
+    log_filter = feed.AccessLogFilter(("/notes/events",))
+    record = logging.LogRecord("uvicorn.access", logging.INFO, __file__, 1, '%s - "%s %s HTTP/%s" %d',
+                               ("1.2.3.4:5", "GET", "/notes/events?access_token=secret&since=1", "1.1", 200), None)
+    assert log_filter.filter(record)
+    assert "secret" not in record.getMessage()
+    assert record.getMessage() == '1.2.3.4:5 - "GET /notes/events HTTP/1.1" 200'
+
+    record.args = ("1.2.3.4:5", "GET", "/notes/?limit=5", "1.1", 200)
+    log_filter.filter(record)
+    assert "/notes/?limit=5" in record.getMessage()
@@ -0,0 +1,77 @@
+# tests/test_metrics.py — метрики запитів у /metrics: мітки за шаблоном маршруту і лічильник SQL-запитів
+
+import pytest
+from prometheus_client.parser import text_string_to_metric_families
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from tests.test_notes import create_notes
+
+
+def scrape(client) -> dict:
+    """
+    {(назва семпла, frozenset міток): значення} з /metrics.
+    """
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    return {
+        (sample.name, frozenset(sample.labels.items())): sample.value
+        for family in text_string_to_metric_families(response.text)
+        for sample in family.samples
+    }
+
+
+def value(samples: dict, name: str, **labels) -> float:
+    return samples.get((name, frozenset(labels.items())), 0.0)
+
+
+@pytest.fixture
+def sql_statements():
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(Engine, "before_cursor_execute", count)
+    yield statements
+    event.remove(Engine, "before_cursor_execute", count)
+
+
+def test_requests_are_labelled_by_route_template(client, headers):
+    first, second = create_notes(client, headers, "a", "b")
+    before = scrape(client)
+    for note_id in (first, second):
+        assert client.get(f"/notes/{note_id}", headers=headers).status_code == 200
+    assert client.get("/notes/999999", headers=headers).status_code == 404
+    assert client.get("/no/such/path").status_code == 404
+    after = scrape(client)
+
+    def delta(name, **labels):
+        return value(after, name, **labels) - value(before, name, **labels)
+
+    route = "/notes/{note_id}"
+    assert delta("http_request_duration_seconds_count", method="GET", route=route, status="200") == 2
+    assert delta("http_request_duration_seconds_count", method="GET", route=route, status="404") == 1
+    assert delta("http_request_duration_seconds_count", method="GET", route="unmatched", status="404") == 1
+    # Фактичні шляхи з id не стають мітками — кількість рядків не росте з кількістю нотаток
+    routes = {dict(labels).get("route") for _, labels in after}
+    assert not any(str(first) in r or "999999" in r for r in routes if r)
+
+
+def test_sql_statements_are_counted_per_request(client, headers, sql_statements):
+    [note_id] = create_notes(client, headers, "counted")
+    before = scrape(client)
+    sql_statements.clear()
+    assert client.get(f"/notes/{note_id}", headers=headers).status_code == 200
+    executed = len(sql_statements)
+    after = scrape(client)
+
+    route = "/notes/{note_id}"
+    assert executed > 0
+    assert value(after, "http_request_db_statements_count", route=route) \
+        - value(before, "http_request_db_statements_count", route=route) == 1
+    # Усі SQL-запити цього HTTP-запиту (у обох режимах БД) і лише вони
+    assert value(after, "http_request_db_statements_sum", route=route) \
+        - value(before, "http_request_db_statements_sum", route=route) == executed
+    assert value(after, "http_request_db_seconds_count", route=route) \
+        - value(before, "http_request_db_seconds_count", route=route) == 1
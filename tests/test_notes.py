@@ -0,0 +1,201 @@
+# tests/test_notes.py — список, отримання, завантаження та видалення нотаток (sync і async режими БД)
+
+import hashlib
+import json
+from datetime import timedelta
+
+from sqlalchemy import func, select, update
+
+from app import database, models
+from app.routes import notes
+from app.services import changes, outbox
+
+BUCKET = "notes-files"
+
+
+def create_notes(client, headers, *titles) -> list[int]:
+    response = client.post("/notes/batch", json={"create": [{"title": title} for title in titles]}, headers=headers)
+    assert response.status_code == 200, response.text
+    return [item["id"] for item in response.json()["results"]]
+
+
+def upload(client, headers, data: bytes, title: str = "file", filename: str = "doc.pdf"):
+    return client.post(
+        "/notes/upload",
+        data={"title": title},
+        files={"file": (filename, data, "application/pdf")},
+        headers=headers,
+    )
+
+
+def test_list_notes_pages(client, headers):
+    ids = create_notes(client, headers, "a", "b", "c")
+    response = client.get("/notes/?limit=2", headers=headers)
+    assert response.status_code == 200
+    assert [note["id"] for note in response.json()] == ids[:2]
+    cursor = response.headers["X-Next-Cursor"]
+
+    response = client.get(f"/notes/?limit=2&cursor={cursor}", headers=headers)
+    assert [note["title"] for note in response.json()] == ["c"]
+    assert "X-Next-Cursor" not in response.headers
+
+
+def test_list_notes_fields_and_columns(client, headers):
+    create_notes(client, headers, "a", "b")
+    response = client.get("/notes/?fields=title&shape=columns", headers=headers)
+    assert response.status_code == 200
+    body = response.json()
+    assert set(body) == {"id", "title"}
+    assert body["title"] == ["a", "b"]
+    assert client.get("/notes/?fields=password", headers=headers).status_code == 400
+
+
+def test_list_notes_etag(client, headers):
+    create_notes(client, headers, "a")
+    response = client.get("/notes/", headers=headers)
+    etag = response.headers["ETag"]
+    assert client.get("/notes/", headers={**headers, "If-None-Match": etag}).status_code == 304
+
+    create_notes(client, headers, "b")
+    assert client.get("/notes/", headers={**headers, "If-None-Match": etag}).status_code == 200
+
+
+def test_list_notes_stream(client, headers):
+    create_notes(client, headers, *(f"note {i}" for i in range(5)))
+    response = client.get("/notes/?stream=ndjson", headers=headers)
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [note["title"] for note in lines] == [f"note {i}" for i in range(5)]
+
+    response = client.get("/notes/?stream=json&fields=title", headers=headers)
+    assert [note["title"] for note in response.json()] == [f"note {i}" for i in range(5)]
+
+
+def test_notes_are_private(client, make_user):
+    alice = make_user("alice@example.com")
+    bob = make_user("bob@example.com")
+    [note_id] = create_notes(client, alice, "secret")
+    assert client.get("/notes/", headers=bob).json() == []
+    assert client.get(f"/notes/{note_id}", headers=bob).status_code == 404
+    assert client.delete(f"/notes/{note_id}", headers=bob).status_code == 404
+
+
+def test_get_note(client, headers):
+    [note_id] = create_notes(client, headers, "hello")
+    response = client.get(f"/notes/{note_id}", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["title"] == "hello"
+    etag = response.headers["ETag"]
+    assert client.get(f"/notes/{note_id}", headers={**headers, "If-None-Match": etag}).status_code == 304
+    assert client.get("/notes/999999", headers=headers).status_code == 404
+
+
+def test_delete_note(client, headers):
+    [note_id] = create_notes(client, headers, "bye")
+    assert client.delete(f"/notes/{note_id}", headers=headers).status_code == 204
+    assert client.get(f"/notes/{note_id}", headers=headers).status_code == 404
+    assert client.delete(f"/notes/{note_id}", headers=headers).status_code == 404
+
+    changes = client.get("/notes/changes?since=0", headers=headers).json()
+    assert changes["deleted"] == [note_id]
+
+
+def test_changes_below_pruned_tombstones_need_resync(client, headers):
+    first, second = create_notes(client, headers, "old", "kept")         # версія 1
+    client.delete(f"/notes/{first}", headers=headers)                     # версія 2
+    client.delete(f"/notes/{second}", headers=headers)                    # версія 3
+
+    with database.SessionLocal() as db:
+        old = models.utcnow() - timedelta(days=changes.TOMBSTONE_RETENTION_DAYS + 1)
+        db.execute(update(models.NoteTombstone).where(models.NoteTombstone.note_id == first).values(deleted_at=old))
+        db.commit()
+        assert changes.prune_tombstones(db) == 1
+        assert changes.prune_tombstones(db) == 0
+
+    response = client.get("/notes/changes?since=1", headers=headers)
+    assert response.status_code == 410
+    # Від горизонту і новіше — як і раніше; since=0 — повний список без видалень
+    assert client.get("/notes/changes?since=2", headers=headers).json()["deleted"] == [second]
+    assert client.get("/notes/changes?since=0", headers=headers).status_code == 200
+
+
+def test_upload_stores_file_deduplicated_by_content_hash(client, headers, memory_storage):
+    data = b"%PDF-1.4 test document"
+    response = upload(client, headers, data)
+    assert response.status_code == 200, response.text
+    note = response.json()
+    sha256 = hashlib.sha256(data).hexdigest()
+    assert f"/{sha256}-" in note["file_url"] and note["file_url"].endswith(".pdf")
+    [(key, (stored, content_type))] = memory_storage.objects.items()
+    assert key[0] == BUCKET and stored == data and content_type == "application/pdf"
+
+    # Той самий вміст — нова нотатка на той самий файл, без повторної передачі у сховище
+    calls = memory_storage.calls
+    second = upload(client, headers, data, title="again").json()
+    assert second["file_url"] == note["file_url"] and second["id"] != note["id"]
+    assert memory_storage.calls == calls
+
+
+def test_delete_uploaded_file_after_last_reference(client, headers, memory_storage):
+    data = b"%PDF-1.4 shared"
+    first = upload(client, headers, data).json()
+    second = upload(client, headers, data).json()
+
+    assert client.delete(f"/notes/{first['id']}", headers=headers).status_code == 204
+    outbox.process_batch()
+    assert len(memory_storage.objects) == 1  # На файл ще посилається друга нотатка
+
+    assert client.delete(f"/notes/{second['id']}", headers=headers).status_code == 204
+    assert outbox.process_batch() == 1
+    assert memory_storage.objects == {}
+
+
+def test_outbox_queue_in_metrics(client, headers):
+    note = upload(client, headers, b"%PDF-1.4 queued").json()
+    client.delete(f"/notes/{note['id']}", headers=headers)
+    assert "outbox_pending_events 1.0" in client.get("/metrics").text
+    outbox.process_batch()
+    body = client.get("/metrics").text
+    assert "outbox_pending_events 0.0" in body and "outbox_lag_seconds 0.0" in body
+
+
+def test_pending_delete_does_not_remove_reuploaded_file(client, headers, memory_storage):
+    data = b"%PDF-1.4 deleted and uploaded again"
+    first = upload(client, headers, data).json()
+    assert client.delete(f"/notes/{first['id']}", headers=headers).status_code == 204
+
+    # Видалення старого об'єкта ще в черзі, а той самий вміст уже завантажили знову
+    second = upload(client, headers, data).json()
+    assert second["file_url"] != first["file_url"]
+    assert outbox.process_batch() == 1
+    [((_, path), (stored, _))] = memory_storage.objects.items()
+    assert second["file_url"].endswith(path) and stored == data
+
+
+def test_legacy_note_gets_single_file_row(client, headers):
+    [note_id] = create_notes(client, headers, "legacy")
+    with database.SessionLocal() as db:
+        db.execute(update(models.Note).where(models.Note.id == note_id)
+                   .values(file_url=f"https://example.com/storage/v1/object/public/{BUCKET}/1/old_photo.png"))
+        db.commit()
+
+    # Запит A прочитав нотатку без файлу, а запит B встиг створити для неї запис у files
+    with database.SessionLocal() as db_a, database.SessionLocal() as db_b:
+        stale = notes._get_user_note(db_a, note_id, 1)
+        assert stale.file is None
+        winner, _ = notes._get_note_file(db_b, note_id, 1)
+        assert notes._get_note_file(db_a, note_id, 1) == (winner, None)
+
+    with database.SessionLocal() as db:
+        assert db.scalar(select(func.count()).select_from(models.File)) == 1
+        assert db.get(models.File, winner).ref_count == 1
+
+
+def test_upload_storage_unavailable(client, headers, memory_storage, monkeypatch):
+    from app.services import storage
+    service = storage.get_service()
+    monkeypatch.setattr(service, "backoff", lambda attempt: 0)
+    memory_storage.inject_failures(service.retries + 1)
+    response = upload(client, headers, b"%PDF-1.4 unlucky")
+    assert response.status_code == 503
+    assert "Retry-After" in response.headers
@@ -0,0 +1,191 @@
+# tests/test_ratelimit.py — token bucket, backoff логінів, бекенди memory і Redis (FakeRedis), fail-open
+
+import asyncio
+import time
+
+import pytest
+from jose import jwt
+from redis.exceptions import TimeoutError as RedisTimeoutError
+from uvicorn.middleware.proxy_headers import ProxyHeadersMiddleware
+
+from app import auth
+from app.main import app
+from app.services import ratelimit
+
+POLICY = ratelimit.Policy("test", requests=1, per=1, burst=3)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def scope(ip="10.0.0.1", path="/notes/", method="GET", headers=()):
+    return {"type": "http", "method": method, "path": path, "headers": list(headers), "client": (ip, 40000)}
+
+
+def allowed(limiter, *args, **kwargs) -> bool:
+    return asyncio.run(limiter.check(scope(*args, **kwargs))).allowed
+
+
+@pytest.fixture(params=["memory", "redis"])
+def make_limiter(request):
+    """
+    Лімітер на бекенді memory або RedisBackend поверх FakeRedis (шлях Lua-скрипта) з керованим годинником.
+    """
+    def make(policies=(POLICY,), fail_open=True):
+        clock = Clock()
+        if request.param == "memory":
+            backend = ratelimit.MemoryBackend(clock=clock)
+        else:
+            backend = ratelimit.RedisBackend(ratelimit.FakeRedis(clock=clock))
+        return ratelimit.RateLimiter(backend, policies, fail_open), clock
+    return make
+
+
+def test_burst_then_refill(make_limiter):
+    limiter, clock = make_limiter()
+    assert [allowed(limiter) for _ in range(4)] == [True, True, True, False]
+    decision = asyncio.run(limiter.check(scope()))
+    assert decision.policy == "test" and 0 < decision.retry_after <= 1
+
+    clock.now += 1  # Один токен за секунду
+    assert [allowed(limiter) for _ in range(2)] == [True, False]
+    clock.now += 60  # Відро наповнюється не більше ніж до burst
+    assert [allowed(limiter) for _ in range(4)] == [True, True, True, False]
+    assert limiter.rejected == {"test": 4}
+
+
+def test_keys_are_isolated(make_limiter):
+    limiter, _ = make_limiter()
+    assert [allowed(limiter, "10.0.0.1") for _ in range(4)] == [True, True, True, False]
+    assert allowed(limiter, "10.0.0.2")
+    # Політика для іншого шляху не зачіпає відро цього
+    limited = ratelimit.Policy("login", requests=1, per=60, burst=1, path="/users/login")
+    limiter, _ = make_limiter((limited, POLICY))
+    assert allowed(limiter, path="/users/login") and not allowed(limiter, path="/users/login")
+    assert allowed(limiter, path="/notes/")
+
+
+def test_user_buckets_do_not_verify_tokens(make_limiter, monkeypatch):
+    def token(sub, key=auth.SECRET_KEY):
+        return jwt.encode({"sub": sub, "exp": int(time.time()) + 60}, key, algorithm=auth.ALGORITHM)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("signature is verified by the route, not the rate limiter")
+
+    monkeypatch.setattr(jwt, "decode", fail)
+    per_user = ratelimit.Policy("user", requests=1, per=60, burst=1, key="user")
+    limiter, _ = make_limiter((per_user,))
+
+    def allowed_with(value):
+        return allowed(limiter, headers=[(b"authorization", f"Bearer {value}".encode())])
+
+    victim = token("victim@example.com")
+    assert allowed_with(victim) and not allowed_with(victim)
+    # Той самий IP, інший токен — інше відро; підробка з чужим sub не торкається відра жертви
+    assert allowed_with(token("victim@example.com", key="forged"))
+    assert allowed_with(token("other@example.com"))
+    # Не JWT — відро за IP
+    assert allowed_with("not-a-jwt") and not allowed_with("also-not-a-jwt")
+
+
+def test_request_is_charged_only_when_all_policies_allow(make_limiter):
+    strict = ratelimit.Policy("strict", requests=1, per=60, burst=1, path="/users/login")
+    limiter, _ = make_limiter((strict, POLICY))
+    assert allowed(limiter, path="/users/login")
+    assert not allowed(limiter, path="/users/login")
+    # Відмова за "strict" не списала токени з відра "test"
+    assert [allowed(limiter) for _ in range(2)] == [True, True]
+
+
+def test_login_backoff_grows_and_expires(make_limiter):
+    limiter, clock = make_limiter()
+    email, ip = "victim@example.com", "10.0.0.1"
+    delays = [asyncio.run(limiter.login_failed(email, ip)) for _ in range(ratelimit.LOGIN_BACKOFF_FREE_ATTEMPTS + 3)]
+    base = ratelimit.LOGIN_BACKOFF_BASE
+    assert delays == [0.0] * ratelimit.LOGIN_BACKOFF_FREE_ATTEMPTS + [base, base * 2, base * 4]
+    assert asyncio.run(limiter.login_retry_after(" Victim@Example.com ", ip)) == pytest.approx(base * 4, abs=0.01)
+
+    clock.now += base * 4 + 0.1  # Блокування спливло
+    assert asyncio.run(limiter.login_retry_after(email, ip)) == 0.0
+
+    asyncio.run(limiter.login_succeeded(email, ip))
+    assert asyncio.run(limiter.login_failed(email, ip)) == 0.0  # Лічильник скинуто
+
+
+def test_login_lockout_is_per_client_ip(make_limiter, monkeypatch):
+    monkeypatch.setattr(ratelimit, "LOGIN_EMAIL_FREE_ATTEMPTS", 10)
+    limiter, _ = make_limiter()
+    email = "victim@example.com"
+    for _ in range(ratelimit.LOGIN_BACKOFF_FREE_ATTEMPTS + 2):
+        asyncio.run(limiter.login_failed(email, "203.0.113.66"))
+    # Атакувальник заблокував лише себе: власник входить зі своєї адреси
+    assert asyncio.run(limiter.login_retry_after(email, "203.0.113.66")) > 0
+    assert asyncio.run(limiter.login_retry_after(email, "198.51.100.7")) == 0.0
+
+    # Розподілений перебір з багатьох адрес упирається у вільніший ліміт email загалом
+    for i in range(10 - ratelimit.LOGIN_BACKOFF_FREE_ATTEMPTS - 2):
+        assert asyncio.run(limiter.login_failed(email, f"192.0.2.{i}")) == 0.0
+    assert asyncio.run(limiter.login_failed(email, "192.0.2.200")) == ratelimit.LOGIN_BACKOFF_BASE
+    assert asyncio.run(limiter.login_retry_after(email, "198.51.100.7")) > 0
+
+
+def test_login_backoff_is_capped(make_limiter, monkeypatch):
+    monkeypatch.setattr(ratelimit, "LOGIN_BACKOFF_MAX", 5)
+    limiter, _ = make_limiter()
+    for _ in range(ratelimit.LOGIN_BACKOFF_FREE_ATTEMPTS + 10):
+        delay = asyncio.run(limiter.login_failed("a@example.com", "10.0.0.1"))
+    assert delay == 5
+
+
+def test_redis_failure_fails_open():
+    class TimingOutRedis(ratelimit.FakeRedis):
+        def _check(self):
+            if self._failures > 0:
+                self._failures -= 1
+                raise RedisTimeoutError("Timeout reading from socket")
+
+    client = TimingOutRedis()
+    limiter = ratelimit.RateLimiter(ratelimit.RedisBackend(client), (POLICY,), fail_open=True)
+    client.fail_next(3)
+    assert allowed(limiter)
+    assert asyncio.run(limiter.login_failed("a@example.com", "10.0.0.1")) == 0.0
+    assert asyncio.run(limiter.login_retry_after("a@example.com", "10.0.0.1")) == 0.0
+    assert limiter.backend_errors == 3
+
+    closed = ratelimit.RateLimiter(ratelimit.RedisBackend(client), (POLICY,), fail_open=False)
+    client.fail_next(1)
+    decision = asyncio.run(closed.check(scope()))
+    assert not decision.allowed and decision.policy == "backend"
+
+
+def test_middleware_returns_429_per_client_ip(client, monkeypatch):
+    monkeypatch.setattr(ratelimit, "RATE_LIMIT_ENABLED", True)
+    monkeypatch.setattr(ratelimit, "_limiter", ratelimit.RateLimiter(ratelimit.MemoryBackend(), (POLICY,)))
+
+    # Як під gunicorn з FORWARDED_ALLOW_IPS: uvicorn підставляє адресу клієнта з X-Forwarded-For
+    proxied = ProxyHeadersMiddleware(app, trusted_hosts="*")
+
+    async def get(ip):
+        responses = []
+
+        async def send(message):
+            responses.append(message)
+
+        async def receive():
+            return {"type": "http.request", "body": b""}
+
+        request = scope("10.0.0.100", path="/", headers=[(b"x-forwarded-for", ip.encode())])
+        request.update(http_version="1.1", scheme="http", query_string=b"", root_path="", server=("test", 80))
+        await proxied(request, receive, send)
+        return responses[0]
+
+    statuses = [asyncio.run(get("203.0.113.1"))["status"] for _ in range(4)]
+    assert statuses == [200, 200, 200, 429]
+    rejected = asyncio.run(get("203.0.113.1"))
+    assert dict(rejected["headers"])[b"retry-after"] == b"1"
+    assert asyncio.run(get("203.0.113.2"))["status"] == 200
@@ -0,0 +1,37 @@
+# tests/test_search.py — пошук по нотатках і формат фрагментів
+
+from app.services import search
+
+
+def test_search_ranks_title_matches_first(client, headers):
+    client.post("/notes/batch", json={"create": [
+        {"title": "shopping list", "content": "milk budget bread"},
+        {"title": "budget 2026", "content": "plan for the year"},
+        {"title": "holiday", "content": "nothing relevant"},
+    ]}, headers=headers)
+    response = client.get("/notes/search?q=budget", headers=headers)
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [item["title"] for item in results] == ["budget 2026", "shopping list"]
+    assert response.json()["next_offset"] is None
+
+
+def test_search_sees_new_notes(client, headers):
+    assert client.get("/notes/search?q=garden", headers=headers).json()["results"] == []
+    client.post("/notes/batch", json={"create": [{"title": "garden"}]}, headers=headers)
+    assert len(client.get("/notes/search?q=garden", headers=headers).json()["results"]) == 1
+
+
+def test_search_snippet_is_escaped(client, headers):
+    client.post("/notes/batch", json={"create": [
+        {"title": "xss", "content": "<script>alert(1)</script> budget & plan"},
+    ]}, headers=headers)
+    [result] = client.get("/notes/search?q=budget", headers=headers).json()["results"]
+    assert result["snippet"] == "&lt;script&gt;alert(1)&lt;/script&gt; <b>budget</b> &amp; plan"
+
+
+def test_postgres_headline_has_fallback_format():
+    # ts_headline повертає сирий текст із маркерами збігів замість <b>
+    headline = f"<i>my</i> {search._MARK_START}budget{search._MARK_STOP} & plan"
+    assert search._headline_html(headline) == "&lt;i&gt;my&lt;/i&gt; <b>budget</b> &amp; plan"
+    assert search._headline_html(headline) == search.highlight("<i>my</i> budget & plan", ["budget"])
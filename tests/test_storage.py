@@ -0,0 +1,162 @@
+# tests/test_storage.py — повтори, ліміт одночасних викликів і circuit breaker сховища
+
+import asyncio
+import time
+
+import pytest
+
+from app.services import storage
+
+BUCKET = "notes-files"
+
+
+def make_service(backend=None, **options) -> storage.StorageService:
+    service = storage.StorageService(backend or storage.MemoryStorage(), **options)
+    service.delays = []
+    service.backoff = lambda attempt: service.delays.append(attempt) or 0
+    return service
+
+
+def expire_open_circuit(service):
+    # Минув reset_timeout: ланцюг переходить у half-open
+    service.breaker.opened_at = time.monotonic() - service.breaker.reset_timeout - 1
+
+
+def test_transient_failures_are_retried_with_backoff():
+    service = make_service(retries=3)
+    service.backend.inject_failures(2)
+    asyncio.run(service.upload(BUCKET, "a.txt", b"data"))
+    assert service.backend.calls == 3
+    assert service.delays == [0, 1]  # Пауза росте з номером спроби
+    assert service.breaker.state == "closed" and service.breaker.failures == 0
+
+
+def test_backoff_is_capped_full_jitter():
+    service = storage.StorageService(storage.MemoryStorage(), backoff_base=0.5, backoff_max=2)
+    assert all(0 <= service.backoff(10) <= 2 for _ in range(100))
+
+
+def test_exhausted_retries_raise_unavailable():
+    service = make_service(retries=2, circuit_threshold=100)
+    service.backend.inject_failures(10)
+    with pytest.raises(storage.StorageUnavailable):
+        asyncio.run(service.upload(BUCKET, "a.txt", b"data"))
+    assert service.backend.calls == 3
+
+
+def test_concurrent_calls_are_limited():
+    active = peak = 0
+
+    class SlowStorage(storage.MemoryStorage):
+        async def upload(self, *args):
+            nonlocal active, peak
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.01)
+            active -= 1
+            await super().upload(*args)
+
+    service = make_service(SlowStorage(), max_concurrency=2)
+
+    async def main():
+        await asyncio.gather(*(service.upload(BUCKET, f"{i}.txt", b"x") for i in range(8)))
+
+    asyncio.run(main())
+    assert peak == 2 and len(service.backend.objects) == 8
+
+
+def test_circuit_opens_and_rejects_without_calling_backend():
+    service = make_service(retries=0, circuit_threshold=2, circuit_reset=30)
+    service.backend.inject_failures(2)
+    for _ in range(2):
+        with pytest.raises(storage.StorageUnavailable):
+            asyncio.run(service.upload(BUCKET, "a.txt", b"data"))
+    assert service.breaker.state == "open"
+
+    calls = service.backend.calls
+    with pytest.raises(storage.StorageUnavailable) as error:
+        asyncio.run(service.upload(BUCKET, "a.txt", b"data"))
+    assert service.backend.calls == calls
+    assert error.value.retry_after > 0
+
+
+def test_half_open_probe_closes_or_reopens_circuit():
+    service = make_service(retries=0, circuit_threshold=1, circuit_reset=30)
+    service.backend.inject_failures(1)
+    with pytest.raises(storage.StorageUnavailable):
+        asyncio.run(service.upload(BUCKET, "a.txt", b"data"))
+
+    # Невдала пробна спроба знову розмикає ланцюг
+    expire_open_circuit(service)
+    assert service.breaker.state == "half-open"
+    service.backend.inject_failures(1)
+    with pytest.raises(storage.StorageUnavailable):
+        asyncio.run(service.upload(BUCKET, "a.txt", b"data"))
+    assert service.breaker.state == "open"
+
+    # Вдала — замикає
+    expire_open_circuit(service)
+    asyncio.run(service.upload(BUCKET, "a.txt", b"data"))
+    assert service.breaker.state == "closed"
+
+
+def test_non_transient_error_on_probe_closes_circuit(tmp_path):
+    service = make_service(retries=0, circuit_threshold=1, circuit_reset=30)
+    service.backend.inject_failures(1)
+    with pytest.raises(storage.StorageUnavailable):
+        asyncio.run(service.upload(BUCKET, "a.txt", b"data"))
+    expire_open_circuit(service)
+
+    # 404 — сховище відповіло, тож ланцюг замикається, а не зависає з активною пробою
+    with pytest.raises(storage.StorageError) as error:
+        asyncio.run(service.download(BUCKET, "missing.txt", str(tmp_path / "out")))
+    assert not isinstance(error.value, storage.StorageUnavailable)
+    assert service.breaker.state == "closed"
+    asyncio.run(service.upload(BUCKET, "a.txt", b"data"))
+
+
+def test_cancelled_probe_frees_half_open_slot():
+    class HangingStorage(storage.MemoryStorage):
+        async def upload(self, *args):
+            await asyncio.sleep(60)
+
+    service = make_service(HangingStorage(), retries=0, circuit_threshold=1, circuit_reset=30)
+    service.breaker.record_failure()
+    expire_open_circuit(service)
+
+    async def main():
+        probe = asyncio.create_task(service.upload(BUCKET, "a.txt", b"data"))
+        await asyncio.sleep(0.01)
+        assert service.breaker._probing
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+
+    asyncio.run(main())
+    assert not service.breaker._probing
+    assert service.breaker.state == "half-open"
+    service.breaker.before_call()  # Наступна пробна спроба дозволена
+
+
+def test_readiness_ignores_open_circuit(client):
+    breaker = storage.get_service().breaker
+    for _ in range(breaker.threshold):
+        breaker.record_failure()
+    response = client.get("/health/ready")
+    assert response.status_code == 200
+    assert response.json()["storage"] == {"circuit": "open", "probe_stuck": False}
+
+
+def test_readiness_reports_stuck_probe(client):
+    breaker = storage.get_service().breaker
+    assert client.get("/health/ready").status_code == 200
+
+    breaker.opened_at = time.monotonic() - breaker.reset_timeout * 3
+    assert breaker.before_call()  # Пробна спроба почалась і не завершується
+    breaker._probe_started -= breaker.reset_timeout * 2
+    response = client.get("/health/ready")
+    assert response.status_code == 200  # Лише звітується, з ротації не виводить
+    assert response.json()["storage"] == {"circuit": "half-open", "probe_stuck": True}
+
+    breaker.record_success()
+    assert client.get("/health/ready").json()["storage"] == {"circuit": "closed", "probe_stuck": False}
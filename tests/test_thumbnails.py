@@ -0,0 +1,150 @@
+# tests/test_thumbnails.py — варіанти зображень: воркер outbox, генерація на вимогу, видалення
+
+from io import BytesIO
+
+import pytest
+from PIL import Image
+from sqlalchemy import select, update
+
+from app import database, models
+from app.services import outbox, storage, thumbnails
+
+from tests.test_notes import BUCKET, create_notes
+
+
+@pytest.fixture(scope="module", autouse=True)
+def image_pool():
+    """
+    Процеси рендерингу живуть увесь модуль (як пул bcrypt у conftest) — без spawn на кожен тест.
+    """
+    shutdown = thumbnails.image_pool.shutdown
+    thumbnails.image_pool.shutdown = lambda: None
+    yield thumbnails.image_pool
+    thumbnails.image_pool.shutdown = shutdown
+    shutdown()
+
+
+def png(width: int = 400, height: int = 200, color: str = "red") -> bytes:
+    out = BytesIO()
+    Image.new("RGB", (width, height), color).save(out, "PNG")
+    return out.getvalue()
+
+
+def upload_image(client, headers, data: bytes, title: str = "photo") -> dict:
+    response = client.post("/notes/upload", data={"title": title},
+                           files={"file": ("photo.png", data, "image/png")}, headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def variant_keys(memory_storage) -> set[str]:
+    return {path for _, path in memory_storage.objects if path.endswith(".webp")}
+
+
+def test_outbox_generates_variants_and_bumps_version(client, headers, memory_storage):
+    note = upload_image(client, headers, png())
+    assert note["variants"] is None
+    assert outbox.process_batch() == 1
+
+    current = client.get(f"/notes/{note['id']}", headers=headers).json()
+    assert set(current["variants"]) == set(thumbnails.VARIANTS)
+    assert current["version"] > note["version"]  # Нотатка змінилась: ETag і /notes/changes це бачать
+    changed = client.get(f"/notes/changes?since={note['version']}", headers=headers).json()
+    assert [item["id"] for item in changed["notes"]] == [note["id"]]
+
+    keys = variant_keys(memory_storage)
+    assert len(keys) == len(thumbnails.VARIANTS)
+    [thumb_key] = [key for key in keys if current["variants"]["thumb"].endswith(key)]
+    with Image.open(BytesIO(memory_storage.objects[(BUCKET, thumb_key)][0])) as thumb:
+        assert max(thumb.size) == thumbnails.VARIANTS["thumb"]
+
+
+def test_outbox_retries_only_transient_failures(client, headers, memory_storage, monkeypatch):
+    upload_image(client, headers, png(color="green"), "good")
+    broken = upload_image(client, headers, png(color="blue"), "broken")
+    with database.SessionLocal() as db:
+        path = db.scalar(select(models.File.path).join(models.Note).where(models.Note.id == broken["id"]))
+    del memory_storage.objects[(BUCKET, path)]  # Оригіналу немає — постійна помилка
+
+    calls = []
+    generate = thumbnails.generate_variants
+
+    def flaky(bucket, file_id):
+        calls.append(file_id)
+        if len(calls) == 1:
+            raise storage.StorageUnavailable("Storage is unavailable", retry_after=1)
+        return generate(bucket, file_id)
+
+    monkeypatch.setattr(thumbnails, "generate_variants", flaky)
+    monkeypatch.setattr(thumbnails, "THUMBNAIL_WORKERS", 1)  # Порядок викликів детермінований
+    assert outbox.process_batch() == 2
+
+    with database.SessionLocal() as db:
+        events = db.execute(select(models.OutboxEvent.payload, models.OutboxEvent.last_error)).all()
+        variants = dict(db.execute(select(models.Note.title, models.File.variants).join(models.File)).all())
+    # Тимчасова помилка повертає в чергу лише свій payload; битий файл позначено {} і не повторюється
+    assert len(events) == 1 and "StorageUnavailable" in events[0].last_error
+    assert variants == {"good": None, "broken": {}}
+
+    with database.SessionLocal() as db:
+        db.execute(update(models.OutboxEvent).values(available_at=models.utcnow()))  # Backoff минув
+        db.commit()
+    assert outbox.process_batch() == 1
+    with database.SessionLocal() as db:
+        assert db.scalar(select(models.File.variants).where(models.File.id == events[0].payload["file_id"]))
+        assert db.scalar(select(models.OutboxEvent.id)) is None
+
+
+def test_outbox_claims_limited_thumbnail_batch(client, headers, monkeypatch):
+    monkeypatch.setitem(outbox.BATCH_LIMITS, thumbnails.GENERATE, 1)
+    for color in ("red", "green"):
+        upload_image(client, headers, png(color=color), color)
+    assert outbox.process_batch() == 1
+    assert outbox.process_batch() == 1
+    assert outbox.process_batch() == 0
+
+
+def test_variant_generated_on_demand(client, headers):
+    note = upload_image(client, headers, png())
+    response = client.get(f"/notes/{note['id']}/variants/small", headers=headers, follow_redirects=False)
+    assert response.status_code == 307
+    assert response.headers["location"] == client.get(f"/notes/{note['id']}", headers=headers).json()["variants"]["small"]
+
+    assert client.get(f"/notes/{note['id']}/variants/huge", headers=headers).status_code == 404
+    [plain] = create_notes(client, headers, "no file")
+    assert client.get(f"/notes/{plain}/variants/thumb", headers=headers).status_code == 404
+
+
+def test_variant_on_demand_storage_unavailable(client, headers, memory_storage, monkeypatch):
+    note = upload_image(client, headers, png())
+    service = storage.get_service()
+    monkeypatch.setattr(service, "backoff", lambda attempt: 0)
+    memory_storage.inject_failures(service.retries + 1)
+
+    response = client.get(f"/notes/{note['id']}/variants/thumb", headers=headers, follow_redirects=False)
+    assert response.status_code == 503
+    assert int(response.headers["retry-after"]) >= 1
+    assert client.get(f"/notes/{note['id']}", headers=headers).json()["variants"] is None  # Спробуємо пізніше
+
+
+def test_variant_of_missing_original_is_404(client, headers):
+    [note_id] = create_notes(client, headers, "legacy")
+    with database.SessionLocal() as db:
+        db.execute(update(models.Note).where(models.Note.id == note_id)
+                   .values(file_url=f"https://example.com/storage/v1/object/public/{BUCKET}/1/gone.png"))
+        db.commit()
+
+    response = client.get(f"/notes/{note_id}/variants/thumb", headers=headers, follow_redirects=False)
+    assert response.status_code == 404
+    # Позначено {} — наступний запит не звертається до сховища знову
+    assert client.get(f"/notes/{note_id}", headers=headers).json()["variants"] == {}
+
+
+def test_delete_removes_variant_objects(client, headers, memory_storage):
+    note = upload_image(client, headers, png())
+    outbox.process_batch()
+    assert len(memory_storage.objects) == 1 + len(thumbnails.VARIANTS)
+
+    assert client.delete(f"/notes/{note['id']}", headers=headers).status_code == 204
+    assert outbox.process_batch() == 1
+    assert memory_storage.objects == {}
@@ -0,0 +1,85 @@
+# tests/test_uploads.py — ліміт розміру тіла під час приймання та передача файлу у сховище
+
+import hashlib
+
+from fastapi import FastAPI, File, UploadFile
+from fastapi.testclient import TestClient
+
+from app.services import storage, uploads
+
+BOUNDARY = "test-boundary"
+
+
+def multipart_chunks(data: bytes, title: str = "chunked", chunk_size: int = 64 * 1024):
+    """
+    Тіло multipart/form-data блоками (генератор → chunked, без Content-Length).
+    """
+    yield (
+        f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="title"\r\n\r\n{title}\r\n'
+        f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="file"; filename="doc.pdf"\r\n'
+        f"Content-Type: application/pdf\r\n\r\n"
+    ).encode()
+    for start in range(0, len(data), chunk_size):
+        yield data[start:start + chunk_size]
+    yield f"\r\n--{BOUNDARY}--\r\n".encode()
+
+
+MULTIPART_HEADERS = {"Content-Type": f"multipart/form-data; boundary={BOUNDARY}"}
+
+
+def limited_app(max_bytes: int) -> TestClient:
+    inner = FastAPI()
+
+    @inner.post("/upload")
+    async def upload(file: UploadFile = File(...)):
+        received = await uploads.inspect_upload(file, max_bytes)
+        return {"size": received.size, "sha256": received.sha256}
+
+    return TestClient(uploads.UploadSizeLimitMiddleware(inner, paths=("/upload",), max_bytes=max_bytes))
+
+
+def test_chunked_upload_without_content_length(client, headers, memory_storage):
+    data = b"%PDF-1.4 " + bytes(range(256)) * 2000
+    response = client.post(
+        "/notes/upload", content=multipart_chunks(data), headers={**headers, **MULTIPART_HEADERS},
+    )
+    assert response.status_code == 200, response.text
+    assert f"/{hashlib.sha256(data).hexdigest()}-" in response.json()["file_url"]
+    [(stored, _)] = memory_storage.objects.values()
+    assert stored == data
+
+
+def test_upload_retry_sends_whole_file(client, headers, memory_storage, monkeypatch):
+    service = storage.get_service()
+    monkeypatch.setattr(service, "backoff", lambda attempt: 0)
+    memory_storage.inject_failures(1)
+    data = b"%PDF-1.4 retried " * 100_000  # Більше за 1 МБ — Starlette тримає файл на диску
+    response = client.post(
+        "/notes/upload", data={"title": "retry"}, files={"file": ("doc.pdf", data, "application/pdf")}, headers=headers,
+    )
+    assert response.status_code == 200, response.text
+    [(stored, _)] = memory_storage.objects.values()
+    assert stored == data
+
+
+def test_chunked_body_over_limit_is_rejected_while_reading():
+    with limited_app(max_bytes=1024) as client:
+        response = client.post("/upload", content=multipart_chunks(b"x" * 512 * 1024), headers=MULTIPART_HEADERS)
+    assert response.status_code == 413
+    assert response.json() == {"detail": "Request body too large"}
+
+
+def test_content_length_over_limit_is_rejected_before_reading():
+    with limited_app(max_bytes=1024) as client:
+        response = client.post("/upload", files={"file": ("big.bin", b"x" * 200 * 1024)})
+    assert response.status_code == 413
+    assert response.json() == {"detail": "Request body too large"}
+
+
+def test_file_over_limit_within_body_allowance():
+    # Тіло вкладається в запас на поля форми, але сам файл більший за ліміт
+    with limited_app(max_bytes=1024) as client:
+        response = client.post("/upload", files={"file": ("big.bin", b"x" * 4096)})
+        assert response.status_code == 413
+        response = client.post("/upload", files={"file": ("ok.bin", b"x" * 1024)})
+        assert response.json() == {"size": 1024, "sha256": hashlib.sha256(b"x" * 1024).hexdigest()}
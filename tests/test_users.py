@@ -0,0 +1,41 @@
+# tests/test_users.py — реєстрація та логін (sync і async режими БД)
+
+from conftest import PASSWORD
+
+
+def test_register_returns_token(client):
+    response = client.post("/users/register", json={"email": "new@example.com", "password": PASSWORD})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["token_type"] == "bearer"
+    assert body["access_token"]
+
+
+def test_register_duplicate_email(client, make_user):
+    make_user("dup@example.com")
+    response = client.post("/users/register", json={"email": "dup@example.com", "password": PASSWORD})
+    assert response.status_code == 400
+
+
+def test_login(client, make_user):
+    make_user("login@example.com")
+    response = client.post("/users/login", json={"email": "login@example.com", "password": PASSWORD})
+    assert response.status_code == 200
+    token = response.json()["access_token"]
+    assert client.get("/notes/", headers={"Authorization": f"Bearer {token}"}).status_code == 200
+
+
+def test_login_wrong_password(client, make_user):
+    make_user("wrong@example.com")
+    response = client.post("/users/login", json={"email": "wrong@example.com", "password": "not-the-password"})
+    assert response.status_code == 401
+
+
+def test_login_unknown_email(client):
+    response = client.post("/users/login", json={"email": "nobody@example.com", "password": PASSWORD})
+    assert response.status_code == 401
+
+
+def test_invalid_token(client):
+    assert client.get("/notes/", headers={"Authorization": "Bearer not-a-jwt"}).status_code == 401
+    assert client.get("/notes/", headers={"Authorization": "Basic abc"}).status_code == 401
@@ -0,0 +1,47 @@
+# tests/test_workers.py — пул процесів: допуск задач (503 з Retry-After) і відновлення після падіння процесу
+
+import os
+
+import pytest
+
+from app import auth
+from app.services.workers import BoundedProcessPool, PoolSaturated
+
+from conftest import PASSWORD
+
+
+def test_pool_recovers_from_killed_process():
+    pool = BoundedProcessPool("test", max_workers=1, max_pending=0)
+    try:
+        first = pool.call(os.getpid)
+        for process in list(pool._executor._processes.values()):
+            process.kill()  # Як OOM killer: executor стає BrokenProcessPool
+            process.join()
+
+        second = pool.call(os.getpid)  # Пул перебудовано, задачу повторено
+        assert second != first
+        assert pool.stats()["rebuilds"] == 1 and pool.stats()["in_flight"] == 0
+    finally:
+        pool.shutdown()
+
+
+def test_saturated_pool_rejects_without_queueing():
+    pool = BoundedProcessPool("test", max_workers=1, max_pending=0, retry_after=3)
+    pool._in_flight = 1  # Єдиний воркер зайнятий, черги немає
+    with pytest.raises(PoolSaturated) as error:
+        pool.call(os.getpid)
+    assert error.value.retry_after == 3
+    assert pool.stats()["rejected"] == 1
+    pool.shutdown()
+
+
+def test_busy_hash_pool_answers_503_with_retry_after(client, monkeypatch):
+    pool = auth.hash_pool
+    monkeypatch.setattr(pool, "_in_flight", pool.max_workers + pool.max_pending)
+    response = client.post("/users/register", json={"email": "busy@example.com", "password": PASSWORD})
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == str(pool.retry_after)
+
+    monkeypatch.setattr(pool, "_in_flight", 0)
+    response = client.post("/users/register", json={"email": "busy@example.com", "password": PASSWORD})
+    assert response.status_code == 200